@@ -5,18 +5,34 @@
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.support.ui import WebDriverWait
 import pandas as pd
 import os
 from datetime import datetime
-from bs4 import BeautifulSoup
 import time
 import contextlib
 import gc
+import io
 import sys
 import argparse
 import threading
+import queue
+from urllib.parse import urlparse
 from selenium.common.exceptions import TimeoutException, WebDriverException
 
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+import format_manifest
+import html_archive
+import slotdata_columnar
+import slotdata_sync
+import store_coverage
+from http_fetcher import CLOUDFLARE_MARKERS, HttpFetcher, extract_table_html, parse_date_links
+from table_extractor import iter_table_rows
+
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 INTERNAL_ROOT = os.path.dirname(APP_DIR)
 PROJECT_ROOT = os.path.dirname(INTERNAL_ROOT)
@@ -24,31 +40,137 @@ RUNTIME_DIR = os.path.join(INTERNAL_ROOT, "runtime")
 os.makedirs(RUNTIME_DIR, exist_ok=True)
 
 DEFAULT_STORE_LIST_PATH = os.path.join(PROJECT_ROOT, "store_list.csv")
+# 店舗ごとの取得・整形状況の索引（store_coverage）。取得済みの日付はここから読む
+STORE_COVERAGE_PATH = os.getenv("STORE_COVERAGE_PATH", os.path.join(RUNTIME_DIR, "coverage.db"))
 DEFAULT_TEMP_STORE_LIST_PATH = os.getenv("TEMP_STORE_LIST_PATH", os.path.join(RUNTIME_DIR, "temp_store_list.csv"))
 CHROME_VERSION_MAIN = int(os.getenv("CHROME_VERSION_MAIN", "144"))
 SCRAPE_IDLE_TIMEOUT_SECONDS = int(os.getenv("SCRAPE_IDLE_TIMEOUT_SECONDS", "120"))
 SCRAPE_PAGELOAD_TIMEOUT_SECONDS = int(os.getenv("SCRAPE_PAGELOAD_TIMEOUT_SECONDS", "110"))
+# 詳細ページで all_data_table が現れるまでの待機（Cloudflare 検知時は別の上限で待つ）
+SCRAPE_TABLE_WAIT_TIMEOUT_SECONDS = float(os.getenv("SCRAPE_TABLE_WAIT_TIMEOUT_SECONDS", "10"))
+SCRAPE_CLOUDFLARE_WAIT_TIMEOUT_SECONDS = float(os.getenv("SCRAPE_CLOUDFLARE_WAIT_TIMEOUT_SECONDS", "30"))
+SCRAPE_WAIT_POLL_SECONDS = float(os.getenv("SCRAPE_WAIT_POLL_SECONDS", "0.25"))
+# 同時に動かすブラウザ数と、同一ドメインへ同時アクセスするブラウザ数の上限
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", "1"))
+SCRAPE_PER_DOMAIN_LIMIT = int(os.getenv("SCRAPE_PER_DOMAIN_LIMIT", "2"))
+# 日付ページへの移動方法: direct=一覧で集めたURLへ直接遷移 / click=従来どおりリンクをクリックして一覧へ戻る
+SCRAPE_NAVIGATION = os.getenv("SCRAPE_NAVIGATION", "direct")
+NAVIGATION_MODES = ("direct", "click")
+# 取得エンジン: browser=常に Chrome（既定） / http=HTTP で取得し Cloudflare 検知時のみ Chrome へ切り替え
+SCRAPE_FETCH_ENGINE = os.getenv("SCRAPE_FETCH_ENGINE", "browser")
+FETCH_ENGINES = ("http", "browser")
+# HTTP で連続してこの回数取れなかった店舗は、残りの日付をブラウザで取得する
+SCRAPE_HTTP_MAX_MISSES = int(os.getenv("SCRAPE_HTTP_MAX_MISSES", "2"))
+# ブラウザの作り直し条件（ページ遷移数 / ブラウザのメモリ使用量MB、0で無効。メモリ判定は psutil が必要）
+SCRAPE_RECYCLE_PAGES = int(os.getenv("SCRAPE_RECYCLE_PAGES", "1000"))
+SCRAPE_RECYCLE_RSS_MB = int(os.getenv("SCRAPE_RECYCLE_RSS_MB", "2048"))
+# 日付HTMLの保存形式: files=従来どおり1日1ファイル / archive=店舗フォルダの _archive へ月ごとに圧縮保存
+# （どちらの形式で保存済みの日付も取得済みとして扱う）
+SCRAPE_HTML_STORAGE = os.getenv("SCRAPE_HTML_STORAGE", "files")
+# 1 の場合、取得した表の行をその場で店舗CSVへ反映する（インライン整形、--inline-format）
+SCRAPE_INLINE_FORMAT = os.getenv("SCRAPE_INLINE_FORMAT", "0") == "1"
+# インライン整形時も日付HTMLを保存するか（0 の場合は店舗CSVだけに残る）
+SCRAPE_INLINE_KEEP_HTML = os.getenv("SCRAPE_INLINE_KEEP_HTML", "1") == "1"
+
+ADBLOCK_SCRIPT = """
+    document.querySelectorAll('iframe, ins, [class*="ad"], [id*="ad"], #overlay_ads_area').forEach(el => el.remove());
+"""
+
+# undetected_chromedriver は起動時に chromedriver を書き換えるため、同時起動しない
+_DRIVER_CREATE_LOCK = threading.Lock()
+_INPUT_LOCK = threading.Lock()
+
+
+# 表の outerHTML と Cloudflare 判定をブラウザ内でまとめて行い、ページ全体のソースは転送しない
+# arguments[1] が true の場合はセルの文字列も返す（table_extractor と同じく、テキストごとに trim して連結）
+PAGE_PROBE_SCRIPT = """
+const table = document.getElementById("all_data_table");
+const html = document.documentElement ? document.documentElement.outerHTML : "";
+const cellText = cell => {
+    const walker = document.createTreeWalker(cell, NodeFilter.SHOW_TEXT);
+    let text = "";
+    for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+        text += node.nodeValue.trim();
+    }
+    return text;
+};
+return {
+    table: table ? table.outerHTML : null,
+    cloudflare: arguments[0].some(marker => html.includes(marker)),
+    rows: table && arguments[1]
+        ? Array.from(table.querySelectorAll("tr")).slice(1).map(tr => Array.from(tr.querySelectorAll("td"), cellText))
+        : null,
+};
+"""
 
 
-def save_html(driver, date_str, save_dir):
+def probe_page(driver, with_rows=False):
+    """
+    現在のページを1回だけ調べ、(表の outerHTML または None, Cloudflare 確認画面かどうか, 行) を返す。
+    行はヘッダ行を除いた各行のセル文字列リストで、with_rows が False の場合は None。
+    """
+    result = driver.execute_script(PAGE_PROBE_SCRIPT, CLOUDFLARE_MARKERS, with_rows) or {}
+    return result.get("table"), bool(result.get("cloudflare")), result.get("rows")
+
+
+def save_html(driver, date_str, save_dir, table_html=None):
     os.makedirs(save_dir, exist_ok=True)
     filename = os.path.join(save_dir, f"{date_str}.html")
-    soup = BeautifulSoup(driver.page_source, "html.parser")
-    table = soup.find("table", {"id": "all_data_table"})
-    if table:
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(str(table))
-        print(f"[保存] 表データ保存完了: {filename}")
+    if table_html is None:
+        table_html, _, _ = probe_page(driver)
+    if not table_html:
+        return
+    if SCRAPE_HTML_STORAGE == "archive":
+        if html_archive.write_day(save_dir, date_str, table_html):
+            print(f"[保存] 表データ保存完了: {html_archive.archive_dir(save_dir)} ({date_str})")
+        else:
+            print(f"[保存] 保存済みと同じ内容のため省略: {date_str}")
+        return
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(table_html)
+    print(f"[保存] 表データ保存完了: {filename}")
 
 
 def detect_cloudflare(driver):
-    page = driver.page_source
-    return (
-        "人間であることを確認" in page
-        or "Please stand by, while we are checking your browser" in page
-        or "Checking if the site connection is secure" in page
-        or "hcaptcha-box" in page
-    )
+    return probe_page(driver)[1]
+
+
+class StoreOutput:
+    """
+    店舗の日付ページの保存先。
+    インライン整形では表の行をその日のうちに店舗CSVへ反映し、HTMLは keep_html の場合のみ保存する。
+    """
+
+    def __init__(self, store_name, save_dir, inline_format=False, keep_html=None):
+        self.store_name = store_name
+        self.save_dir = save_dir
+        self.inline_format = inline_format
+        self.keep_html = (SCRAPE_INLINE_KEEP_HTML if keep_html is None else keep_html) or not inline_format
+        self.saved = set()
+
+    def save(self, driver, date_str, table_html, rows=None):
+        """表を保存する。rows は表から取り出し済みの行（None の場合は table_html から取り出す）。"""
+        if self.keep_html:
+            save_html(driver, date_str, self.save_dir, table_html)
+        if self.inline_format and not self._write_rows(date_str, table_html, rows) and not self.keep_html:
+            return
+        self.saved.add(date_str)
+
+    def _write_rows(self, date_str, table_html, rows):
+        if rows is None:
+            rows = iter_table_rows(io.BytesIO(table_html.encode("utf-8"))) or []
+        entry = format_manifest.day_entry(self.save_dir, date_str) if self.keep_html else None
+        columnar_format = slotdata_sync.OFFLINE_COLUMNAR_FORMAT
+        if columnar_format != "off" and not slotdata_columnar.is_available():
+            columnar_format = "off"
+        db_path = slotdata_sync.SLOTDATA_DB_PATH if slotdata_sync.OFFLINE_DB_ENABLED else None
+        try:
+            slotdata_sync.write_days(self.store_name, [(date_str, list(rows), entry)], columnar_format, db_path)
+        except Exception as e:
+            print(f"[警告] {self.store_name}: {date_str} のインライン整形に失敗しました: {e}", flush=True)
+            return False
+        print(f"[整形] {self.store_name}: {date_str} を店舗CSVへ反映しました", flush=True)
+        return True
 
 
 def wait_for_cloudflare_clear(driver, timeout=300, poll_interval=2):
@@ -60,6 +182,37 @@ def wait_for_cloudflare_clear(driver, timeout=300, poll_interval=2):
     return False
 
 
+def wait_for_table(driver, timeout, poll_interval=SCRAPE_WAIT_POLL_SECONDS, allow_cloudflare=True, with_rows=False):
+    """
+    all_data_table が現れるまで待ち、(状態, 表の outerHTML, 行) を返す。
+    状態は "table"、Cloudflare の確認画面を検知した場合は "cloudflare"、タイムアウト時は None。
+    行は with_rows の場合のみ、表の取得と同じスクリプト呼び出しで取り出す。
+    """
+    def condition(d):
+        table_html, cloudflare, rows = probe_page(d, with_rows)
+        if table_html:
+            return "table", table_html, rows
+        if allow_cloudflare and cloudflare:
+            return "cloudflare", None, None
+        return False
+
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=poll_interval).until(condition)
+    except TimeoutException:
+        return None, None, None
+
+
+def print_timing_summary(store_name, timings, navigations):
+    if not timings:
+        return
+    waits = [t for _, t in timings]
+    print(
+        f"[計測] {store_name}: {len(waits)}日 表待機 合計 {sum(waits):.2f}s"
+        f" / 平均 {sum(waits) / len(waits):.2f}s / 最大 {max(waits):.2f}s / ページ遷移 {navigations}回",
+        flush=True,
+    )
+
+
 def handle_vignette(driver, link_element):
     if "#google_vignette" in driver.current_url:
         driver.back()
@@ -86,194 +239,614 @@ def load_stores(source):
         return pd.DataFrame()
 
 
-def main():
-    parser = argparse.ArgumentParser(description='選択された店舗のみをスクレイピング')
-    parser.add_argument('--file', type=str, help='店舗リスト CSV ファイルを指定')
-    parser.add_argument('--use-temp', action='store_true', help='runtime/temp_store_list.csv を使用')
-    parser.add_argument('--max-stores', type=int, default=0, help='処理する店舗数上限（0は無制限）')
-    parser.add_argument('--max-days-per-store', type=int, default=0, help='1店舗あたり処理日数上限（0は無制限）')
-    parser.add_argument('stores', nargs='*', help='店舗名（複数可）')
-    args = parser.parse_args()
-
-    if args.file:
-        try:
-            df = read_csv_with_fallback(args.file)
-        except Exception:
-            print("[エラー] 指定ファイルの読み込みに失敗しました")
-            return
-    elif args.use_temp:
-        df = load_stores("temp")
-    else:
-        df = load_stores("temp") if os.path.exists(DEFAULT_TEMP_STORE_LIST_PATH) else load_stores("csv")
-
-    if df.empty:
-        print("[エラー] 店舗リストが空です")
-        return
-
-    if args.max_stores and args.max_stores > 0:
-        df = df.head(args.max_stores)
-        print(f"[テスト] 店舗数を {args.max_stores} 件に制限して実行します")
-
+def create_driver():
     options = uc.ChromeOptions()
     options.add_argument("--disable-blink-features=AutomationControlled")
     options.add_argument("--start-maximized")
-    driver = uc.Chrome(options=options, version_main=CHROME_VERSION_MAIN)
+    with _DRIVER_CREATE_LOCK:
+        driver = uc.Chrome(options=options, version_main=CHROME_VERSION_MAIN)
     driver.set_page_load_timeout(SCRAPE_PAGELOAD_TIMEOUT_SECONDS)
+    return driver
 
-    activity = {"last_transition": time.time(), "label": "初期化"}
-    watchdog_stop = threading.Event()
-    watchdog_triggered = threading.Event()
 
-    def touch_transition(label):
-        activity["last_transition"] = time.time()
-        activity["label"] = label
+class ScrapeSession:
+    """
+    取得エンジン（HTTP セッションとブラウザ）と、そのページ遷移を監視する watchdog。
+    engine="http" の場合、ブラウザは Cloudflare などで必要になるまで起動しない。
+    """
 
-    def safe_get(url, label):
+    def __init__(self, driver_factory=create_driver, engine=SCRAPE_FETCH_ENGINE):
+        self._driver_factory = driver_factory
+        self.engine = engine
+        self.driver = None
+        self.http = HttpFetcher() if engine == "http" else None
+        if self.http is None:
+            self.ensure_driver()
+        self.activity = {"last_transition": time.time(), "label": "初期化"}
+        self.navigations = 0
+        self.watchdog_stop = threading.Event()
+        self.watchdog_triggered = threading.Event()
+        self._watchdog_thread = threading.Thread(target=self._watchdog_loop, daemon=True)
+        self._watchdog_thread.start()
+
+    def ensure_driver(self):
+        if self.driver is None:
+            self.driver = self._driver_factory()
+            if self.http is not None:
+                print("[切替] ブラウザを起動しました", flush=True)
+        return self.driver
+
+    def http_get(self, url, label):
+        """HTTP で取得して (本文, blocked) を返す。"""
         try:
-            driver.get(url)
-            touch_transition(label)
+            result = self.http.fetch(url)
+        except Exception as e:
+            raise RuntimeError(f"HTTP 取得失敗: {label}: {e}") from e
+        self.touch_transition(label)
+        return result
+
+    def touch_transition(self, label):
+        self.navigations += 1
+        self.activity["last_transition"] = time.time()
+        self.activity["label"] = label
+
+    def safe_get(self, url, label):
+        try:
+            self.driver.get(url)
+            self.touch_transition(label)
         except TimeoutException as e:
             raise RuntimeError(f"ページ遷移タイムアウト: {label} ({SCRAPE_PAGELOAD_TIMEOUT_SECONDS}秒)") from e
         except WebDriverException as e:
             raise RuntimeError(f"ページ遷移失敗: {label}: {e}") from e
 
-    def watchdog_loop():
-        while not watchdog_stop.wait(5):
-            idle = time.time() - activity["last_transition"]
+    def suspend(self, label):
+        self.activity["paused"] = True
+        self.activity["label"] = label
+
+    def resume(self):
+        self.activity["paused"] = False
+        self.activity["last_transition"] = time.time()
+
+    @contextlib.contextmanager
+    def paused(self, label):
+        """同一ドメインの空き待ちなど、ページ遷移しないことが正常な間は watchdog を止める。"""
+        self.suspend(label)
+        try:
+            yield
+        finally:
+            self.resume()
+
+    def browser_rss_mb(self):
+        """ブラウザ（子プロセスを含む）のメモリ使用量MB。測れない場合は None。"""
+        pid = getattr(self.driver, "browser_pid", None)
+        if psutil is None or not pid:
+            return None
+        try:
+            proc = psutil.Process(pid)
+            procs = [proc] + proc.children(recursive=True)
+            return sum(p.memory_info().rss for p in procs) / (1024 * 1024)
+        except psutil.Error:
+            return None
+
+    def needs_recycle(self):
+        if self.watchdog_triggered.is_set():
+            return True
+        if SCRAPE_RECYCLE_PAGES > 0 and self.navigations >= SCRAPE_RECYCLE_PAGES:
+            print(f"[再起動] ページ遷移が{self.navigations}回に達したためブラウザを作り直します", flush=True)
+            return True
+        rss = self.browser_rss_mb() if SCRAPE_RECYCLE_RSS_MB > 0 else None
+        if rss is not None and rss >= SCRAPE_RECYCLE_RSS_MB:
+            print(f"[再起動] ブラウザのメモリ使用量が{rss:.0f}MBに達したため作り直します", flush=True)
+            return True
+        return False
+
+    def _watchdog_loop(self):
+        while not self.watchdog_stop.wait(5):
+            if self.activity.get("paused"):
+                continue
+            idle = time.time() - self.activity["last_transition"]
             if idle >= SCRAPE_IDLE_TIMEOUT_SECONDS:
-                watchdog_triggered.set()
+                self.watchdog_triggered.set()
                 print("__WATCHDOG_TIMEOUT__", flush=True)
                 print(
-                    f"[エラー] ページ遷移が{SCRAPE_IDLE_TIMEOUT_SECONDS}秒以上停止: {activity['label']}",
+                    f"[エラー] ページ遷移が{SCRAPE_IDLE_TIMEOUT_SECONDS}秒以上停止: {self.activity['label']}",
                     flush=True,
                 )
-                with contextlib.suppress(Exception):
-                    driver.quit()
+                if self.driver is not None:
+                    with contextlib.suppress(Exception):
+                        self.driver.quit()
                 return
 
-    watchdog_thread = threading.Thread(target=watchdog_loop, daemon=True)
-    watchdog_thread.start()
+    def close(self):
+        self.watchdog_stop.set()
+        if self.driver is not None:
+            with contextlib.suppress(Exception):
+                self.driver.quit()
+        self.driver = None
+        if self.http is not None:
+            self.http.close()
 
-    adblock_script = """
-        document.querySelectorAll('iframe, ins, [class*="ad"], [id*="ad"], #overlay_ads_area').forEach(el => el.remove());
+
+class SessionPool:
+    """
+    ジョブをまたいでセッション（ブラウザ・HTTP の Cookie）を使い回すための置き場。
+    常駐プロセス（scrape_daemon.py）から使い、置いている間は watchdog を止めておく。
     """
 
-    total_stores = len(df)
+    def __init__(self):
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self, driver_factory, engine):
+        with self._lock:
+            for i, session in enumerate(self._idle):
+                if session.engine == engine:
+                    del self._idle[i]
+                    session.resume()
+                    return session
+        return ScrapeSession(driver_factory, engine)
+
+    def release(self, session):
+        if session.needs_recycle():
+            session.close()
+            return
+        session.suspend("待機中")
+        with self._lock:
+            self._idle.append(session)
 
-    try:
-        for store_no, (_, row) in enumerate(df.iterrows(), start=1):
-            list_url = row.get("store_url") or row.get("url")
-            save_dir = row.get("data_directory") or row.get("directory")
-            store_name = row.get("store_name") or row.get("name") or f"店舗{store_no}"
+    def close_all(self):
+        with self._lock:
+            sessions, self._idle = self._idle, []
+        for session in sessions:
+            session.close()
 
-            # 店舗単位の進捗を WebUI に通知（開始時）
-            print(f"__PROGRESS__ store {store_no - 1}/{total_stores}", flush=True)
-            print(f"__PROGRESS__ store_start {store_no}/{total_stores} {store_name}", flush=True)
 
-            if not list_url or not save_dir:
-                continue
+class ProgressReporter:
+    """
+    WebUI 向けの __PROGRESS__ マーカーを出力する。
+    複数ブラウザで並行処理する場合も、完了店舗数と処理中店舗の進み具合を合算して通知する。
+    """
+
+    def __init__(self, total_stores):
+        self.total_stores = total_stores
+        self.started = 0
+        self.finished = 0
+        self.partial = {}
+        self.lock = threading.Lock()
+
+    def store_started(self, store_name):
+        with self.lock:
+            self.started += 1
+            print(f"__PROGRESS__ store {self.finished}/{self.total_stores}", flush=True)
+            print(f"__PROGRESS__ store_start {self.started}/{self.total_stores} {store_name}", flush=True)
+
+    def day_done(self, store_no, store_name, date_idx, date_count):
+        with self.lock:
+            self.partial[store_no] = date_idx / max(1, date_count)
+            pct = int(((self.finished + sum(self.partial.values())) / max(1, self.total_stores)) * 100)
+            print(f"__PROGRESS__ pct {min(99, max(0, pct))} {store_name} {date_idx}/{date_count}日", flush=True)
+
+    def store_finished(self, store_no):
+        with self.lock:
+            self.partial.pop(store_no, None)
+            self.finished += 1
+            print(f"__PROGRESS__ store {self.finished}/{self.total_stores}", flush=True)
+
+
+def store_domain(url):
+    return urlparse(str(url or "")).netloc.lower()
 
-            os.makedirs(save_dir, exist_ok=True)
-            existing_files = set(f.replace(".html", "") for f in os.listdir(save_dir) if f.endswith(".html"))
 
+def collect_date_links(driver):
+    """一覧ページの日付リンクを [(YYYY-MM-DD, href), ...] で返す（一覧の下から順）。"""
+    links = []
+    for row_elem in reversed(driver.find_elements(By.CSS_SELECTOR, "div.date-table .table-row")):
+        try:
+            a_tag = row_elem.find_element(By.TAG_NAME, "a")
+            date_text = a_tag.text.strip().split("(")[0].replace("/", "-")
+            datetime.strptime(date_text, "%Y-%m-%d")
+            links.append((date_text, a_tag.get_attribute("href")))
+        except Exception:
+            continue
+    return links
+
+
+def find_date_link(driver, date_str):
+    for row_elem in reversed(driver.find_elements(By.CSS_SELECTOR, "div.date-table .table-row")):
+        try:
+            a_tag = row_elem.find_element(By.TAG_NAME, "a")
+            if a_tag.text.strip().startswith(date_str.replace("-", "/")):
+                return a_tag
+        except Exception:
+            continue
+    return None
+
+
+def wait_and_save_table(driver, store_name, date_str, output, timings):
+    """詳細ページで表の出現を待って保存する。保存できた場合は True。"""
+    wait_start = time.perf_counter()
+    with_rows = output.inline_format
+    found, table_html, rows = wait_for_table(driver, SCRAPE_TABLE_WAIT_TIMEOUT_SECONDS, with_rows=with_rows)
+    if found == "cloudflare":
+        # 確認画面が自動で抜けるのを待つ（抜けなければこの日は諦める）
+        found, table_html, rows = wait_for_table(
+            driver, SCRAPE_CLOUDFLARE_WAIT_TIMEOUT_SECONDS, allow_cloudflare=False, with_rows=with_rows,
+        )
+    waited = time.perf_counter() - wait_start
+    timings.append((date_str, waited))
+    print(f"[計測] {store_name}: {date_str} 表待機 {waited:.2f}s ({found or 'タイムアウト'})", flush=True)
+    if found == "table":
+        output.save(driver, date_str, table_html, rows)
+        return True
+    return False
+
+
+def open_list_page(session, list_url, store_name, label):
+    session.safe_get(list_url, f"{store_name}: {label}")
+    session.driver.execute_script(ADBLOCK_SCRIPT)
+
+
+def fetch_day_by_click(session, list_url, store_name, date_str, output, timings):
+    """一覧ページ上のリンクをクリックして詳細ページへ進み、取得後に一覧へ戻る。"""
+    driver = session.driver
+    link_element = find_date_link(driver, date_str)
+    if link_element:
+        try:
+            driver.execute_script("arguments[0].scrollIntoView(true);", link_element)
+            ActionChains(driver).move_to_element(link_element).pause(0.5).click().perform()
+            session.touch_transition(f"{store_name}: {date_str} 詳細ページ")
+            handle_vignette(driver, link_element)
+            driver.execute_script(ADBLOCK_SCRIPT)
+            wait_and_save_table(driver, store_name, date_str, output, timings)
+        except Exception:
+            if session.watchdog_triggered.is_set():
+                print("__WATCHDOG_TIMEOUT__", flush=True)
+                raise RuntimeError("ページ遷移停止を検知したため処理を中断しました")
+
+    open_list_page(session, list_url, store_name, "一覧ページ復帰")
+
+
+def fetch_day_direct(session, list_url, store_name, date_str, output, timings, hrefs):
+    """
+    一覧ページで集めた href へ直接遷移する。
+    href がない、または遷移先で表が取れなかった場合のみ一覧ページを読み直して href を更新し、1回だけやり直す。
+    """
+    driver = session.driver
+    for attempt in range(2):
+        href = hrefs.get(date_str)
+        if href:
             try:
-                safe_get(list_url, f"{store_name}: 一覧ページ")
-                if detect_cloudflare(driver):
-                    if sys.stdin and sys.stdin.isatty():
-                        input("[入力待ち] 認証通過後に Enter を押してください。")
-                    else:
-                        wait_for_cloudflare_clear(driver, timeout=300)
-
-                driver.execute_script(adblock_script)
-                date_rows = driver.find_elements(By.CSS_SELECTOR, "div.date-table .table-row")
-
-                date_list = []
-                for row_elem in reversed(date_rows):
-                    try:
-                        a_tag = row_elem.find_element(By.TAG_NAME, "a")
-                        date_text = a_tag.text.strip().split("(")[0].replace("/", "-")
-                        datetime.strptime(date_text, "%Y-%m-%d")
-                        if date_text not in existing_files:
-                            date_list.append(date_text)
-                    except Exception:
-                        continue
-
-                if args.max_days_per_store and args.max_days_per_store > 0:
-                    date_list = sorted(date_list)[-args.max_days_per_store:]
-                    print(f"[テスト] {store_name}: 最新 {len(date_list)} 日分のみ処理")
-
-                total_dates = max(1, len(date_list))
-                for date_idx, date_str in enumerate(date_list, start=1):
-                    while True:
-                        date_rows = driver.find_elements(By.CSS_SELECTOR, "div.date-table .table-row")
-                        link_element = None
-                        for row_elem in reversed(date_rows):
-                            try:
-                                a_tag = row_elem.find_element(By.TAG_NAME, "a")
-                                if a_tag.text.strip().startswith(date_str.replace("-", "/")):
-                                    link_element = a_tag
-                                    break
-                            except Exception:
-                                continue
-                        if not link_element:
-                            break
-
-                        try:
-                            driver.execute_script("arguments[0].scrollIntoView(true);", link_element)
-                            ActionChains(driver).move_to_element(link_element).pause(0.5).click().perform()
-                            touch_transition(f"{store_name}: {date_str} 詳細ページ")
-                            handle_vignette(driver, link_element)
-                            driver.execute_script(adblock_script)
-
-                            time.sleep(2)
-                            soup_check = BeautifulSoup(driver.page_source, "html.parser")
-                            table_check = soup_check.find("table", {"id": "all_data_table"})
-                            if table_check:
-                                save_html(driver, date_str, save_dir)
-                                break
-
-                            if detect_cloudflare(driver):
-                                time.sleep(7)
-                                soup_check = BeautifulSoup(driver.page_source, "html.parser")
-                                table_check = soup_check.find("table", {"id": "all_data_table"})
-                                if table_check:
-                                    time.sleep(2)
-                                    save_html(driver, date_str, save_dir)
-                                break
-                            break
-                        except Exception:
-                            if watchdog_triggered.is_set():
-                                print("__WATCHDOG_TIMEOUT__", flush=True)
-                                raise RuntimeError("ページ遷移停止を検知したため処理を中断しました")
-                            break
-
-                    safe_get(list_url, f"{store_name}: 一覧ページ復帰")
-                    driver.execute_script(adblock_script)
-
-                    # 日付単位の進捗（店舗内）を WebUI に通知
-                    pct = int((((store_no - 1) + (date_idx / total_dates)) / max(1, total_stores)) * 100)
-                    print(f"__PROGRESS__ pct {min(99, max(0, pct))} {store_name} {date_idx}/{len(date_list)}日", flush=True)
-
-            except Exception as e:
-                if watchdog_triggered.is_set():
+                session.safe_get(href, f"{store_name}: {date_str} 詳細ページ")
+                if "#google_vignette" in driver.current_url:
+                    session.safe_get(href, f"{store_name}: {date_str} 詳細ページ")
+                driver.execute_script(ADBLOCK_SCRIPT)
+                if wait_and_save_table(driver, store_name, date_str, output, timings):
+                    return
+            except Exception:
+                if session.watchdog_triggered.is_set():
                     print("__WATCHDOG_TIMEOUT__", flush=True)
-                    raise RuntimeError("ページ遷移停止を検知したため処理を中断しました") from e
+                    raise RuntimeError("ページ遷移停止を検知したため処理を中断しました")
+        if attempt:
+            return
+
+        open_list_page(session, list_url, store_name, "一覧ページ再取得")
+        fresh = dict(collect_date_links(driver))
+        if fresh.get(date_str) == href:
+            # リンクが変わっていなければやり直しても同じ結果になる
+            return
+        hrefs.update(fresh)
+
+
+def open_list_in_browser(session, list_url, store_name):
+    """ブラウザで一覧ページを開き、日付リンクを返す。HTTP エンジン併用時は通過後の Cookie を取り込む。"""
+    driver = session.ensure_driver()
+    session.safe_get(list_url, f"{store_name}: 一覧ページ")
+    if detect_cloudflare(driver):
+        if sys.stdin and sys.stdin.isatty():
+            with _INPUT_LOCK:
+                input(f"[入力待ち] {store_name}: 認証通過後に Enter を押してください。")
+        else:
+            wait_for_cloudflare_clear(driver, timeout=300)
+
+    driver.execute_script(ADBLOCK_SCRIPT)
+    if session.http is not None:
+        session.http.load_browser_state(driver)
+    return collect_date_links(driver)
+
+
+def fetch_day_http(session, store_name, date_str, output, timings, hrefs):
+    """HTTP で日付ページを取得して保存する。ブラウザでの取得が必要な場合は False。"""
+    href = hrefs.get(date_str)
+    if not href:
+        return False
+    fetch_start = time.perf_counter()
+    try:
+        page, blocked = session.http_get(href, f"{store_name}: {date_str} 詳細ページ")
+    except RuntimeError as e:
+        # 404/500 やタイムアウトはこの日だけの失敗として扱い、ブラウザでの取得に回す
+        print(f"[警告] {e}", flush=True)
+        return False
+    table_html = None if blocked else extract_table_html(page)
+    if not table_html:
+        return False
+    waited = time.perf_counter() - fetch_start
+    timings.append((date_str, waited))
+    print(f"[計測] {store_name}: {date_str} 取得 {waited:.2f}s (http)", flush=True)
+    output.save(session.driver, date_str, table_html)
+    return True
+
+
+def scrape_store(session, row, store_no, max_days_per_store, progress, navigation=SCRAPE_NAVIGATION,
+                 cancel_event=None, inline_format=False, aborted=None):
+    """
+    店舗の未取得の日付を取得する。取り消し、または他のブラウザの watchdog（aborted）で途中終了した場合は False。
+    inline_format の場合は取得した日ごとに表の行を店舗CSVへ反映する。
+    """
+    list_url = row.get("store_url") or row.get("url")
+    save_dir = row.get("data_directory") or row.get("directory")
+    store_name = row.get("store_name") or row.get("name") or f"店舗{store_no}"
+
+    if not list_url or not save_dir:
+        return True
+
+    os.makedirs(save_dir, exist_ok=True)
+    existing_files = store_coverage.scraped_days(STORE_COVERAGE_PATH, store_name)
+    if existing_files is None:
+        # 索引に未登録の店舗は、保存済みのファイル（アーカイブを含む）から一度だけ作る
+        existing_files = html_archive.saved_days(save_dir)
+        store_coverage.reconcile_scraped(STORE_COVERAGE_PATH, store_name, existing_files)
+
+    use_http = session.http is not None
+    date_links = []
+    if use_http:
+        try:
+            page, blocked = session.http_get(list_url, f"{store_name}: 一覧ページ")
+        except RuntimeError as e:
+            # 404/500 やタイムアウト、接続拒否はブラウザでの取得に回す
+            print(f"[警告] {e}", flush=True)
+            page, blocked = None, True
+        date_links = [] if blocked else parse_date_links(page, list_url)
+        if not date_links:
+            print(f"[切替] {store_name}: HTTP で一覧を取得できないためブラウザで取得します", flush=True)
+    list_in_browser = not date_links
+    if list_in_browser:
+        date_links = open_list_in_browser(session, list_url, store_name)
+    hrefs = dict(date_links)
+    date_list = [date_text for date_text, _ in date_links if date_text not in existing_files]
+
+    if max_days_per_store and max_days_per_store > 0:
+        date_list = sorted(date_list)[-max_days_per_store:]
+        print(f"[テスト] {store_name}: 最新 {len(date_list)} 日分のみ処理")
+    output = StoreOutput(store_name, save_dir, inline_format)
+    if inline_format:
+        # 古い日付から取得すると、店舗CSVへは毎回末尾への追記で済む
+        date_list = sorted(date_list)
+
+    timings = []
+    navigations_before = session.navigations
+    http_misses = 0
+    for date_idx, date_str in enumerate(date_list, start=1):
+        if cancel_event is not None and cancel_event.is_set():
+            print(f"[中断] {store_name}: 取り消し要求により {date_idx - 1}/{len(date_list)}日で停止します", flush=True)
+            print_timing_summary(store_name, timings, session.navigations - navigations_before)
+            return False
+        if aborted is not None and aborted.is_set():
+            print(
+                f"[中断] {store_name}: 他のブラウザでページ遷移停止を検知したため {date_idx - 1}/{len(date_list)}日で停止します",
+                flush=True,
+            )
+            print_timing_summary(store_name, timings, session.navigations - navigations_before)
+            return False
+        if use_http and fetch_day_http(session, store_name, date_str, output, timings, hrefs):
+            http_misses = 0
+        elif use_http:
+            # 確認画面などで HTTP では取れない日はブラウザで取り、通過後の Cookie を HTTP 側へ引き継ぐ
+            session.ensure_driver()
+            fetch_day_direct(session, list_url, store_name, date_str, output, timings, hrefs)
+            session.http.load_browser_state(session.driver)
+            list_in_browser = False
+            http_misses += 1
+            if http_misses >= SCRAPE_HTTP_MAX_MISSES:
+                print(f"[切替] {store_name}: HTTP での取得に続けて失敗したため、以降はブラウザで取得します", flush=True)
+                use_http = False
+        elif navigation == "click":
+            if not list_in_browser:
+                open_list_page(session, list_url, store_name, "一覧ページ")
+                list_in_browser = True
+            fetch_day_by_click(session, list_url, store_name, date_str, output, timings)
+        else:
+            fetch_day_direct(session, list_url, store_name, date_str, output, timings, hrefs)
+            list_in_browser = False
+
+        if date_str in output.saved:
+            store_coverage.record_scraped(STORE_COVERAGE_PATH, store_name, date_str)
+            # 保存済みの日付を WebUI に通知（ジョブ再開時のチェックポイント）
+            print(f"__CHECKPOINT__ day {date_str} {store_name}", flush=True)
+        else:
+            reason = "表を取得できませんでした" if date_str in hrefs else "一覧ページに日付のリンクがありません"
+            store_coverage.record_scraped(STORE_COVERAGE_PATH, store_name, date_str, error=reason)
+
+        # 日付単位の進捗（店舗内）を WebUI に通知
+        progress.day_done(store_no, store_name, date_idx, len(date_list))
+
+    print_timing_summary(store_name, timings, session.navigations - navigations_before)
+    return True
+
+
+def _worker_loop(store_queue, domain_limits, max_days_per_store, navigation, engine, progress, cancel_event,
+                 aborted, driver_factory, session_pool=None, inline_format=False):
+    """
+    キューから店舗を取り出して処理する。watchdog が発火した場合は aborted をセットし、False を返して終了する。
+    cancel_event（取り消し要求）または aborted（他のブラウザの watchdog）がセットされると新しい店舗には進まない。
+    """
+    session = None
+    try:
+        while not cancel_event.is_set() and not aborted.is_set():
+            try:
+                store_no, row = store_queue.get_nowait()
+            except queue.Empty:
+                return True
+
+            store_name = row.get("store_name") or row.get("name") or f"店舗{store_no}"
+            # 店舗単位の進捗を WebUI に通知（開始時）
+            progress.store_started(store_name)
+            domain_limit = domain_limits[store_domain(row.get("store_url") or row.get("url"))]
+            try:
+                if session is None:
+                    domain_limit.acquire()
+                else:
+                    with session.paused(f"{store_name}: 同一ドメインの空き待ち"):
+                        domain_limit.acquire()
+                try:
+                    if session is None:
+                        if session_pool is not None:
+                            session = session_pool.acquire(driver_factory, engine)
+                        else:
+                            session = ScrapeSession(driver_factory, engine)
+                    completed = scrape_store(
+                        session, row, store_no, max_days_per_store, progress, navigation, cancel_event, inline_format,
+                        aborted,
+                    )
+                finally:
+                    domain_limit.release()
+                if completed:
+                    print(f"__CHECKPOINT__ store {store_name}", flush=True)
+            except Exception:
+                if session is not None and session.watchdog_triggered.is_set():
+                    print("__WATCHDOG_TIMEOUT__", flush=True)
+                    # 他のブラウザも新しい店舗には進まず終了させる
+                    aborted.set()
+                    return False
                 print(f"[エラー] 店舗処理失敗: {store_name}")
-                # 失敗時も次店舗へ進むため進捗は進める
-                print(f"__PROGRESS__ store {store_no}/{total_stores}", flush=True)
-                continue
+            # 店舗単位の進捗を WebUI に通知（完了時。失敗時も次店舗へ進むため進める）
+            progress.store_finished(store_no)
+            if session is not None and session.needs_recycle():
+                session.close()
+                session = None
+        return True
+    finally:
+        if session is not None:
+            if session_pool is not None:
+                session_pool.release(session)
+            else:
+                session.close()
+
 
-            # 店舗単位の進捗を WebUI に通知（完了時）
-            print(f"__PROGRESS__ store {store_no}/{total_stores}", flush=True)
+def run_scrape(df, max_days_per_store=0, workers=1, per_domain_limit=SCRAPE_PER_DOMAIN_LIMIT,
+               navigation=SCRAPE_NAVIGATION, engine=SCRAPE_FETCH_ENGINE, driver_factory=create_driver,
+               session_pool=None, cancel_event=None, inline_format=SCRAPE_INLINE_FORMAT):
+    """
+    店舗リストを workers 個のブラウザで分担して処理する。
+    同一ドメインの店舗は per_domain_limit 個までしか同時に処理しない。
+    session_pool を渡した場合、セッションは閉じずにプールへ戻す。
+    cancel_event がセットされると、処理中の日付が終わった時点で停止する。
+    """
+    store_queue = queue.Queue()
+    for store_no, (_, row) in enumerate(df.iterrows(), start=1):
+        store_queue.put((store_no, row))
+
+    domain_limit = max(1, per_domain_limit)
+    domain_limits = {}
+    for _, row in df.iterrows():
+        domain = store_domain(row.get("store_url") or row.get("url"))
+        domain_limits.setdefault(domain, threading.BoundedSemaphore(domain_limit))
+
+    progress = ProgressReporter(len(df))
+    cancel_event = cancel_event or threading.Event()
+    # watchdog による中断は取り消し要求とは別に伝える（取り消しと誤って表示しないため）
+    aborted = threading.Event()
+    workers = max(1, min(workers, len(df)))
+    results = []
+
+    def run_worker():
+        results.append(_worker_loop(
+            store_queue, domain_limits, max_days_per_store, navigation, engine, progress, cancel_event, aborted,
+            driver_factory, session_pool, inline_format,
+        ))
 
+    try:
+        if workers == 1:
+            run_worker()
+        else:
+            print(f"[並列] ブラウザ {workers} 個で処理します（同一ドメイン上限 {domain_limit}）", flush=True)
+            threads = [threading.Thread(target=run_worker, daemon=True) for _ in range(workers)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
     finally:
-        watchdog_stop.set()
-        with contextlib.suppress(Exception):
-            driver.quit()
-        del driver
         gc.collect()
 
+    if not all(results):
+        raise RuntimeError("ページ遷移停止を検知したため処理を中断しました")
+
+
+def watch_cancel_file(path, cancel_event, poll_interval=1.0):
+    """取り消し用ファイルが作られたら cancel_event をセットする（WebUI のジョブ取り消し用）。"""
+    while not cancel_event.wait(poll_interval):
+        if os.path.exists(path):
+            print("[中断] 取り消し要求を受け付けました", flush=True)
+            cancel_event.set()
+            return
+
+
+def main(argv=None, session_pool=None):
+    parser = argparse.ArgumentParser(description='選択された店舗のみをスクレイピング')
+    parser.add_argument('--file', type=str, help='店舗リスト CSV ファイルを指定')
+    parser.add_argument('--use-temp', action='store_true', help='runtime/temp_store_list.csv を使用')
+    parser.add_argument('--max-stores', type=int, default=0, help='処理する店舗数上限（0は無制限）')
+    parser.add_argument('--max-days-per-store', type=int, default=0, help='1店舗あたり処理日数上限（0は無制限）')
+    parser.add_argument('--workers', type=int, default=SCRAPE_WORKERS, help='同時に動かすブラウザ数')
+    parser.add_argument('--per-domain-limit', type=int, default=SCRAPE_PER_DOMAIN_LIMIT, help='同一ドメインへ同時アクセスするブラウザ数の上限')
+    parser.add_argument('--navigation', choices=NAVIGATION_MODES, default=SCRAPE_NAVIGATION,
+                        help='日付ページへの移動方法（direct=URLへ直接遷移 / click=リンクをクリック）')
+    parser.add_argument('--engine', choices=FETCH_ENGINES, default=SCRAPE_FETCH_ENGINE,
+                        help='取得エンジン（http=HTTP で取得し必要時のみブラウザ / browser=常にブラウザ）')
+    parser.add_argument('--cancel-file', type=str, help='このファイルが作られたら処理を取り消す')
+    parser.add_argument('--inline-format', action=argparse.BooleanOptionalAction, default=SCRAPE_INLINE_FORMAT,
+                        help='取得した表の行をその場で店舗CSVへ反映する（HTMLの保存は SCRAPE_INLINE_KEEP_HTML）')
+    parser.add_argument('stores', nargs='*', help='店舗名（複数可）')
+    args = parser.parse_args(argv)
+
+    if args.file:
+        try:
+            df = read_csv_with_fallback(args.file)
+        except Exception:
+            print("[エラー] 指定ファイルの読み込みに失敗しました")
+            return
+    elif args.use_temp:
+        df = load_stores("temp")
+    else:
+        df = load_stores("temp") if os.path.exists(DEFAULT_TEMP_STORE_LIST_PATH) else load_stores("csv")
+
+    if df.empty:
+        print("[エラー] 店舗リストが空です")
+        return
+
+    if args.max_stores and args.max_stores > 0:
+        df = df.head(args.max_stores)
+        print(f"[テスト] 店舗数を {args.max_stores} 件に制限して実行します")
+
+    cancel_event = threading.Event()
+    if args.cancel_file:
+        threading.Thread(target=watch_cancel_file, args=(args.cancel_file, cancel_event), daemon=True).start()
+
+    try:
+        run_scrape(
+            df,
+            max_days_per_store=args.max_days_per_store,
+            workers=args.workers,
+            per_domain_limit=args.per_domain_limit,
+            navigation=args.navigation,
+            engine=args.engine,
+            session_pool=session_pool,
+            cancel_event=cancel_event,
+            inline_format=args.inline_format,
+        )
+    finally:
+        # 監視スレッドを止める
+        cancel_event.set()
+
 
 if __name__ == '__main__':
     main()
-
@@ -1,15 +1,17 @@
 from flask import Flask, request, jsonify, make_response
-import pandas as pd
 import os
 from datetime import datetime
 import subprocess
 import sys
 import json
 import importlib.util
-from flask import send_file
+from flask import send_file, Response, stream_with_context
 import threading
+import time
 import uuid
 import re
+import contextlib
+import itertools
 from collections import deque
 
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -18,17 +20,61 @@ PROJECT_ROOT = os.path.dirname(INTERNAL_ROOT)
 RUNTIME_DIR = os.path.join(INTERNAL_ROOT, "runtime")
 os.makedirs(RUNTIME_DIR, exist_ok=True)
 
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+import job_queue  # noqa: E402
+import job_store  # noqa: E402
+import scrape_log  # noqa: E402
+import slotdata_db  # noqa: E402
+import store_coverage  # noqa: E402
+import store_list  # noqa: E402
+
 app = Flask(__name__, static_folder='.')
 app.config['JSON_AS_ASCII'] = False
 
 STORE_LIST_PATH = os.path.join(PROJECT_ROOT, "store_list.csv")
-TEMP_STORE_LIST_PATH = os.getenv("TEMP_STORE_LIST_PATH", os.path.join(RUNTIME_DIR, "temp_store_list.csv"))
-SCRAPING_SCRIPT_PATH = os.getenv("SCRAPING_SCRIPT_PATH", os.path.join(APP_DIR, "anasuro_selective.py"))
+# store_list.csv の解析結果のキャッシュ（更新時刻・サイズが変わった場合のみ読み直す）
+STORE_LIST = store_list.StoreListRepository(STORE_LIST_PATH)
+DEFAULT_SCRAPING_SCRIPT_PATH = os.path.join(APP_DIR, "anasuro_selective.py")
+SCRAPING_SCRIPT_PATH = os.getenv("SCRAPING_SCRIPT_PATH", DEFAULT_SCRAPING_SCRIPT_PATH)
 OFFLINE_SCRIPT_PATH = os.getenv("OFFLINE_SCRIPT_PATH", os.path.join(APP_DIR, "offline-scraing.py"))
 LOG_FILE = os.getenv("LOG_FILE", os.path.join(RUNTIME_DIR, "scraping_log.json"))
 COMPLETED_STORES_PATH = os.getenv("COMPLETED_STORES_PATH", os.path.join(RUNTIME_DIR, "completed_stores.json"))
+SLOTDATA_DB_PATH = os.getenv(
+    "SLOTDATA_DB_PATH",
+    os.path.join(os.getenv("EXCEL_OUTPUT_DIR", os.path.join(PROJECT_ROOT, "output")), "slotdata.db"),
+)
+# 店舗ごとの取得・整形状況の索引（スクレイパー・整形処理が記録する）
+STORE_COVERAGE_PATH = os.getenv("STORE_COVERAGE_PATH", os.path.join(RUNTIME_DIR, "coverage.db"))
+# 1 の場合、スクレイピングを常駐プロセス（scrape_daemon.py）で実行してブラウザを使い回す
+SCRAPE_DAEMON_ENABLED = os.getenv("SCRAPE_DAEMON_ENABLED", "0") == "1"
+DATE_PARAM_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
 JOBS = {}
 JOBS_LOCK = threading.Lock()
+# ジョブ更新の通知（/api/jobs/<id>/events がロックを持たずに待てるよう JOBS_LOCK と共有する）
+JOBS_CHANGED = threading.Condition(JOBS_LOCK)
+JOB_EVENTS_HEARTBEAT_SECONDS = int(os.getenv("JOB_EVENTS_HEARTBEAT_SECONDS", "15"))
+JOB_FINAL_STATUSES = ("completed", "failed", "cancelled")
+# ジョブの永続化先と保持設定（メモリ上には終了済みジョブを JOB_MEMORY_LIMIT 件まで残す）
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(RUNTIME_DIR, "jobs.db"))
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "30"))
+JOB_MEMORY_LIMIT = int(os.getenv("JOB_MEMORY_LIMIT", "50"))
+JOB_PERSIST_INTERVAL_SECONDS = float(os.getenv("JOB_PERSIST_INTERVAL_SECONDS", "2"))
+_JOB_PERSISTED_AT = {}
+# ジョブの実行キュー（同時に実行するスクレイピングの数と、ジョブごとの店舗リスト・取り消し用ファイルの置き場所）
+SCRAPE_MAX_CONCURRENT_JOBS = int(os.getenv("SCRAPE_MAX_CONCURRENT_JOBS", "1"))
+JOB_STORE_LIST_DIR = os.getenv("JOB_STORE_LIST_DIR", os.path.join(RUNTIME_DIR, "job_store_lists"))
+# 取り消し要求後、この秒数を過ぎても終わらない子プロセス（常駐プロセスで実行中の場合は常駐プロセス）は強制終了する
+JOB_CANCEL_GRACE_SECONDS = int(os.getenv("JOB_CANCEL_GRACE_SECONDS", "60"))
+RUNNING_PROCS = {}
+# 常駐プロセスで実行中のジョブID
+DAEMON_JOBS = set()
+# 実行中ジョブの出力行（/api/jobs/<id>/events の output イベントで送る）
+JOB_OUTPUT = {}
+JOB_OUTPUT_LINES = int(os.getenv("JOB_OUTPUT_LINES", "200"))
+_JOB_OUTPUT_SEQ = itertools.count(1)
+# 重複依頼の確認から登録までを1件ずつ行う
+SCRAPE_SUBMIT_LOCK = threading.Lock()
 
 TEST_MODE_AVAILABLE = False
 TEST_MODE_MAX_DAYS = 3
@@ -54,73 +100,20 @@ if os.path.exists(TEST_MODE_MODULE_PATH):
         print(f"[警告] devtools test_mode backend 読み込み失敗: {e}")
 
 
-def _normalize_directory_value(value):
-    path_text = str(value or "").strip().strip('"')
-    if not path_text:
-        return ""
-
-    normalized = path_text.replace("/", "\\")
-    if os.name == "nt":
-        had_dot_prefix = normalized.startswith(".\\")
-        try:
-            normalized = os.path.normpath(normalized)
-        except Exception:
-            pass
-        if had_dot_prefix and not os.path.isabs(normalized) and normalized not in (".", ".\\"):
-            normalized = ".\\" + normalized.lstrip("\\")
-
-    if normalized == ".":
-        return ".\\"
-    return normalized
-
-
 def load_stores():
     try:
-        if not os.path.exists(STORE_LIST_PATH):
-            return []
-
-        df = None
-        for enc in ("utf-8", "utf-8-sig", "cp932"):
-            try:
-                df = pd.read_csv(STORE_LIST_PATH, encoding=enc)
-                break
-            except Exception:
-                continue
-        if df is None:
-            raise RuntimeError("store_list.csv の読み込みに失敗しました（encoding不一致）")
-
-        stores = []
-        for i, (_, row) in enumerate(df.iterrows(), start=1):
-            stores.append({
-                "name": str(row.get("store_name") or row.get("name") or f"店舗{i}"),
-                "url": str(row.get("store_url") or row.get("url") or ""),
-                "directory": _normalize_directory_value(row.get("data_directory") or row.get("directory") or ""),
-            })
-        return stores
+        return STORE_LIST.stores()
     except Exception as e:
         print(f"[エラー] 店舗リスト読み込み失敗: {e}")
         return []
 
+
 def save_stores(stores):
     """
     ブラウザ編集結果を store_list.csv に保存する。
     stores: [{"name": "...", "url": "...", "directory": "..."}, ...]
     """
-    normalized = []
-    for i, s in enumerate(stores, start=1):
-        name = str((s.get("name") or "").strip())
-        url = str((s.get("url") or "").strip())
-        directory = _normalize_directory_value(s.get("directory"))
-        if not name:
-            name = f"店舗{i}"
-        normalized.append({
-            "store_name": name,
-            "store_url": url,
-            "data_directory": directory,
-        })
-
-    df = pd.DataFrame(normalized, columns=["store_name", "store_url", "data_directory"])
-    df.to_csv(STORE_LIST_PATH, index=False, encoding="utf-8-sig")
+    STORE_LIST.save(stores)
 
 
 def _to_project_relative_path(path_value):
@@ -179,38 +172,167 @@ if ($result -eq [System.Windows.Forms.DialogResult]::OK -and $dialog.FileName) {
         raise RuntimeError((result.stderr or "").strip() or "フォルダ選択ダイアログの起動に失敗しました")
     return (result.stdout or "").strip()
 
+def _persist_job(job, request=None):
+    try:
+        job_store.save_job(JOB_STORE_PATH, job, request)
+        _JOB_PERSISTED_AT[job["job_id"]] = time.monotonic()
+    except Exception as e:
+        print(f"[警告] ジョブ状態の保存に失敗しました: {e}")
+
+
 def _set_job(job_id, **kwargs):
     with JOBS_LOCK:
         job = JOBS.get(job_id)
         if not job:
             return
         job.update(kwargs)
+        job["version"] = job.get("version", 0) + 1
+        JOBS_CHANGED.notify_all()
+        # 進捗だけの更新は間引いて保存する（状態の変化は必ず保存）
+        elapsed = time.monotonic() - _JOB_PERSISTED_AT.get(job_id, 0)
+        snapshot = dict(job) if ("status" in kwargs or elapsed >= JOB_PERSIST_INTERVAL_SECONDS) else None
+    if snapshot is not None:
+        _persist_job(snapshot)
+
+
+def _register_job(job, scrape_request):
+    with JOBS_LOCK:
+        JOBS[job["job_id"]] = job
+        snapshot = dict(job)
+    _persist_job(snapshot, scrape_request)
+
+
+def _evict_finished_jobs():
+    """メモリ上の終了済みジョブを JOB_MEMORY_LIMIT 件まで減らす（永続化済みなので API からは引き続き参照できる）。"""
+    with JOBS_LOCK:
+        finished = sorted(
+            (job.get("completed_at") or "", job_id)
+            for job_id, job in JOBS.items()
+            if job.get("status") in JOB_FINAL_STATUSES
+        )
+        for _, job_id in finished[:max(0, len(finished) - JOB_MEMORY_LIMIT)]:
+            JOBS.pop(job_id, None)
+            JOB_OUTPUT.pop(job_id, None)
+            _JOB_PERSISTED_AT.pop(job_id, None)
+
+
+def _find_job(job_id):
+    """メモリ上になければ永続化したジョブを返す。"""
+    with JOBS_LOCK:
+        job = JOBS.get(job_id)
+        if job:
+            return dict(job)
+    job, _ = job_store.load_job(JOB_STORE_PATH, job_id)
+    return job
+
+
+def _restore_jobs():
+    """起動時に、前回のサーバー停止で中断したジョブを失敗（再開可能）にし、古いジョブを削除する。"""
+    try:
+        interrupted = job_store.mark_interrupted(JOB_STORE_PATH, "サーバー停止により中断しました")
+        if interrupted:
+            print(f"[情報] 中断されたジョブ {len(interrupted)} 件を失敗として記録しました（スクレイピングは再開できます）")
+        job_store.purge_finished(JOB_STORE_PATH, JOB_RETENTION_DAYS)
+    except Exception as e:
+        print(f"[警告] ジョブ履歴の読み込みに失敗しました: {e}")
+
+
+_restore_jobs()
 
 def _get_job_field(job_id, key, default=None):
     with JOBS_LOCK:
         job = JOBS.get(job_id) or {}
         return job.get(key, default)
 
-def _run_scrape_job(job_id, cmd):
+def _append_job_output(job_id, line):
+    """出力行を保持し、/api/jobs/<id>/events を待っている接続へ通知する。"""
+    with JOBS_LOCK:
+        job = JOBS.get(job_id)
+        if not job:
+            return
+        JOB_OUTPUT.setdefault(job_id, deque(maxlen=JOB_OUTPUT_LINES)).append((next(_JOB_OUTPUT_SEQ), line))
+        job["version"] = job.get("version", 0) + 1
+        JOBS_CHANGED.notify_all()
+
+
+def _run_job_subprocess(cmd, on_line, job_id=None):
+    proc = subprocess.Popen(
+        cmd,
+        cwd=PROJECT_ROOT,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+        bufsize=1,
+    )
+    with JOBS_LOCK:
+        RUNNING_PROCS[job_id] = proc
+    try:
+        for line in proc.stdout:
+            on_line(line.rstrip("\n"))
+        return proc.wait()
+    finally:
+        with JOBS_LOCK:
+            if RUNNING_PROCS.get(job_id) is proc:
+                RUNNING_PROCS.pop(job_id, None)
+
+
+def _use_scrape_daemon():
+    """常駐プロセスは anasuro_selective.main() を実行するため、SCRAPING_SCRIPT_PATH を差し替えた場合は使わない。"""
+    if not SCRAPE_DAEMON_ENABLED:
+        return False
+    if os.path.abspath(SCRAPING_SCRIPT_PATH) != DEFAULT_SCRAPING_SCRIPT_PATH:
+        print("[警告] SCRAPING_SCRIPT_PATH が指定されているため、常駐プロセスを使わず子プロセスで実行します")
+        return False
+    return True
+
+
+def _run_scrape_daemon(job_id, args, on_line):
+    """常駐プロセスでジョブを実行する。常駐プロセスを使えない場合は None。"""
+    # 常駐プロセスを使わない場合は起動時に読み込まない
+    import scrape_daemon
+
+    if not scrape_daemon.ensure_running():
+        print("[警告] スクレイピング常駐プロセスを起動できないため、子プロセスで実行します")
+        return None
+    with JOBS_LOCK:
+        DAEMON_JOBS.add(job_id)
+    try:
+        return scrape_daemon.run_job(args, on_line)
+    except (OSError, EOFError) as e:
+        print(f"[警告] スクレイピング常駐プロセスに接続できません: {e}")
+        return None
+    finally:
+        with JOBS_LOCK:
+            DAEMON_JOBS.discard(job_id)
+
+
+def _run_scrape_job(job_id, args):
+    """args はスクレイパーの引数（_scrape_args）。常駐プロセスと子プロセスのどちらで実行しても同じものを渡す。"""
     marker = re.compile(r"__PROGRESS__\s+store\s+(\d+)/(\d+)")
     marker_store_start = re.compile(r"__PROGRESS__\s+store_start\s+(\d+)/(\d+)(?:\s+(.+))?")
     marker_pct = re.compile(r"__PROGRESS__\s+pct\s+(\d{1,3})(?:\s+(.+))?")
+    marker_checkpoint_day = re.compile(r"__CHECKPOINT__\s+day\s+(\d{4}-\d{2}-\d{2})\s+(.+)")
+    marker_checkpoint_store = re.compile(r"__CHECKPOINT__\s+store\s+(.+)")
     output_tail = deque(maxlen=200)
     try:
         _set_job(job_id, status="running", progress=0, message="スクレイピング処理を開始しました")
-        proc = subprocess.Popen(
-            cmd,
-            cwd=PROJECT_ROOT,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            encoding="utf-8",
-            errors="replace",
-            bufsize=1,
-        )
-        for line in proc.stdout:
-            line = line.rstrip("\n")
+
+        def on_line(line):
             output_tail.append(line)
+            _append_job_output(job_id, line)
+            m_day = marker_checkpoint_day.search(line)
+            if m_day:
+                job_store.add_checkpoint(JOB_STORE_PATH, job_id, m_day.group(2).strip(), m_day.group(1))
+                _set_job(job_id, checkpoint_days=int(_get_job_field(job_id, "checkpoint_days", 0) or 0) + 1)
+                return
+
+            m_store = marker_checkpoint_store.search(line)
+            if m_store:
+                job_store.add_checkpoint(JOB_STORE_PATH, job_id, m_store.group(1).strip())
+                return
+
             m = marker.search(line)
             if m:
                 current = int(m.group(1))
@@ -223,7 +345,7 @@ def _run_scrape_job(job_id, cmd):
                     store_done=min(current, total),
                     store_total=total,
                 )
-                continue
+                return
 
             m_start = marker_store_start.search(line)
             if m_start:
@@ -239,7 +361,7 @@ def _run_scrape_job(job_id, cmd):
                     store_total=total,
                     message=start_msg,
                 )
-                continue
+                return
 
             m_pct = marker_pct.search(line)
             if m_pct:
@@ -250,9 +372,22 @@ def _run_scrape_job(job_id, cmd):
                     message = f"{message} ({detail})"
                 _set_job(job_id, progress=progress, message=message)
 
-        return_code = proc.wait()
+        return_code = None
+        if _use_scrape_daemon():
+            return_code = _run_scrape_daemon(job_id, args, on_line)
+        if return_code is None:
+            return_code = _run_job_subprocess(_build_scrape_cmd(args), on_line, job_id)
         joined_output = "\n".join(output_tail)
-        if return_code == 0:
+        if _get_job_field(job_id, "cancel_requested"):
+            _set_job(
+                job_id,
+                status="cancelled",
+                message="ジョブを取り消しました",
+                output=joined_output[-4000:],
+                completed_at=datetime.now().isoformat(),
+                resumable=True,
+            )
+        elif return_code == 0:
             _set_job(
                 job_id,
                 status="completed",
@@ -261,6 +396,7 @@ def _run_scrape_job(job_id, cmd):
                 store_done=int(_get_job_field(job_id, "store_total", 0) or 0),
                 output=joined_output[-4000:],
                 completed_at=datetime.now().isoformat(),
+                resumable=False,
             )
         else:
             failure_message = "スクレイピング処理に失敗しました"
@@ -273,6 +409,7 @@ def _run_scrape_job(job_id, cmd):
                 message=failure_message,
                 output=joined_output[-4000:],
                 completed_at=datetime.now().isoformat(),
+                resumable=True,
             )
     except Exception as e:
         _set_job(
@@ -281,7 +418,169 @@ def _run_scrape_job(job_id, cmd):
             progress=0,
             message=f"スクレイピング実行エラー: {str(e)}",
             completed_at=datetime.now().isoformat(),
+            resumable=True,
+        )
+    _evict_finished_jobs()
+
+
+def _job_files(job_id):
+    """ジョブ専用の (店舗リスト CSV, 取り消し用ファイル) のパス。"""
+    return (
+        os.path.join(JOB_STORE_LIST_DIR, f"{job_id}.csv"),
+        os.path.join(JOB_STORE_LIST_DIR, f"{job_id}.cancel"),
+    )
+
+
+def _run_queued_scrape(job_id, payload):
+    """キューから取り出したジョブを、ジョブ専用の店舗リストで実行する。"""
+    store_list_path, cancel_path = _job_files(job_id)
+    try:
+        if _get_job_field(job_id, "cancel_requested"):
+            _set_job(job_id, status="cancelled", message="ジョブを取り消しました", completed_at=datetime.now().isoformat(), resumable=True)
+            return
+        if not _write_temp_store_list(payload["stores"], store_list_path):
+            _set_job(
+                job_id,
+                status="failed",
+                message="選択された店舗が店舗リストに見つかりません",
+                completed_at=datetime.now().isoformat(),
+                resumable=False,
+            )
+            return
+        _run_scrape_job(job_id, _scrape_args(payload["options"], store_list_path, cancel_path))
+    finally:
+        for path in (store_list_path, cancel_path):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+
+# 常駐プロセスはジョブを1件ずつ実行するため、2件目以降が実行中のまま待たないよう同時実行数を1にする
+if SCRAPE_DAEMON_ENABLED and SCRAPE_MAX_CONCURRENT_JOBS > 1:
+    print("[警告] 常駐プロセスを使う場合はスクレイピングを1件ずつ実行します（SCRAPE_MAX_CONCURRENT_JOBS は無視します）")
+    SCRAPE_MAX_CONCURRENT_JOBS = 1
+SCRAPE_SCHEDULER = job_queue.JobScheduler(_run_queued_scrape, SCRAPE_MAX_CONCURRENT_JOBS)
+
+
+def _load_completed_stores():
+    """整形スクリプトが書き出した (データ更新があった店舗, 処理した店舗) を返す。"""
+    if not os.path.exists(COMPLETED_STORES_PATH):
+        return [], []
+    try:
+        with open(COMPLETED_STORES_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return [], []
+    if not isinstance(data, dict):
+        return [], []
+    return data.get("completed", []), data.get("processed", [])
+
+
+def _run_format_job(job_id, payload):
+    marker_store = re.compile(r"__PROGRESS__\s+store\s+(\d+)/(\d+)")
+    marker_store_start = re.compile(r"__PROGRESS__\s+store_start\s+(\d+)/(\d+)(?:\s+(.+))?")
+    marker_file = re.compile(r"__PROGRESS__\s+file\s+(\d+)/(\d+)")
+    output_tail = deque(maxlen=200)
+    try:
+        _set_job(job_id, status="running", progress=0, message="Excel 自動整形を開始しました")
+
+        def on_line(line):
+            output_tail.append(line)
+            _append_job_output(job_id, line)
+            m = marker_store.search(line)
+            if m:
+                current = int(m.group(1))
+                total = max(1, int(m.group(2)))
+                progress = min(99, int((current / total) * 100))
+                _set_job(
+                    job_id,
+                    progress=progress,
+                    message=f"整形処理を実行中... {progress}%",
+                    store_done=min(current, total),
+                    store_total=total,
+                )
+                return
+
+            m_start = marker_store_start.search(line)
+            if m_start:
+                total = max(1, int(m_start.group(2)))
+                current_store = min(max(1, int(m_start.group(1))), total)
+                store_name = (m_start.group(3) or "").strip()
+                start_msg = f"店舗整形中: {current_store}/{total}"
+                if store_name:
+                    start_msg = f"{start_msg} ({store_name})"
+                # 日付ファイルの進捗は店舗ごとに数え直す
+                _set_job(job_id, store_current=current_store, store_total=total, file_done=0, file_total=0, message=start_msg)
+                return
+
+            m_file = marker_file.search(line)
+            if m_file:
+                _set_job(job_id, file_done=int(m_file.group(1)), file_total=int(m_file.group(2)))
+
+        return_code = _run_job_subprocess(payload["cmd"], on_line, job_id)
+        joined_output = "\n".join(output_tail)
+        if return_code != 0:
+            _set_job(
+                job_id,
+                status="failed",
+                progress=0,
+                message="整形処理が異常終了しました",
+                output=joined_output[-4000:],
+                completed_at=datetime.now().isoformat(),
+            )
+        else:
+            completed_stores, processed_stores = _load_completed_stores()
+            log_entry = {
+                "timestamp": datetime.now().isoformat(),
+                "action": "format_offline",
+                "job_id": job_id,
+                "completed_count": len(completed_stores),
+                "processed_count": len(processed_stores),
+            }
+            scrape_log.append_entry(LOG_FILE, log_entry)
+            _set_job(
+                job_id,
+                status="completed",
+                progress=100,
+                message="Excel 自動整形を実行しました",
+                store_done=int(_get_job_field(job_id, "store_total", 0) or 0),
+                completed_stores=completed_stores,
+                processed_stores=processed_stores,
+                output=joined_output[-4000:],
+                completed_at=datetime.now().isoformat(),
+            )
+    except Exception as e:
+        _set_job(
+            job_id,
+            status="failed",
+            progress=0,
+            message=f"整形処理実行エラー: {str(e)}",
+            completed_at=datetime.now().isoformat(),
         )
+    _evict_finished_jobs()
+
+
+# 整形は店舗CSV・整形状態を書き換えるため、常に1件ずつ実行する
+FORMAT_SCHEDULER = job_queue.JobScheduler(_run_format_job, 1)
+
+
+def _scheduler_for(job):
+    return FORMAT_SCHEDULER if job.get("kind") == "format" else SCRAPE_SCHEDULER
+
+
+def _terminate_job(job_id):
+    """取り消し要求後も終わらないジョブを強制終了する。"""
+    with JOBS_LOCK:
+        proc = RUNNING_PROCS.get(job_id)
+        on_daemon = job_id in DAEMON_JOBS
+    if proc is not None and proc.poll() is None:
+        print("[警告] 取り消し要求後も終了しないため、スクレイピングを強制終了します")
+        proc.terminate()
+    elif on_daemon:
+        import scrape_daemon
+
+        # 常駐プロセスはジョブを1件ずつ実行するため、止めるのはこのジョブだけ（次のジョブで起動し直す）
+        print("[警告] 取り消し要求後も終了しないため、スクレイピング常駐プロセスを強制終了します")
+        scrape_daemon.terminate()
 
 
 @app.route('/')
@@ -360,13 +659,227 @@ def pick_directory_api():
     except Exception as e:
         return jsonify({"error": f"フォルダ選択エラー: {str(e)}"}), 500
 
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    try:
+        limit = max(1, min(int(request.args.get("limit", 20)), 200))
+    except ValueError:
+        return jsonify({"error": "limit は整数で指定してください"}), 400
+    return jsonify(job_store.list_jobs(JOB_STORE_PATH, limit))
+
+
 @app.route('/api/jobs/<job_id>', methods=['GET'])
 def get_job(job_id):
+    job = _find_job(job_id)
+    if not job:
+        return jsonify({"error": "job not found"}), 404
+    if job.get("status") == "queued":
+        job["queue_position"] = _scheduler_for(job).position(job_id)
+    return jsonify(job)
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """
+    キュー待ちのジョブはキューから外して取り消す。
+    実行中のジョブは取り消し用ファイルを作り、スクレイパーが処理中の日付を終えた時点で止める。
+    JOB_CANCEL_GRACE_SECONDS 秒を過ぎても終わらない子プロセス（常駐プロセスで実行中の場合は常駐プロセス）は強制終了する。
+    """
     with JOBS_LOCK:
-        job = JOBS.get(job_id)
+        job = dict(JOBS.get(job_id) or {})
+        status = job.get("status")
+    if status is None:
+        if not _find_job(job_id):
+            return jsonify({"error": "job not found"}), 404
+        return jsonify({"error": "終了したジョブは取り消せません"}), 409
+    if status in JOB_FINAL_STATUSES:
+        return jsonify({"error": "終了したジョブは取り消せません"}), 409
+
+    if _scheduler_for(job).cancel(job_id):
+        _set_job(
+            job_id,
+            status="cancelled",
+            message="キュー待ちのジョブを取り消しました",
+            completed_at=datetime.now().isoformat(),
+            resumable=job.get("kind") != "format",
+        )
+        return jsonify({"job_id": job_id, "status": "cancelled", "message": "キュー待ちのジョブを取り消しました"})
+    if job.get("kind") == "format":
+        return jsonify({"error": "実行中の整形処理は取り消せません"}), 409
+
+    _set_job(job_id, cancel_requested=True, message="取り消し中です（処理中の日付が終わると停止します）")
+    _, cancel_path = _job_files(job_id)
+    os.makedirs(JOB_STORE_LIST_DIR, exist_ok=True)
+    with open(cancel_path, "w", encoding="utf-8"):
+        pass
+    timer = threading.Timer(JOB_CANCEL_GRACE_SECONDS, _terminate_job, args=(job_id,))
+    timer.daemon = True
+    timer.start()
+    return jsonify({"job_id": job_id, "status": status, "message": "取り消しを要求しました"}), 202
+
+
+@app.route('/api/jobs/<job_id>/priority', methods=['POST'])
+def set_job_priority(job_id):
+    """キュー待ちのジョブの優先度を変える（値が大きいほど先に実行する）。"""
+    data = request.get_json(silent=True) or {}
+    try:
+        priority = int(data.get("priority"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "priority は整数で指定してください"}), 400
+    if not SCRAPE_SCHEDULER.set_priority(job_id, priority):
+        if not _find_job(job_id):
+            return jsonify({"error": "job not found"}), 404
+        return jsonify({"error": "キュー待ちのジョブのみ優先度を変更できます"}), 409
+    _set_job(job_id, priority=priority)
+    return jsonify({"job_id": job_id, "priority": priority, "queue_position": SCRAPE_SCHEDULER.position(job_id)})
+
+
+def _sse_event(event, payload, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(payload, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """
+    ジョブの進捗を Server-Sent Events で送る。
+    最初に output 以外の全項目、以降は変わった項目だけを progress イベントで送り、
+    完了・失敗時は output を含む全項目を end イベントで送って終了する。
+    スクリプトの出力は新しい行だけを output イベント（{"lines": [...]}）で送る。
+    """
+    with JOBS_LOCK:
+        in_memory = job_id in JOBS
+    if not in_memory:
+        # メモリから退避済みの終了ジョブは end イベントだけを送る
+        job = _find_job(job_id)
         if not job:
             return jsonify({"error": "job not found"}), 404
-        return jsonify(job)
+        return Response(
+            _sse_event("end", job, job.get("version", 0)),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    def generate():
+        sent = {}
+        version = -1
+        output_seq = 0
+        while True:
+            with JOBS_CHANGED:
+                JOBS_CHANGED.wait_for(
+                    lambda: (JOBS.get(job_id) or {}).get("version", 0) != version,
+                    timeout=JOB_EVENTS_HEARTBEAT_SECONDS,
+                )
+                job = JOBS.get(job_id)
+                if job is None:
+                    return
+                version = job.get("version", 0)
+                delta = {k: v for k, v in job.items() if k != "output" and sent.get(k, object()) != v}
+                final = dict(job) if job.get("status") in JOB_FINAL_STATUSES else None
+                buffered = JOB_OUTPUT.get(job_id) or ()
+                lines = [line for seq, line in buffered if seq > output_seq]
+                if buffered:
+                    output_seq = buffered[-1][0]
+
+            if lines:
+                yield _sse_event("output", {"lines": lines}, version)
+            if final is not None:
+                yield _sse_event("end", final, version)
+                return
+            if delta:
+                sent.update(delta)
+                yield _sse_event("progress", delta, version)
+            elif not lines:
+                # 接続維持用のコメント行
+                yield ": keep-alive\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _scrape_args(options, store_list_path, cancel_path):
+    """スクレイパーの引数（子プロセスのコマンドライン・常駐プロセスのジョブで共通）。"""
+    args = []
+    if options.get("max_stores", 0) > 0:
+        args += ["--max-stores", str(options["max_stores"])]
+    if options.get("max_days_per_store", 0) > 0:
+        args += ["--max-days-per-store", str(options["max_days_per_store"])]
+    if options.get("workers", 0) > 0:
+        args += ["--workers", str(options["workers"])]
+    if options.get("navigation") in ("direct", "click"):
+        args += ["--navigation", options["navigation"]]
+    if options.get("engine") in ("http", "browser"):
+        args += ["--engine", options["engine"]]
+    if options.get("inline_format"):
+        args += ["--inline-format"]
+    return args + ["--file", store_list_path, "--cancel-file", cancel_path]
+
+
+def _build_scrape_cmd(args):
+    # -u で標準出力バッファを無効化し、進捗をリアルタイム取得する
+    return [sys.executable, "-u", SCRAPING_SCRIPT_PATH, *args]
+
+
+def _write_temp_store_list(store_names, path):
+    """選択された店舗をジョブ用の店舗リストへ書き出し、書き出した件数を返す。"""
+    selected = [store for store in load_stores() if store["name"] in store_names]
+    if not selected:
+        return 0
+
+    store_list.write_stores(path, selected)
+    return len(selected)
+
+
+def _known_store_names(store_names):
+    """店舗リストにある店舗名だけを、重複を除いて選択順に返す。"""
+    known = {store["name"] for store in load_stores()}
+    return [name for name in dict.fromkeys(store_names) if name in known]
+
+
+def _coalesce_scrape_request(store_names, options):
+    """
+    同じオプションのキュー待ち・実行中ジョブと重なる依頼をまとめる。
+    既存ジョブが扱う店舗は除き、残りはキュー待ちのジョブがあればそこへ追加する。
+    戻り値は (まとめた先の job_id, 既存ジョブが扱わない店舗)。まとめ先がない場合の job_id は None。
+    """
+    queued, running = SCRAPE_SCHEDULER.snapshot()
+    with JOBS_LOCK:
+        # 終了処理中・取り消し中のジョブにはまとめない
+        active = {
+            job_id for job_id, job in JOBS.items()
+            if job.get("status") not in JOB_FINAL_STATUSES and not job.get("cancel_requested")
+        }
+    same_options = [
+        (job_id, payload) for job_id, payload in list(running.items()) + queued
+        if job_id in active and payload["options"] == options
+    ]
+    covered = {name for _, payload in same_options for name in payload["stores"]}
+    remaining = [name for name in store_names if name not in covered]
+    if not remaining:
+        # すべて既存ジョブに含まれる場合は、依頼した店舗を最も多く含むジョブを返す
+        job_id, _ = max(same_options, key=lambda item: len(set(item[1]["stores"]) & set(store_names)))
+        return job_id, remaining
+
+    merged = []
+
+    def merge(payload):
+        payload["stores"].extend(remaining)
+        merged[:] = payload["stores"]
+
+    for job_id, payload in reversed(queued):
+        if payload["options"] == options and SCRAPE_SCHEDULER.update_queued(job_id, merge):
+            _set_job(job_id, selected_count=len(merged), store_total=len(merged))
+            with JOBS_LOCK:
+                snapshot = dict(JOBS.get(job_id) or {"job_id": job_id})
+            _persist_job(snapshot, {"stores": list(merged), "options": options})
+            return job_id, remaining
+    return None, remaining
 
 
 @app.route('/api/scrape', methods=['POST'])
@@ -376,67 +889,82 @@ def start_scraping():
         selected_store_names = data.get("stores", [])
         options = data.get("options", {}) or {}
         requested_test_mode = bool(options.get("test_mode", False))
-        max_stores = int(options.get("max_stores", 0) or 0)
-        max_days_per_store = int(options.get("max_days_per_store", 0) or 0)
+        scrape_options = {
+            "max_stores": int(options.get("max_stores", 0) or 0),
+            "max_days_per_store": int(options.get("max_days_per_store", 0) or 0),
+            "workers": int(options.get("workers", 0) or 0),
+            "navigation": str(options.get("navigation", "") or ""),
+            "engine": str(options.get("engine", "") or ""),
+            "inline_format": bool(options.get("inline_format", False)),
+        }
 
         # devtools test_mode が有効な場合のみ、テストモード制限を適用
         if TEST_MODE_AVAILABLE and requested_test_mode:
-            max_days_per_store = TEST_MODE_MAX_DAYS
+            scrape_options["max_days_per_store"] = TEST_MODE_MAX_DAYS
 
         if not selected_store_names:
             return jsonify({"error": "店舗が選択されていません"}), 400
 
-        all_stores = load_stores()
-        selected_stores_df = pd.DataFrame([
-            store for store in all_stores if store["name"] in selected_store_names
-        ])
-
-        if selected_stores_df.empty:
+        store_names = _known_store_names(selected_store_names)
+        if not store_names:
             return jsonify({"error": "選択された店舗が見つかりません"}), 400
-
-        os.makedirs(os.path.dirname(TEMP_STORE_LIST_PATH), exist_ok=True)
-        selected_stores_df.to_csv(TEMP_STORE_LIST_PATH, index=False, encoding='utf-8-sig')
+        try:
+            priority = int(data.get("priority", 0) or 0)
+        except (TypeError, ValueError):
+            return jsonify({"error": "priority は整数で指定してください"}), 400
+
+        with SCRAPE_SUBMIT_LOCK:
+            # 同じ店舗・オプションのジョブがキュー待ち・実行中なら、新しいジョブは作らずまとめる
+            coalesced_job, new_stores = _coalesce_scrape_request(store_names, scrape_options)
+            job_id = coalesced_job or uuid.uuid4().hex
+            if coalesced_job is None:
+                _register_job(
+                    {
+                        "job_id": job_id,
+                        "kind": "scrape",
+                        "status": "queued",
+                        "progress": 0,
+                        "message": "キューに登録しました",
+                        "selected_count": len(new_stores),
+                        "store_done": 0,
+                        "store_total": len(new_stores),
+                        "store_current": 0,
+                        "test_mode_applied": bool(TEST_MODE_AVAILABLE and requested_test_mode),
+                        "test_mode_max_days": TEST_MODE_MAX_DAYS if (TEST_MODE_AVAILABLE and requested_test_mode) else 0,
+                        "created_at": datetime.now().isoformat(),
+                        "completed_at": None,
+                        "output": "",
+                        "version": 0,
+                        "checkpoint_days": 0,
+                        "resume_count": 0,
+                        "priority": priority,
+                    },
+                    {"stores": new_stores, "options": scrape_options},
+                )
+                SCRAPE_SCHEDULER.submit(job_id, {"stores": list(new_stores), "options": scrape_options}, priority)
 
         log_entry = {
             "timestamp": datetime.now().isoformat(),
+            "action": "scrape",
             "selected_stores": selected_store_names,
             "count": len(selected_store_names),
-            "temp_file": TEMP_STORE_LIST_PATH,
+            "job_id": job_id,
+            "temp_file": _job_files(job_id)[0],
         }
-        with open(LOG_FILE, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+        scrape_log.append_entry(LOG_FILE, log_entry)
 
-        # -u で標準出力バッファを無効化し、進捗をリアルタイム取得する
-        cmd = [sys.executable, "-u", SCRAPING_SCRIPT_PATH]
-        if max_stores > 0:
-            cmd += ["--max-stores", str(max_stores)]
-        if max_days_per_store > 0:
-            cmd += ["--max-days-per-store", str(max_days_per_store)]
-
-        job_id = uuid.uuid4().hex
-        with JOBS_LOCK:
-            JOBS[job_id] = {
-                "job_id": job_id,
-                "status": "queued",
-                "progress": 0,
-                "message": "キューに登録しました",
-                "selected_count": len(selected_store_names),
-                "store_done": 0,
-                "store_total": len(selected_store_names),
-                "store_current": 0,
-                "test_mode_applied": bool(TEST_MODE_AVAILABLE and requested_test_mode),
-                "test_mode_max_days": TEST_MODE_MAX_DAYS if (TEST_MODE_AVAILABLE and requested_test_mode) else 0,
-                "created_at": datetime.now().isoformat(),
-                "completed_at": None,
-                "output": "",
-            }
-
-        t = threading.Thread(target=_run_scrape_job, args=(job_id, cmd), daemon=True)
-        t.start()
+        if coalesced_job is None:
+            message = f"{len(new_stores)} 個の店舗のスクレイピングを開始しました"
+        elif new_stores:
+            message = f"キュー待ちのジョブに {len(new_stores)} 個の店舗を追加しました"
+        else:
+            message = "選択された店舗は実行中・キュー待ちのジョブに含まれています"
         return jsonify({
             "job_id": job_id,
-            "message": f"{len(selected_store_names)} 個の店舗のスクレイピングを開始しました",
-            "selected_count": len(selected_store_names),
+            "message": message,
+            "selected_count": len(store_names),
+            "coalesced": coalesced_job is not None,
+            "queue_position": SCRAPE_SCHEDULER.position(job_id),
             "test_mode_applied": bool(TEST_MODE_AVAILABLE and requested_test_mode),
             "test_mode_max_days": TEST_MODE_MAX_DAYS if (TEST_MODE_AVAILABLE and requested_test_mode) else 0,
         }), 202
@@ -445,76 +973,244 @@ def start_scraping():
         return jsonify({"error": f"処理エラー: {str(e)}"}), 500
 
 
+@app.route('/api/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    """
+    失敗・中断したジョブを、チェックポイント上で処理が終わっていない店舗だけで再開する。
+    保存済みの日付はスクレイパー側で既存ファイルとして読み飛ばされる。
+    """
+    try:
+        job, scrape_request = job_store.load_job(JOB_STORE_PATH, job_id)
+        with JOBS_LOCK:
+            current = JOBS.get(job_id)
+            if current:
+                job = dict(current)
+        if not job:
+            return jsonify({"error": "job not found"}), 404
+        if job.get("kind") == "format":
+            return jsonify({"error": "整形ジョブは再開できません。再度実行してください"}), 409
+        if not scrape_request:
+            return jsonify({"error": "job not found"}), 404
+        if job.get("status") not in ("failed", "cancelled"):
+            return jsonify({"error": "失敗・中断・取り消したジョブのみ再開できます"}), 409
+
+        completed_stores, saved_days = job_store.load_checkpoints(JOB_STORE_PATH, job_id)
+        remaining = [name for name in scrape_request.get("stores", []) if name not in completed_stores]
+        if not remaining:
+            return jsonify({"error": "未処理の店舗がありません"}), 409
+        if not _known_store_names(remaining):
+            return jsonify({"error": "再開する店舗が店舗リストに見つかりません"}), 400
+
+        # 前回の取り消し用ファイルが残っていると再開直後に止まるため消しておく
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(_job_files(job_id)[1])
+        job.update(
+            status="queued",
+            progress=0,
+            message=f"ジョブを再開します（残り {len(remaining)} 店舗）",
+            store_done=0,
+            store_total=len(remaining),
+            store_current=0,
+            completed_at=None,
+            resumable=False,
+            resume_count=int(job.get("resume_count", 0) or 0) + 1,
+            resumed_at=datetime.now().isoformat(),
+            cancel_requested=False,
+            version=int(job.get("version", 0) or 0) + 1,
+        )
+        _register_job(job, None)
+        with JOBS_CHANGED:
+            JOBS_CHANGED.notify_all()
+
+        SCRAPE_SCHEDULER.submit(
+            job_id,
+            {"stores": remaining, "options": scrape_request.get("options") or {}},
+            int(job.get("priority", 0) or 0),
+        )
+        return jsonify({
+            "job_id": job_id,
+            "message": f"{len(remaining)} 個の店舗でジョブを再開しました",
+            "remaining_stores": remaining,
+            "saved_days": sum(len(days) for days in saved_days.values()),
+        }), 202
+    except Exception as e:
+        return jsonify({"error": f"処理エラー: {str(e)}"}), 500
+
+
 @app.route('/api/logs', methods=['GET'])
 def get_logs():
+    """
+    新しい方から limit 件（既定 20）のログを古い順に返す。action・day_from・day_to で絞り込める。
+    さらに古いログがある場合は X-Next-Cursor ヘッダのカーソルを cursor に渡して続きを取得する。
+    """
     try:
-        if not os.path.exists(LOG_FILE):
-            return jsonify([])
-
-        logs = []
-        with open(LOG_FILE, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    logs.append(json.loads(line))
-                except Exception:
-                    pass
-        return jsonify(logs[-20:])
+        try:
+            limit = max(1, min(int(request.args.get("limit", 20)), 200))
+        except ValueError:
+            return jsonify({"error": "limit は整数で指定してください"}), 400
+        day_from = request.args.get("day_from") or None
+        day_to = request.args.get("day_to") or None
+        for value in (day_from, day_to):
+            if value and not DATE_PARAM_PATTERN.match(value):
+                return jsonify({"error": "日付は YYYY-MM-DD 形式で指定してください"}), 400
+
+        try:
+            logs, next_cursor = scrape_log.read_entries(
+                LOG_FILE,
+                limit=limit,
+                cursor=request.args.get("cursor") or None,
+                action=request.args.get("action") or None,
+                day_from=day_from,
+                day_to=day_to,
+            )
+        except scrape_log.CursorError as e:
+            return jsonify({"error": str(e)}), 410 if e.rotated else 400
+
+        resp = jsonify(logs)
+        if next_cursor:
+            resp.headers["X-Next-Cursor"] = next_cursor
+        return resp
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/api/format-offline', methods=['POST'])
 def format_offline():
+    """
+    整形（offline-scraing.py）をバックグラウンドのジョブとして登録し、job_id をすぐに返す。
+    進捗・結果（completed_stores / processed_stores）は /api/jobs/<job_id> と /events で取得する。
+    """
     try:
-        result = subprocess.run(
-            [sys.executable, OFFLINE_SCRIPT_PATH],
-            capture_output=True,
-            text=True,
-            timeout=1800,
-            cwd=PROJECT_ROOT,
-        )
-        output = result.stdout + "\n" + result.stderr
-
-        if result.returncode != 0:
-            return jsonify({
-                "error": "整形処理が異常終了しました",
-                "output": output[-500:] if output else "",
-                "completed_stores": [],
-            }), 500
-
-        completed_stores = []
-        processed_stores = []
-        if os.path.exists(COMPLETED_STORES_PATH):
+        data = request.get_json(silent=True) or {}
+        if not os.path.exists(OFFLINE_SCRIPT_PATH):
+            return jsonify({"error": "整形スクリプトが見つかりません", "completed_stores": []}), 500
+        # -u で標準出力バッファを無効化し、進捗をリアルタイム取得する
+        cmd = [sys.executable, "-u", OFFLINE_SCRIPT_PATH]
+        workers = data.get("workers")
+        if workers is not None:
             try:
-                with open(COMPLETED_STORES_PATH, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                if isinstance(data, dict):
-                    completed_stores = data.get("completed", [])
-                    processed_stores = data.get("processed", [])
-            except Exception:
-                pass
-
-        log_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "action": "format_offline",
-            "completed_count": len(completed_stores),
-            "processed_count": len(processed_stores),
-        }
-        with open(LOG_FILE, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+                workers = int(workers)
+            except (TypeError, ValueError):
+                return jsonify({"error": "workers は整数で指定してください", "completed_stores": []}), 400
+            if workers < 0:
+                return jsonify({"error": "workers は0以上で指定してください", "completed_stores": []}), 400
+            cmd += ["--workers", str(workers)]
+        if "db" in data:
+            cmd += ["--db" if bool(data.get("db")) else "--no-db"]
+
+        with SCRAPE_SUBMIT_LOCK:
+            # 同じ内容の整形がキュー待ちなら、そのジョブにまとめる
+            queued, _ = FORMAT_SCHEDULER.snapshot()
+            for job_id, payload in queued:
+                if payload["cmd"] == cmd:
+                    return jsonify({
+                        "job_id": job_id,
+                        "message": "同じ整形処理がキュー待ちのため、そのジョブにまとめました",
+                        "coalesced": True,
+                    }), 202
+
+            job_id = uuid.uuid4().hex
+            _register_job(
+                {
+                    "job_id": job_id,
+                    "kind": "format",
+                    "status": "queued",
+                    "progress": 0,
+                    "message": "キューに登録しました",
+                    "store_done": 0,
+                    "store_total": 0,
+                    "store_current": 0,
+                    "file_done": 0,
+                    "file_total": 0,
+                    "created_at": datetime.now().isoformat(),
+                    "completed_at": None,
+                    "output": "",
+                    "version": 0,
+                },
+                None,
+            )
+            FORMAT_SCHEDULER.submit(job_id, {"cmd": cmd})
 
         return jsonify({
-            "message": "Excel 自動整形を実行しました",
-            "output": output[-500:] if output else "",
-            "completed_stores": completed_stores,
-            "processed_stores": processed_stores,
-        })
-    except subprocess.TimeoutExpired:
-        return jsonify({"message": "Excel 自動整形処理を開始しました（処理中）", "completed_stores": []}), 202
+            "job_id": job_id,
+            "message": "Excel 自動整形を開始しました",
+            "coalesced": False,
+            "queue_position": FORMAT_SCHEDULER.position(job_id),
+        }), 202
     except Exception as e:
         return jsonify({"error": f"整形処理実行エラー: {str(e)}", "completed_stores": []}), 500
 
 
+@app.route('/api/slotdata/query', methods=['GET'])
+def query_slotdata():
+    try:
+        if not os.path.exists(SLOTDATA_DB_PATH):
+            return jsonify({"error": "集計DBがありません。OFFLINE_DB_ENABLED=1 で整形を実行してください"}), 404
+
+        args = request.args
+        filters = {}
+        for key in ("day_from", "day_to"):
+            value = (args.get(key) or "").strip()
+            if value and not DATE_PARAM_PATTERN.match(value):
+                return jsonify({"error": f"{key} は YYYY-MM-DD で指定してください"}), 400
+            filters[key] = value or None
+        for key in ("min_difference", "max_difference", "limit", "offset"):
+            value = (args.get(key) or "").strip()
+            if not value:
+                continue
+            try:
+                filters[key] = int(value)
+            except ValueError:
+                return jsonify({"error": f"{key} は整数で指定してください"}), 400
+
+        rows, count = slotdata_db.query_rows(
+            SLOTDATA_DB_PATH,
+            stores=[s for s in args.getlist("store") if s],
+            dai_name=(args.get("dai_name") or "").strip() or None,
+            keyword=(args.get("keyword") or "").strip() or None,
+            **filters,
+        )
+        return jsonify({"rows": rows, "count": count})
+    except Exception as e:
+        return jsonify({"error": f"検索エラー: {str(e)}"}), 500
+
+
+@app.route('/api/coverage/gaps', methods=['GET'])
+def coverage_gaps():
+    """
+    店舗ごとの未取得の日付（missing、取得に失敗した日は reason 付き）・未整形の日付・表のなかった日付を
+    索引から返す。store（複数可、既定は店舗リストの全店舗）・day_from・day_to（既定は前日）で絞り込める。
+    """
+    try:
+        day_from = request.args.get("day_from") or None
+        day_to = request.args.get("day_to") or None
+        for value in (day_from, day_to):
+            if value and not DATE_PARAM_PATTERN.match(value):
+                return jsonify({"error": "日付は YYYY-MM-DD 形式で指定してください"}), 400
+        stores = [s for s in request.args.getlist("store") if s] or [s["name"] for s in load_stores()]
+        try:
+            gaps = store_coverage.store_gaps(STORE_COVERAGE_PATH, stores, day_from=day_from, day_to=day_to)
+        except ValueError:
+            return jsonify({"error": "存在しない日付が指定されています"}), 400
+        return jsonify({"stores": gaps})
+    except Exception as e:
+        return jsonify({"error": f"取得状況の読み込みエラー: {str(e)}"}), 500
+
+
+@app.route('/api/coverage/rescan', methods=['POST'])
+def coverage_rescan():
+    """指定した店舗（stores）のフォルダを次回のスクレイピングで読み直し、索引を作り直す。"""
+    try:
+        data = request.get_json(silent=True) or {}
+        stores = data.get("stores")
+        if not isinstance(stores, list) or not stores:
+            return jsonify({"error": "stores を店舗名の配列で指定してください"}), 400
+        store_coverage.request_rescan(STORE_COVERAGE_PATH, [str(s) for s in stores])
+        return jsonify({"stores": stores})
+    except Exception as e:
+        return jsonify({"error": f"処理エラー: {str(e)}"}), 500
+
+
 @app.route('/api/stores/reorder', methods=['POST'])
 def reorder_stores():
     try:
@@ -523,39 +1219,12 @@ def reorder_stores():
         if not order or not isinstance(order, list):
             return jsonify({"error": "並び順が不正です"}), 400
 
-        df = None
-        for enc in ("utf-8", "utf-8-sig", "cp932"):
-            try:
-                df = pd.read_csv(STORE_LIST_PATH, encoding=enc)
-                break
-            except Exception:
-                continue
-        if df is None:
-            return jsonify({"error": "store_list.csv の読み込みに失敗しました"}), 500
-
-        col = 'data_directory' if 'data_directory' in df.columns else ('directory' if 'directory' in df.columns else None)
-        if col is None:
-            return jsonify({"error": "CSVに data_directory 列がありません"}), 400
-
-        df['__orig_index__'] = range(len(df))
-        dir_to_index = {
-            _normalize_directory_value(row[col]): idx
-            for idx, (_, row) in enumerate(df.iterrows())
-        }
-
-        ordered_indices = []
-        for d in order:
-            idx = dir_to_index.get(_normalize_directory_value(d))
-            if idx is not None:
-                ordered_indices.append(idx)
-
-        remaining_indices = [idx for idx in df['__orig_index__'].tolist() if idx not in ordered_indices]
-        final_indices = ordered_indices + remaining_indices
-
-        df = df.iloc[final_indices].drop(columns=['__orig_index__'])
-        df.to_csv(STORE_LIST_PATH, index=False, encoding='utf-8-sig')
+        try:
+            reordered = STORE_LIST.reorder(order)
+        except KeyError as e:
+            return jsonify({"error": e.args[0]}), 400
 
-        return jsonify({"message": f"並び順を保存しました（{len(ordered_indices)} 件を並べ替え）"})
+        return jsonify({"message": f"並び順を保存しました（{reordered} 件を並べ替え）"})
     except Exception as e:
         return jsonify({"error": f"並び順保存エラー: {str(e)}"}), 500
 
@@ -0,0 +1,51 @@
+"""
+プロセスをまたいだ排他ロック（ロック用ファイル）。
+
+スクレイパー・整形処理・移行スクリプトなど別々のプロセスが同じファイルを
+読み込み → 書き換えする間、ほかのプロセスが同じ処理を始めないようにする。
+Windows は msvcrt.locking、それ以外は fcntl.flock を使う。ロック用ファイルは消さずに残す。
+"""
+
+import contextlib
+import os
+import time
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+_POLL_SECONDS = 0.05
+
+
+def _acquire(f):
+    if os.name != "nt":
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            time.sleep(_POLL_SECONDS)
+
+
+def _release(f):
+    if os.name != "nt":
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return
+    f.seek(0)
+    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextlib.contextmanager
+def locked(lock_path):
+    """lock_path をロックし、ほかのプロセスが解放するまで待つ。"""
+    os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+    with open(lock_path, "a+b") as f:
+        _acquire(f)
+        try:
+            yield
+        finally:
+            _release(f)
@@ -0,0 +1,81 @@
+"""
+店舗ごとの取り込み済みHTMLの管理（マニフェスト）。
+
+状態ファイル（slotdata_writer の state）の "files" に、日付HTMLごとの
+サイズ・更新時刻・内容ハッシュ・取り込み行数を記録する。
+サイズと更新時刻が一致するファイルはハッシュ計算もせずに読み飛ばし、
+取り直しなどで内容が変わったファイルだけを再解析の対象にする。
+圧縮アーカイブ（html_archive）に保存された日付は、索引のサイズ・ハッシュで同じように判定する。
+"""
+
+import hashlib
+import os
+
+import html_archive
+
+
+def file_signature(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def content_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def day_entry(html_dir, day):
+    """保存済みの日付HTML（アーカイブ内を含む）のマニフェストのエントリを返す。保存されていなければ None。"""
+    path = os.path.join(html_dir, f"{day}.html")
+    if os.path.exists(path):
+        return {**file_signature(path), "sha1": content_hash(path)}
+    archived = html_archive.load_index(html_dir).get(day)
+    if archived is None:
+        return None
+    return {"size": archived["size"], "mtime_ns": None, "sha1": archived["sha1"]}
+
+
+def needs_bootstrap(state):
+    """マニフェスト導入前の状態（"files" がない）かどうか。"""
+    return "files" not in state
+
+
+def plan_files(html_dir, state, known_days=None):
+    """
+    解析が必要なファイルを [(ファイル名, 日付, エントリ), ...] で返す。
+
+    変更のないファイルはここで記録を更新して除外する。
+    known_days はマニフェスト導入前のCSVに含まれる日付で、該当するファイルは
+    再解析せず取り込み済みとして記録する（行数は不明のため None）。
+    """
+    files = state.setdefault("files", {})
+    pending = []
+    for name, day, archived in html_archive.list_days(html_dir):
+        if archived is None:
+            path = os.path.join(html_dir, name)
+            sig = file_signature(path)
+            entry = files.get(name)
+            if entry and entry.get("size") == sig["size"] and entry.get("mtime_ns") == sig["mtime_ns"]:
+                continue
+            digest = content_hash(path)
+        else:
+            # アーカイブの日付は索引に内容ハッシュがあるため、展開せずに比較できる
+            sig = {"size": archived["size"], "mtime_ns": None}
+            entry = files.get(name)
+            digest = archived["sha1"]
+
+        if entry and entry.get("sha1") == digest:
+            entry.update(sig)
+            continue
+        if entry is None and known_days is not None and day in known_days:
+            files[name] = {**sig, "sha1": digest, "rows": None}
+            continue
+        pending.append((name, day, {**sig, "sha1": digest}))
+    return pending
+
+
+def record_file(state, name, entry, rows):
+    state.setdefault("files", {})[name] = {**entry, "rows": rows}
@@ -0,0 +1,293 @@
+"""
+店舗フォルダの日付HTMLの圧縮アーカイブ。
+
+日付HTML（YYYY-MM-DD.html）を店舗フォルダ直下の `_archive/YYYY-MM.zip` へ月ごとにまとめて
+圧縮保存し、`_archive/index.json` に日付 → 月・内容ハッシュ・サイズを記録する。
+保存済みの日付の確認や読み出しは索引を引くだけで済むため、ファイル数が増えても
+フォルダの一覧取得に時間がかからない。内容が同じ日付を保存し直した場合は書き込まない。
+
+従来どおりフォルダ直下に置かれた日付HTML（ばらのファイル）も同じ関数で読めるため、
+スクレイパー・整形処理はどちらの保存形式でも同じように扱える。
+同じ日付が両方にある場合はばらのファイルを優先する。
+
+新しい日付は月の zip の末尾へ追記し、保存済みの日付を取り直した場合のみ月の zip を書き直す。
+書き込み（月の zip と索引の書き換え）は `_archive/.lock` でプロセスをまたいで排他するため、
+スクレイパーの実行中に移行スクリプトを動かしても互いの保存内容を上書きしない。
+
+既存のばらのファイルをアーカイブへ移す場合（apps フォルダで実行）:
+    python _internal/app/html_archive.py store_list.csv
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+import zipfile
+
+import file_lock
+
+ARCHIVE_DIR_NAME = "_archive"
+INDEX_NAME = "index.json"
+LOCK_NAME = ".lock"
+# ばらのファイルがなかった時の店舗フォルダの更新時刻（list_days がフォルダを読み直すかの判定）
+LISTED_NAME = ".listed"
+# 更新直後のフォルダは記録しない（更新時刻の粒度が粗いファイルシステムで変化を見落とさないため）
+LISTED_MIN_AGE_NS = 2 * 10**9
+DAY_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+DAY_FILE_PATTERN = re.compile(r"^(\d{4}-\d{2}-\d{2})\.html$")
+
+_LOCK = threading.Lock()
+
+
+def archive_dir(save_dir):
+    return os.path.join(save_dir, ARCHIVE_DIR_NAME)
+
+
+def _index_path(save_dir):
+    return os.path.join(archive_dir(save_dir), INDEX_NAME)
+
+
+def _month_path(save_dir, month):
+    return os.path.join(archive_dir(save_dir), f"{month}.zip")
+
+
+def _replace(tmp_path, path):
+    for attempt in range(5):
+        try:
+            os.replace(tmp_path, path)
+            return
+        except PermissionError:
+            # Windows で整形処理などが読み込み中の間は置き換えられないため少し待つ
+            if attempt == 4:
+                raise
+            time.sleep(0.2)
+
+
+def load_index(save_dir):
+    """{日付: {"month", "sha1", "size"}} を返す。アーカイブがなければ空の dict。"""
+    try:
+        with open(_index_path(save_dir), "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"[警告] アーカイブの索引を読み込めません: {_index_path(save_dir)} ({e})")
+        return {}
+    return index if isinstance(index, dict) else {}
+
+
+def _save_index(save_dir, index):
+    path = _index_path(save_dir)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, sort_keys=True)
+    _replace(tmp_path, path)
+
+
+def loose_days(save_dir):
+    """フォルダ直下の日付HTMLの日付の set。"""
+    try:
+        names = os.listdir(save_dir)
+    except FileNotFoundError:
+        return set()
+    return {m.group(1) for m in map(DAY_FILE_PATTERN.match, names) if m}
+
+
+def saved_days(save_dir):
+    """ばらのファイルとアーカイブのどちらかに保存済みの日付の set。"""
+    return loose_days(save_dir) | set(load_index(save_dir))
+
+
+def _lock_path(save_dir):
+    return os.path.join(archive_dir(save_dir), LOCK_NAME)
+
+
+def _append_member(path, member, data):
+    """月の zip の末尾へ member を追加する。zip がない、または member が既にある場合は何もせず False。"""
+    if not os.path.exists(path):
+        return False
+    with zipfile.ZipFile(path, "a", compression=zipfile.ZIP_DEFLATED) as zf:
+        if member in zf.namelist():
+            return False
+        zf.writestr(member, data)
+    return True
+
+
+def _rewrite_month(path, member, data):
+    """member を data に置き換えた月の zip を一時ファイルへ書き、置き換える。"""
+    tmp_path = f"{path}.tmp"
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as dst:
+        if os.path.exists(path):
+            with zipfile.ZipFile(path) as src:
+                for info in src.infolist():
+                    if info.filename != member:
+                        dst.writestr(info, src.read(info))
+        dst.writestr(member, data)
+    _replace(tmp_path, path)
+
+
+def write_day(save_dir, day, html):
+    """
+    日付 day の HTML（str）をアーカイブへ保存する。内容が保存済みのものと同じ場合は何もせず False を返す。
+
+    新しい日付は月の zip へ追記し、保存済みの日付の内容が変わった場合のみ月の zip を書き直す。
+    索引の読み込みから書き換えまでは、ほかのスレッド・プロセスの書き込みと排他する。
+    """
+    data = html.encode("utf-8")
+    digest = hashlib.sha1(data).hexdigest()
+    month = day[:7]
+    with _LOCK, file_lock.locked(_lock_path(save_dir)):
+        index = load_index(save_dir)
+        if index.get(day, {}).get("sha1") == digest:
+            _remove_loose(save_dir, day)
+            return False
+
+        path = _month_path(save_dir, month)
+        member = f"{day}.html"
+        if day in index or not _append_member(path, member, data):
+            _rewrite_month(path, member, data)
+
+        index[day] = {"month": month, "sha1": digest, "size": len(data)}
+        _save_index(save_dir, index)
+        _remove_loose(save_dir, day)
+    return True
+
+
+def _remove_loose(save_dir, day):
+    # アーカイブへ保存した日付のばらのファイルは古い内容のため消しておく（優先して読まれるため）
+    try:
+        os.remove(os.path.join(save_dir, f"{day}.html"))
+    except FileNotFoundError:
+        pass
+
+
+def _listed_path(save_dir):
+    return os.path.join(archive_dir(save_dir), LISTED_NAME)
+
+
+def _no_loose_since_listed(save_dir):
+    """前回フォルダを読んだ時にばらのファイルがなく、その後フォルダが変わっていないか（更新時刻で判定）。"""
+    try:
+        with open(_listed_path(save_dir), "r", encoding="utf-8") as f:
+            return int(f.read()) == os.stat(save_dir).st_mtime_ns
+    except (OSError, ValueError):
+        return False
+
+
+def _record_no_loose(save_dir, mtime_ns):
+    if time.time_ns() - mtime_ns < LISTED_MIN_AGE_NS:
+        return
+    path = _listed_path(save_dir)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(str(mtime_ns))
+        _replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def list_days(save_dir):
+    """
+    日付HTMLを [(ファイル名, 日付, 索引のエントリ), ...] のファイル名順で返す。
+    ばらのファイルの索引のエントリは None。アーカイブの日付のファイル名は YYYY-MM-DD.html。
+
+    アーカイブのある店舗で、前回ばらのファイルがなかった後にフォルダが変わっていなければ、
+    フォルダは読まずに索引から返す（ばらのファイルが増えるとフォルダの更新時刻が変わる）。
+    """
+    if _no_loose_since_listed(save_dir):
+        index = load_index(save_dir)
+        return [(f"{day}.html", day, index[day]) for day in sorted(index)]
+    mtime_ns = os.stat(save_dir).st_mtime_ns
+    days = {}
+    for name in os.listdir(save_dir):
+        if not name.endswith(".html"):
+            continue
+        m = DAY_PATTERN.search(name)
+        if m:
+            days[name] = (name, m.group(0), None)
+    if not days and os.path.exists(_index_path(save_dir)):
+        _record_no_loose(save_dir, mtime_ns)
+    loose = {day for _, day, _ in days.values()}
+    for day, entry in load_index(save_dir).items():
+        name = f"{day}.html"
+        if name not in days and day not in loose:
+            days[name] = (name, day, entry)
+    return [days[name] for name in sorted(days)]
+
+
+def read_day(save_dir, day):
+    """アーカイブから日付 day の HTML をバイト列で返す。ない場合は None。"""
+    entry = load_index(save_dir).get(day)
+    if entry is None:
+        return None
+    try:
+        return _read_member(save_dir, entry["month"], day)
+    except (OSError, KeyError, zipfile.BadZipFile):
+        pass
+    # 追記中の zip を読んだ場合に備え、書き込みが終わるのを待って読み直す
+    with file_lock.locked(_lock_path(save_dir)):
+        try:
+            return _read_member(save_dir, entry["month"], day)
+        except (OSError, KeyError, zipfile.BadZipFile) as e:
+            print(f"[警告] アーカイブから {day} を読み込めません: {save_dir} ({e})")
+            return None
+
+
+def _read_member(save_dir, month, day):
+    with zipfile.ZipFile(_month_path(save_dir, month)) as zf:
+        return zf.read(f"{day}.html")
+
+
+def open_day(save_dir, name):
+    """
+    ファイル名 name の日付HTMLを読み込み用に返す。
+    ばらのファイルがあればそのパス、なければアーカイブの内容の BytesIO。どちらにもなければ None。
+    """
+    path = os.path.join(save_dir, name)
+    if os.path.exists(path):
+        return path
+    m = DAY_PATTERN.search(name)
+    data = read_day(save_dir, m.group(0)) if m else None
+    return io.BytesIO(data) if data is not None else None
+
+
+def migrate(save_dir):
+    """ばらの日付HTMLをアーカイブへ移し、移した件数を返す。"""
+    moved = 0
+    for day in sorted(loose_days(save_dir)):
+        with open(os.path.join(save_dir, f"{day}.html"), "r", encoding="utf-8") as f:
+            html = f.read()
+        write_day(save_dir, day, html)
+        moved += 1
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="保存済みの日付HTMLを月ごとの圧縮アーカイブへ移す")
+    parser.add_argument("store_list", help="店舗リスト（data_directory 列のフォルダが対象）")
+    args = parser.parse_args()
+
+    for enc in ("utf-8-sig", "cp932"):
+        try:
+            with open(args.store_list, "r", encoding=enc, newline="") as f:
+                dirs = [row.get("data_directory") or row.get("directory") for row in csv.DictReader(f)]
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise SystemExit(f"店舗リストの読み込みに失敗しました（encoding不一致）: {args.store_list}")
+    for save_dir in dict.fromkeys(d for d in dirs if d):
+        if not os.path.isdir(save_dir):
+            continue
+        moved = migrate(save_dir)
+        print(f"[アーカイブ] {save_dir}: {moved} 件")
+
+
+if __name__ == "__main__":
+    main()
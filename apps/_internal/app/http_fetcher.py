@@ -0,0 +1,113 @@
+"""
+スクレイピング用の HTTP 取得エンジン。
+
+ブラウザを起動せず、keep-alive の requests.Session で一覧ページ・日付ページを取得する。
+Cloudflare の確認画面（CLOUDFLARE_MARKERS）や 403/503 が返った場合は blocked として扱い、
+呼び出し側（anasuro_selective.py）が Chrome での取得へ切り替える。
+ブラウザで確認画面を通過した後は、そのブラウザの Cookie と User-Agent を取り込んで HTTP 取得を続ける。
+"""
+
+import os
+from datetime import datetime
+from urllib.parse import urljoin
+
+import requests
+from lxml import etree, html as lxml_html
+from requests.adapters import HTTPAdapter
+
+CLOUDFLARE_MARKERS = [
+    "人間であることを確認",
+    "Please stand by, while we are checking your browser",
+    "Checking if the site connection is secure",
+    "hcaptcha-box",
+]
+BLOCKED_STATUS_CODES = {403, 429, 503}
+
+SCRAPE_HTTP_TIMEOUT_SECONDS = float(os.getenv("SCRAPE_HTTP_TIMEOUT_SECONDS", "30"))
+SCRAPE_HTTP_POOL_SIZE = int(os.getenv("SCRAPE_HTTP_POOL_SIZE", "4"))
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/144.0.0.0 Safari/537.36"
+)
+
+_DATE_ROW_XPATH = (
+    "//div[contains(concat(' ', normalize-space(@class), ' '), ' date-table ')]"
+    "//*[contains(concat(' ', normalize-space(@class), ' '), ' table-row ')]"
+)
+
+
+def is_cloudflare_page(text):
+    return any(marker in text for marker in CLOUDFLARE_MARKERS)
+
+
+class HttpFetcher:
+    """接続を使い回す HTTP セッション。"""
+
+    def __init__(self, timeout=SCRAPE_HTTP_TIMEOUT_SECONDS, pool_size=SCRAPE_HTTP_POOL_SIZE):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "User-Agent": DEFAULT_USER_AGENT,
+            "Accept-Language": "ja,en;q=0.8",
+        })
+
+    def fetch(self, url):
+        """
+        URL を取得し (本文, blocked) を返す。
+        blocked は Cloudflare の確認画面やアクセス拒否のステータスで、ブラウザでの取得が必要なことを示す。
+        """
+        response = self.session.get(url, timeout=self.timeout)
+        if not response.encoding or response.encoding.lower() == "iso-8859-1":
+            response.encoding = response.apparent_encoding
+        text = response.text
+        blocked = response.status_code in BLOCKED_STATUS_CODES or is_cloudflare_page(text)
+        if not blocked:
+            response.raise_for_status()
+        return text, blocked
+
+    def load_browser_state(self, driver):
+        """ブラウザの Cookie（cf_clearance など）と User-Agent を取り込む。"""
+        for cookie in driver.get_cookies():
+            self.session.cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie.get("domain") or "",
+                path=cookie.get("path", "/"),
+            )
+        user_agent = driver.execute_script("return navigator.userAgent")
+        if user_agent:
+            self.session.headers["User-Agent"] = user_agent
+
+    def close(self):
+        self.session.close()
+
+
+def parse_date_links(page_html, base_url):
+    """一覧ページの日付リンクを [(YYYY-MM-DD, 絶対URL), ...] で返す（一覧の下から順）。"""
+    root = lxml_html.fromstring(page_html)
+    links = []
+    for row in reversed(root.xpath(_DATE_ROW_XPATH)):
+        anchors = row.xpath(".//a")
+        if not anchors:
+            continue
+        a_tag = anchors[0]
+        date_text = a_tag.text_content().strip().split("(")[0].replace("/", "-")
+        try:
+            datetime.strptime(date_text, "%Y-%m-%d")
+        except ValueError:
+            continue
+        href = a_tag.get("href")
+        links.append((date_text, urljoin(base_url, href) if href else None))
+    return links
+
+
+def extract_table_html(page_html):
+    """日付ページから #all_data_table の HTML を取り出す。見つからない場合は None。"""
+    root = lxml_html.fromstring(page_html)
+    tables = root.xpath('//table[@id="all_data_table"]')
+    if not tables:
+        return None
+    return etree.tostring(tables[0], method="html", encoding="unicode", with_tail=False)
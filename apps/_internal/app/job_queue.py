@@ -0,0 +1,95 @@
+"""
+スクレイピングジョブの実行キュー。
+
+登録されたジョブを優先度の高い順（同じ優先度は登録順）に取り出し、
+同時に実行するジョブ数を max_concurrent 件までに抑える。
+実行用のスレッドは空きがあるときだけ起動し、キューが空になったら終了する。
+キュー待ちのジョブは取り消し・優先度の変更・内容（payload）の変更ができる。
+"""
+
+import itertools
+import threading
+
+
+class JobScheduler:
+    def __init__(self, run, max_concurrent=1):
+        # run(job_id, payload) はジョブ1件を実行し、終わるまで戻らない
+        self.run = run
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.lock = threading.Lock()
+        self.queued = []  # [(-priority, seq, job_id)]（先頭から実行する）
+        self.payloads = {}
+        self.running = {}
+        self.workers = 0
+        self.seq = itertools.count()
+
+    def submit(self, job_id, payload, priority=0):
+        with self.lock:
+            self.payloads[job_id] = payload
+            self.queued.append((-int(priority), next(self.seq), job_id))
+            self.queued.sort()
+            if self.workers < self.max_concurrent:
+                self.workers += 1
+                threading.Thread(target=self._worker, daemon=True).start()
+
+    def _worker(self):
+        while True:
+            with self.lock:
+                if not self.queued:
+                    self.workers -= 1
+                    return
+                _, _, job_id = self.queued.pop(0)
+                payload = self.payloads.pop(job_id)
+                self.running[job_id] = payload
+            try:
+                self.run(job_id, payload)
+            except Exception as e:
+                print(f"[エラー] ジョブ実行失敗: {job_id}: {e}")
+            finally:
+                with self.lock:
+                    self.running.pop(job_id, None)
+
+    def cancel(self, job_id):
+        """キュー待ちのジョブを取り除く。取り除けた場合は True（実行中・終了済みは False）。"""
+        with self.lock:
+            for i, (_, _, queued_id) in enumerate(self.queued):
+                if queued_id == job_id:
+                    del self.queued[i]
+                    self.payloads.pop(job_id, None)
+                    return True
+        return False
+
+    def set_priority(self, job_id, priority):
+        """キュー待ちのジョブの優先度を変える。キュー待ちでない場合は False。"""
+        with self.lock:
+            for i, (_, seq, queued_id) in enumerate(self.queued):
+                if queued_id == job_id:
+                    self.queued[i] = (-int(priority), seq, job_id)
+                    self.queued.sort()
+                    return True
+        return False
+
+    def position(self, job_id):
+        """キュー待ちの順番（1 始まり）。キュー待ちでない場合は None。"""
+        with self.lock:
+            for i, (_, _, queued_id) in enumerate(self.queued):
+                if queued_id == job_id:
+                    return i + 1
+        return None
+
+    def snapshot(self):
+        """(キュー待ちの [(job_id, payload)]（実行順）, 実行中の {job_id: payload}) を返す。"""
+        with self.lock:
+            queued = [(job_id, self.payloads[job_id]) for _, _, job_id in self.queued]
+            return queued, dict(self.running)
+
+    def update_queued(self, job_id, update):
+        """
+        キュー待ちのジョブの payload に update(payload) を適用する。
+        確認の間に実行が始まった場合は適用せず False を返す。
+        """
+        with self.lock:
+            if job_id not in self.payloads:
+                return False
+            update(self.payloads[job_id])
+            return True
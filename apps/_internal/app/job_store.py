@@ -0,0 +1,184 @@
+"""
+スクレイピングジョブの永続化（SQLite）。
+
+app.py のジョブ状態（JOBS の dict）と、再開に必要な依頼内容（店舗名とオプション）を保存する。
+スクレイパーの出力する __CHECKPOINT__ マーカーから、保存済みの日付と処理済みの店舗を
+チェックポイントとして記録し、失敗・中断したジョブは未処理の店舗だけで再開できる。
+終了したジョブは保持期間を過ぎたものから削除する。
+"""
+
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+FINAL_STATUSES = ("completed", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    completed_at TEXT,
+    payload TEXT NOT NULL,
+    request TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at);
+CREATE TABLE IF NOT EXISTS job_checkpoints (
+    job_id TEXT NOT NULL,
+    store TEXT NOT NULL,
+    day TEXT NOT NULL,
+    recorded_at TEXT NOT NULL,
+    PRIMARY KEY (job_id, store, day)
+) WITHOUT ROWID;
+"""
+
+# 店舗単位のチェックポイント（店舗の処理完了）は day を空文字で記録する
+STORE_DONE = ""
+
+
+def connect(db_path):
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def save_job(db_path, job, request=None):
+    """ジョブの状態を保存する。request は新規登録・再開時のみ渡す（None の場合は既存の値を残す）。"""
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO jobs (job_id, status, created_at, completed_at, payload, request)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (job_id) DO UPDATE SET
+                    status = excluded.status,
+                    completed_at = excluded.completed_at,
+                    payload = excluded.payload,
+                    request = COALESCE(excluded.request, jobs.request)
+                """,
+                (
+                    job["job_id"],
+                    job.get("status") or "queued",
+                    job.get("created_at") or datetime.now().isoformat(),
+                    job.get("completed_at"),
+                    json.dumps(job, ensure_ascii=False),
+                    json.dumps(request, ensure_ascii=False) if request is not None else None,
+                ),
+            )
+    finally:
+        conn.close()
+
+
+def load_job(db_path, job_id):
+    """(ジョブの dict, 依頼内容) を返す。ない場合は (None, None)。"""
+    if not os.path.exists(db_path):
+        return None, None
+    conn = connect(db_path)
+    try:
+        row = conn.execute("SELECT payload, request FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None, None
+    return json.loads(row[0]), (json.loads(row[1]) if row[1] else None)
+
+
+def list_jobs(db_path, limit=20):
+    """新しい順にジョブの dict を返す（output は含めない）。"""
+    if not os.path.exists(db_path):
+        return []
+    conn = connect(db_path)
+    try:
+        rows = conn.execute("SELECT payload FROM jobs ORDER BY created_at DESC LIMIT ?", (int(limit),)).fetchall()
+    finally:
+        conn.close()
+    jobs = []
+    for (payload,) in rows:
+        job = json.loads(payload)
+        job.pop("output", None)
+        jobs.append(job)
+    return jobs
+
+
+def add_checkpoint(db_path, job_id, store, day=STORE_DONE):
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO job_checkpoints (job_id, store, day, recorded_at) VALUES (?, ?, ?, ?)",
+                (job_id, store, day, datetime.now().isoformat()),
+            )
+    finally:
+        conn.close()
+
+
+def load_checkpoints(db_path, job_id):
+    """(処理済み店舗の集合, 店舗ごとの保存済み日付の dict) を返す。"""
+    completed_stores = set()
+    days = {}
+    if not os.path.exists(db_path):
+        return completed_stores, days
+    conn = connect(db_path)
+    try:
+        rows = conn.execute("SELECT store, day FROM job_checkpoints WHERE job_id = ?", (job_id,)).fetchall()
+    finally:
+        conn.close()
+    for store, day in rows:
+        if day == STORE_DONE:
+            completed_stores.add(store)
+        else:
+            days.setdefault(store, []).append(day)
+    for store_days in days.values():
+        store_days.sort()
+    return completed_stores, days
+
+
+def mark_interrupted(db_path, message):
+    """終了していないジョブ（サーバー停止で中断したもの）を失敗扱いにし、その job_id を返す。整形ジョブは再開不可とする。"""
+    if not os.path.exists(db_path):
+        return []
+    conn = connect(db_path)
+    try:
+        rows = conn.execute(
+            f"SELECT job_id, payload FROM jobs WHERE status NOT IN ({', '.join('?' for _ in FINAL_STATUSES)})",
+            FINAL_STATUSES,
+        ).fetchall()
+        now = datetime.now().isoformat()
+        with conn:
+            for job_id, payload in rows:
+                job = json.loads(payload)
+                job.update(status="failed", message=message, completed_at=now, resumable=job.get("kind") != "format")
+                conn.execute(
+                    "UPDATE jobs SET status = ?, completed_at = ?, payload = ? WHERE job_id = ?",
+                    ("failed", now, json.dumps(job, ensure_ascii=False), job_id),
+                )
+    finally:
+        conn.close()
+    return [job_id for job_id, _ in rows]
+
+
+def purge_finished(db_path, retention_days):
+    """終了から retention_days 日を過ぎたジョブとそのチェックポイントを削除し、件数を返す。"""
+    if retention_days <= 0 or not os.path.exists(db_path):
+        return 0
+    cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat()
+    conn = connect(db_path)
+    try:
+        with conn:
+            job_ids = [
+                row[0]
+                for row in conn.execute(
+                    f"SELECT job_id FROM jobs WHERE status IN ({', '.join('?' for _ in FINAL_STATUSES)}) "
+                    "AND completed_at IS NOT NULL AND completed_at < ?",
+                    (*FINAL_STATUSES, cutoff),
+                )
+            ]
+            conn.executemany("DELETE FROM job_checkpoints WHERE job_id = ?", [(j,) for j in job_ids])
+            conn.executemany("DELETE FROM jobs WHERE job_id = ?", [(j,) for j in job_ids])
+    finally:
+        conn.close()
+    return len(job_ids)
@@ -1,9 +1,25 @@
 import os
-import re
 import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
 import pandas as pd
-from bs4 import BeautifulSoup
+
+import html_archive
+import slotdata_columnar
+from format_manifest import needs_bootstrap, plan_files
+from slotdata import append_rows, extend_raw_columns, new_raw_columns, raw_row_count
+from slotdata_sync import (
+    EXCEL_OUTPUT_DIR,
+    OFFLINE_COLUMNAR_FORMAT,
+    OFFLINE_DB_ENABLED,
+    SLOTDATA_DB_PATH,
+    commit_store,
+    output_path_for,
+    store_lock,
+)
+from slotdata_writer import load_existing_output, load_state, resolve_latest_day, save_state
+from table_extractor import DEFAULT_ENGINE, ENGINES, iter_table_rows
 
 try:
     from tqdm.notebook import tqdm
@@ -14,149 +30,226 @@ APP_DIR = os.path.dirname(os.path.abspath(__file__))
 INTERNAL_ROOT = os.path.dirname(APP_DIR)
 PROJECT_ROOT = os.path.dirname(INTERNAL_ROOT)
 RUNTIME_DIR = os.path.join(INTERNAL_ROOT, "runtime")
-DEFAULT_STORE_LIST_PATH = os.path.join(PROJECT_ROOT, "store_list.csv")
-EXCEL_OUTPUT_DIR = os.getenv("EXCEL_OUTPUT_DIR", os.path.join(PROJECT_ROOT, "output"))
+# 計測（devtools/bench）などで別の店舗リストを使う場合は OFFLINE_STORE_LIST_PATH で指定する
+DEFAULT_STORE_LIST_PATH = os.getenv("OFFLINE_STORE_LIST_PATH", os.path.join(PROJECT_ROOT, "store_list.csv"))
 COMPLETED_STORES_PATH = os.getenv("COMPLETED_STORES_PATH", os.path.join(RUNTIME_DIR, "completed_stores.json"))
-
-if not os.path.exists(DEFAULT_STORE_LIST_PATH):
-    raise FileNotFoundError(f"store_list.csv が見つかりません: {DEFAULT_STORE_LIST_PATH}")
-
-df = pd.read_csv(DEFAULT_STORE_LIST_PATH, encoding='utf-8-sig')
-df = df.drop_duplicates(subset=["data_directory", "store_name"])
-
-processed_outputs = set()
-completed_stores = []
-processed_stores = []
-
-os.makedirs(EXCEL_OUTPUT_DIR, exist_ok=True)
-os.makedirs(RUNTIME_DIR, exist_ok=True)
-
-for i, (_, row) in enumerate(df.iterrows()):
-    if i > 0:
-        print("\n")
-
-    html_dir = row["data_directory"]
-    store_name = row["store_name"]
-
-    safe_store_name = re.sub(r'[\\/*?:"<>|]', "", store_name)
-    output_path = os.path.join(EXCEL_OUTPUT_DIR, f"{safe_store_name}-slotdata.csv")
-
-    if output_path in processed_outputs:
-        continue
-    processed_outputs.add(output_path)
-
-    all_data = []
-
-    latest_day = None
-    existing_days = set()
-    if os.path.exists(output_path):
-        try:
-            existing_df = pd.read_csv(output_path)
-            if "Total" in existing_df.columns and "total" not in existing_df.columns:
-                existing_df = existing_df.rename(columns={"Total": "total"})
-            if "day" in existing_df.columns:
-                existing_df["day"] = pd.to_datetime(existing_df["day"], errors="coerce")
-                existing_days = set(existing_df["day"].dt.strftime("%Y-%m-%d").dropna())
-                latest_day = existing_df["day"].max()
-            else:
-                existing_df = pd.DataFrame()
-                latest_day = None
-                existing_days = set()
-        except Exception:
-            existing_df = pd.DataFrame()
-    else:
-        existing_df = pd.DataFrame()
-
+# 1 は従来どおりの逐次処理、0 は CPU コア数ぶんのプロセスで並列処理
+OFFLINE_FORMAT_WORKERS = int(os.getenv("OFFLINE_FORMAT_WORKERS", "1") or 1)
+# lxml（高速）/ bs4（従来の BeautifulSoup 経路、比較用）
+OFFLINE_TABLE_PARSER = os.getenv("OFFLINE_TABLE_PARSER", DEFAULT_ENGINE)
+
+
+def report_progress(kind, current, total, detail=""):
+    """WebUI（app.py）が読み取る進捗マーカーを出力する（kind: store_start / store / file）。"""
+    print(f"__PROGRESS__ {kind} {current}/{total} {detail}".rstrip(), flush=True)
+
+
+def prepare_store(html_dir, output_path, state):
+    """最新日を確定し、解析が必要な日付HTMLを返す。"""
+    known_days = None
+    if needs_bootstrap(state) and os.path.exists(output_path):
+        _, known_days, _ = load_existing_output(output_path)
+    resolve_latest_day(output_path, state)
+    return plan_files(html_dir, state, known_days)
+
+
+def read_day_rows(html_dir, file, engine=DEFAULT_ENGINE):
+    """店舗フォルダ（またはその圧縮アーカイブ）の日付HTMLの行を返す。表やファイルがなければ None。"""
+    source = html_archive.open_day(html_dir, file)
+    if source is None:
+        return None
+    return iter_table_rows(source, engine=engine)
+
+
+def parse_day_file(html_dir, file, day, engine=DEFAULT_ENGINE):
+    """1日分のHTMLから all_data_table の行を読み取り、列ごとのセル文字列を返す。"""
+    columns = new_raw_columns()
+    rows = read_day_rows(html_dir, file, engine=engine)
+    if rows is not None:
+        append_rows(columns, rows, day)
+    return columns
+
+
+def plan_stores(store_df):
+    """店舗リストから処理対象を作る。出力先CSVが重複する店舗は先勝ち。"""
+    store_df = store_df.drop_duplicates(subset=["data_directory", "store_name"])
+    tasks = []
+    processed_outputs = set()
+    for _, row in store_df.iterrows():
+        store_name = row["store_name"]
+        output_path = output_path_for(store_name)
+        if output_path in processed_outputs:
+            continue
+        processed_outputs.add(output_path)
+        tasks.append({
+            "store_name": store_name,
+            "html_dir": row["data_directory"],
+            "output_path": output_path,
+        })
+    return tasks
+
+
+def scan_store(html_dir, output_path):
+    """
+    マニフェストを照合して解析が必要な日付HTMLを返す。
+    解析結果の反映（commit_store）は状態ファイルを読み直すため、照合結果はここで保存しておく。
+    """
     if not os.path.isdir(html_dir):
-        processed_stores.append(store_name)
-        continue
-
-    html_files = [
-        f for f in os.listdir(html_dir)
-        if f.endswith(".html") and re.search(r"\d{4}-\d{2}-\d{2}", f)
-    ]
-    file_day_map = {f: re.search(r"\d{4}-\d{2}-\d{2}", f).group(0) for f in html_files}
-    new_files = [f for f, day in file_day_map.items() if day not in existing_days and (not latest_day or pd.to_datetime(day) > latest_day)]
-    new_files.sort()
-
-    for file in tqdm(new_files, desc=store_name[:20], unit="file"):
-        day = file_day_map[file]
-
-        file_path = os.path.join(html_dir, file)
-        with open(file_path, "r", encoding="utf-8") as f:
-            soup = BeautifulSoup(f, "lxml")
-
-        table = soup.find("table", {"id": "all_data_table"})
-        if not table:
+        return None
+    with store_lock(output_path) as state_path:
+        state = load_state(state_path)
+        pending = prepare_store(html_dir, output_path, state)
+        save_state(state_path, state)
+    return pending
+
+
+def run_serial(tasks, engine, columnar_format, db_path):
+    completed_stores = []
+    processed_stores = []
+    for i, task in enumerate(tasks):
+        if i > 0:
+            print("\n")
+
+        store_name = task["store_name"]
+        html_dir = task["html_dir"]
+        output_path = task["output_path"]
+        report_progress("store_start", i + 1, len(tasks), store_name)
+
+        if not os.path.isdir(html_dir):
+            processed_stores.append(store_name)
+            report_progress("store", i + 1, len(tasks), store_name)
             continue
 
-        rows = table.find_all("tr")[1:]
-        for row in rows:
-            cols = row.find_all("td")
-            if len(cols) < 6:
+        pending = scan_store(html_dir, output_path)
+        parsed_files = []
+        columns = new_raw_columns()
+        for file_no, (file, day, entry) in enumerate(tqdm(pending, desc=store_name[:20], unit="file"), start=1):
+            rows = read_day_rows(html_dir, file, engine=engine)
+            row_count = append_rows(columns, rows, day) if rows is not None else 0
+            parsed_files.append((file, entry, row_count))
+            report_progress("file", file_no, len(pending), store_name)
+
+        if commit_store(store_name, output_path, columns, parsed_files, columnar_format, db_path):
+            completed_stores.append(store_name)
+        processed_stores.append(store_name)
+        report_progress("store", i + 1, len(tasks), store_name)
+    return completed_stores, processed_stores
+
+
+def run_parallel(tasks, workers, engine, columnar_format, db_path):
+    """
+    店舗単位（マニフェスト照合・CSV書き出し）と日付ファイル単位（HTML解析）の
+    両方をプロセスプールへ投入する。結果の集計は店舗リスト順で行うため、
+    出力内容は逐次処理と同一になる。
+    """
+    completed_stores = []
+    processed_stores = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        scan_futures = [
+            pool.submit(scan_store, task["html_dir"], task["output_path"])
+            for task in tasks
+        ]
+
+        parse_futures = []
+        for task, scan_future in zip(tasks, scan_futures):
+            pending = scan_future.result()
+            if pending is None:
+                parse_futures.append(None)
                 continue
+            parse_futures.append([
+                (file, entry, pool.submit(parse_day_file, task["html_dir"], file, day, engine))
+                for file, day, entry in pending
+            ])
+
+        total_files = sum(len(f) for f in parse_futures if f)
+        write_futures = []
+        # 日付ファイルの進捗は逐次処理と同じく店舗内の番号で出力する（コンソールの進捗バーは全店舗の通し）
+        with tqdm(total=total_files, desc="all stores", unit="file") as bar:
+            for store_no, (task, file_futures) in enumerate(zip(tasks, parse_futures), start=1):
+                report_progress("store_start", store_no, len(tasks), task["store_name"])
+                if file_futures is None:
+                    write_futures.append(None)
+                    continue
+                parsed_files = []
+                columns = new_raw_columns()
+                for file_no, (file, entry, future) in enumerate(file_futures, start=1):
+                    file_columns = future.result()
+                    extend_raw_columns(columns, file_columns)
+                    parsed_files.append((file, entry, raw_row_count(file_columns)))
+                    bar.update(1)
+                    report_progress("file", file_no, len(file_futures), task["store_name"])
+                write_futures.append(
+                    pool.submit(
+                        commit_store,
+                        task["store_name"],
+                        task["output_path"],
+                        columns,
+                        parsed_files,
+                        columnar_format,
+                        db_path,
+                    )
+                )
+
+        for store_no, (task, write_future) in enumerate(zip(tasks, write_futures), start=1):
+            if write_future is not None and write_future.result():
+                completed_stores.append(task["store_name"])
+            processed_stores.append(task["store_name"])
+            report_progress("store", store_no, len(tasks), task["store_name"])
+    return completed_stores, processed_stores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="保存済みHTMLを店舗ごとのCSVへ整形")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=OFFLINE_FORMAT_WORKERS,
+        help="並列プロセス数（1は逐次処理、0はCPUコア数）",
+    )
+    parser.add_argument(
+        "--parser",
+        choices=ENGINES,
+        default=OFFLINE_TABLE_PARSER,
+        help="表の抽出エンジン（lxml: 高速 / bs4: 従来方式）",
+    )
+    parser.add_argument(
+        "--columnar",
+        choices=slotdata_columnar.FORMATS,
+        default=OFFLINE_COLUMNAR_FORMAT,
+        help="CSV に加えて書き出す列指向形式（parquet: 月別パーティション / feather: 1ファイル）",
+    )
+    parser.add_argument(
+        "--db",
+        action=argparse.BooleanOptionalAction,
+        default=OFFLINE_DB_ENABLED,
+        help=f"全店舗をまとめた SQLite DB へも取り込む（{SLOTDATA_DB_PATH}）",
+    )
+    args = parser.parse_args()
+
+    columnar_format = args.columnar
+    if columnar_format != "off" and not slotdata_columnar.is_available():
+        print("[警告] pyarrow が未インストールのため列指向出力をスキップします（pip install pyarrow）")
+        columnar_format = "off"
+
+    if not os.path.exists(DEFAULT_STORE_LIST_PATH):
+        raise FileNotFoundError(f"store_list.csv が見つかりません: {DEFAULT_STORE_LIST_PATH}")
+
+    store_df = pd.read_csv(DEFAULT_STORE_LIST_PATH, encoding='utf-8-sig')
+
+    os.makedirs(EXCEL_OUTPUT_DIR, exist_ok=True)
+    os.makedirs(RUNTIME_DIR, exist_ok=True)
+
+    tasks = plan_stores(store_df)
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    db_path = SLOTDATA_DB_PATH if args.db else None
+    if workers > 1 and tasks:
+        completed_stores, processed_stores = run_parallel(tasks, workers, args.parser, columnar_format, db_path)
+    else:
+        completed_stores, processed_stores = run_serial(tasks, args.parser, columnar_format, db_path)
+
+    with open(COMPLETED_STORES_PATH, "w", encoding="utf-8") as f:
+        json.dump({"completed": completed_stores, "processed": processed_stores}, f, ensure_ascii=False, indent=2)
 
-            dai_name = cols[0].get_text(strip=True)
-            dai_num = cols[1].get_text(strip=True).replace(",", "")
-            game = cols[2].get_text(strip=True).replace(",", "")
-            diff = cols[3].get_text(strip=True).replace(",", "").replace("+", "")
-            bb = cols[4].get_text(strip=True)
-            rb = cols[5].get_text(strip=True)
-
-            try:
-                game_int = int(game)
-            except Exception:
-                game_int = 0
-            try:
-                bb_int = int(bb)
-            except Exception:
-                bb_int = 0
-            try:
-                rb_int = int(rb)
-            except Exception:
-                rb_int = 0
-            try:
-                diff_int = int(diff)
-            except Exception:
-                diff_int = 0
-
-            total = round(game_int / (bb_int + rb_int), 1) if (bb_int + rb_int) else 0
-            big_per = round(game_int / bb_int, 1) if bb_int else 0
-            reg_per = round(game_int / rb_int, 1) if rb_int else 0
-
-            all_data.append({
-                "day": day,
-                "dai_name": dai_name,
-                "dai_num": int(dai_num) if dai_num.isdigit() else 0,
-                "game": game_int,
-                "difference": diff_int,
-                "bb": bb_int,
-                "rb": rb_int,
-                "total": total,
-                "big_per": big_per,
-                "reg_per": reg_per,
-            })
-
-    if all_data:
-        df_result = pd.DataFrame(all_data)
-
-        if not existing_df.empty:
-            df_result = pd.concat([existing_df, df_result], ignore_index=True)
-            if "day" in df_result.columns:
-                df_result["day"] = pd.to_datetime(df_result["day"], errors="coerce")
-            df_result = df_result.drop_duplicates(subset=["day", "dai_name", "dai_num"], keep="last").reset_index(drop=True)
-        else:
-            if "day" in df_result.columns:
-                df_result["day"] = pd.to_datetime(df_result["day"], errors="coerce")
-
-        if "day" in df_result.columns:
-            df_result["day"] = df_result["day"].dt.strftime("%Y-%m-%d")
-
-        df_result.to_csv(output_path, index=False, encoding="utf-8-sig")
-        completed_stores.append(store_name)
-
-    processed_stores.append(store_name)
-
-with open(COMPLETED_STORES_PATH, "w", encoding="utf-8") as f:
-    json.dump({"completed": completed_stores, "processed": processed_stores}, f, ensure_ascii=False, indent=2)
 
+if __name__ == "__main__":
+    main()
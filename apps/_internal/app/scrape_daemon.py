@@ -0,0 +1,265 @@
+"""
+スクレイピングの常駐プロセス。
+
+app.py から multiprocessing.connection（127.0.0.1 のTCP、認証キー付き）でジョブを受け取り、
+anasuro_selective.main() をこのプロセス内で実行する。ブラウザと HTTP セッションは
+SessionPool に残してジョブをまたいで使い回すため、2回目以降のジョブは Chrome の起動や
+Cloudflare の確認を繰り返さない。ブラウザはページ遷移数・メモリ使用量が上限を超えた時点で作り直す。
+
+標準出力はジョブごとに接続元へ1行ずつ転送するため、app.py 側は子プロセス実行時と同じ
+__PROGRESS__ マーカーで進捗を扱える。ジョブは1件ずつ順番に実行する（app.py も同時に1件だけ渡す）。
+取り消しに応じないジョブは terminate() で常駐プロセスごと止め、次のジョブで起動し直す。
+
+メッセージ形式（dict）:
+- app.py -> 常駐: {"type": "ping"} / {"type": "scrape", "argv": [...]} / {"type": "shutdown"}
+- 常駐 -> app.py: {"type": "pong", "pid": ...} / {"type": "line", "line": "..."} / {"type": "done", "returncode": 0}
+"""
+
+import contextlib
+import io
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import AuthenticationError, Client, Listener
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+INTERNAL_ROOT = os.path.dirname(APP_DIR)
+PROJECT_ROOT = os.path.dirname(INTERNAL_ROOT)
+RUNTIME_DIR = os.path.join(INTERNAL_ROOT, "runtime")
+
+SCRAPE_DAEMON_HOST = os.getenv("SCRAPE_DAEMON_HOST", "127.0.0.1")
+SCRAPE_DAEMON_PORT = int(os.getenv("SCRAPE_DAEMON_PORT", "50741"))
+SCRAPE_DAEMON_KEY_PATH = os.getenv("SCRAPE_DAEMON_KEY_PATH", os.path.join(RUNTIME_DIR, "scrape_daemon.key"))
+SCRAPE_DAEMON_LOG_PATH = os.getenv("SCRAPE_DAEMON_LOG_PATH", os.path.join(RUNTIME_DIR, "scrape_daemon.log"))
+SCRAPE_DAEMON_START_TIMEOUT_SECONDS = int(os.getenv("SCRAPE_DAEMON_START_TIMEOUT_SECONDS", "30"))
+
+
+def daemon_address():
+    return (SCRAPE_DAEMON_HOST, SCRAPE_DAEMON_PORT)
+
+
+def load_authkey(create=False):
+    """接続用の認証キー。環境変数 SCRAPE_DAEMON_AUTHKEY がなければ runtime のキーファイルを使う。"""
+    env_key = os.getenv("SCRAPE_DAEMON_AUTHKEY")
+    if env_key:
+        return env_key.encode("utf-8")
+    try:
+        with open(SCRAPE_DAEMON_KEY_PATH, "r", encoding="utf-8") as f:
+            key = f.read().strip()
+        if key:
+            return key.encode("utf-8")
+    except FileNotFoundError:
+        pass
+    if not create:
+        return None
+
+    os.makedirs(os.path.dirname(SCRAPE_DAEMON_KEY_PATH), exist_ok=True)
+    key = secrets.token_hex(32)
+    tmp_path = f"{SCRAPE_DAEMON_KEY_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(key)
+    os.replace(tmp_path, SCRAPE_DAEMON_KEY_PATH)
+    return key.encode("utf-8")
+
+
+# ---- 常駐プロセス側 ----
+
+class _ConnectionWriter(io.TextIOBase):
+    """print() の出力を1行ずつ接続元へ送る。複数スレッドから書かれても行単位で送る。"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.buffer = ""
+        self.lock = threading.Lock()
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        with self.lock:
+            self.buffer += text
+            *lines, self.buffer = self.buffer.split("\n")
+            for line in lines:
+                self.conn.send({"type": "line", "line": line})
+        return len(text)
+
+    def flush(self):
+        with self.lock:
+            if self.buffer:
+                self.conn.send({"type": "line", "line": self.buffer})
+                self.buffer = ""
+
+
+def _run_job(argv, conn, session_pool):
+    import anasuro_selective
+
+    writer = _ConnectionWriter(conn)
+    returncode = 0
+    with contextlib.redirect_stdout(writer):
+        try:
+            anasuro_selective.main(argv, session_pool=session_pool)
+        except SystemExit as e:
+            returncode = e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            print(f"[エラー] {e}")
+            returncode = 1
+    writer.flush()
+    return returncode
+
+
+def _handle_connection(conn, session_pool, job_lock):
+    try:
+        message = conn.recv()
+        kind = message.get("type") if isinstance(message, dict) else None
+        if kind == "ping":
+            conn.send({"type": "pong", "pid": os.getpid()})
+        elif kind == "scrape":
+            with job_lock:
+                returncode = _run_job([str(a) for a in message.get("argv") or []], conn, session_pool)
+            conn.send({"type": "done", "returncode": returncode})
+        elif kind == "shutdown":
+            with job_lock:
+                session_pool.close_all()
+                conn.send({"type": "done", "returncode": 0})
+            print("[常駐] 停止要求を受けたため終了します", flush=True)
+            os._exit(0)
+    except (EOFError, OSError):
+        pass
+    finally:
+        with contextlib.suppress(Exception):
+            conn.close()
+
+
+def serve():
+    import anasuro_selective
+
+    authkey = load_authkey(create=True)
+    session_pool = anasuro_selective.SessionPool()
+    job_lock = threading.Lock()
+    listener = Listener(daemon_address(), authkey=authkey)
+    print(f"[常駐] スクレイピング常駐プロセスを開始しました: {SCRAPE_DAEMON_HOST}:{SCRAPE_DAEMON_PORT}", flush=True)
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, OSError, EOFError) as e:
+                print(f"[警告] 接続を拒否しました: {e}", flush=True)
+                continue
+            threading.Thread(target=_handle_connection, args=(conn, session_pool, job_lock), daemon=True).start()
+    finally:
+        session_pool.close_all()
+        listener.close()
+
+
+# ---- app.py 側 ----
+
+def _connect():
+    authkey = load_authkey()
+    if authkey is None:
+        raise ConnectionRefusedError("常駐プロセスの認証キーがありません")
+    return Client(daemon_address(), authkey=authkey)
+
+
+def _ping():
+    """常駐プロセスの pong を返す。接続できない場合は None。"""
+    try:
+        conn = _connect()
+    except (OSError, EOFError, AuthenticationError):
+        return None
+    try:
+        conn.send({"type": "ping"})
+        reply = conn.recv() or {}
+        return reply if reply.get("type") == "pong" else None
+    except (OSError, EOFError):
+        return None
+    finally:
+        conn.close()
+
+
+def ping():
+    return _ping() is not None
+
+
+def ensure_running():
+    """常駐プロセスが動いていなければ起動し、接続できるまで待つ。起動できなければ False。"""
+    if ping():
+        return True
+
+    load_authkey(create=True)
+    os.makedirs(os.path.dirname(SCRAPE_DAEMON_LOG_PATH), exist_ok=True)
+    creationflags = 0
+    if os.name == "nt":
+        creationflags = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.DETACHED_PROCESS
+    with open(SCRAPE_DAEMON_LOG_PATH, "a", encoding="utf-8") as log:
+        subprocess.Popen(
+            [sys.executable, "-u", os.path.abspath(__file__)],
+            cwd=PROJECT_ROOT,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            creationflags=creationflags,
+            start_new_session=os.name != "nt",
+        )
+
+    deadline = time.time() + SCRAPE_DAEMON_START_TIMEOUT_SECONDS
+    while time.time() < deadline:
+        if ping():
+            return True
+        time.sleep(0.5)
+    return False
+
+
+def run_job(argv, on_line):
+    """常駐プロセスでスクレイピングを実行し、出力行ごとに on_line を呼ぶ。戻り値は終了コード。"""
+    conn = _connect()
+    try:
+        conn.send({"type": "scrape", "argv": list(argv)})
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                on_line("[エラー] 常駐プロセスとの接続が切れました")
+                return 1
+            if message.get("type") == "line":
+                on_line(message.get("line", ""))
+            elif message.get("type") == "done":
+                return int(message.get("returncode") or 0)
+    finally:
+        conn.close()
+
+
+def terminate():
+    """
+    常駐プロセスを（起動したブラウザごと）強制終了する。実行中のジョブの接続は切れる。
+    停止要求（shutdown）はジョブの終了を待つため、取り消しに応じないジョブを止める場合に使う。
+    """
+    pid = (_ping() or {}).get("pid")
+    if not pid:
+        return False
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/PID", str(pid), "/T", "/F"], capture_output=True)
+        return True
+    try:
+        # ensure_running() は新しいセッションで起動するため、プロセスグループごと止める
+        os.killpg(pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        os.kill(pid, signal.SIGTERM)
+    return True
+
+
+def shutdown():
+    conn = _connect()
+    try:
+        conn.send({"type": "shutdown"})
+        with contextlib.suppress(EOFError):
+            conn.recv()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    serve()
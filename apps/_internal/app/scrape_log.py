@@ -0,0 +1,139 @@
+"""
+操作ログ（scraping_log.json、1行1件の JSON）の追記と読み出し。
+
+読み出しはファイル末尾から逆向きにブロック単位で読むため、ログ全体の大きさに関係なく
+最新の N 件を返せる。続きはカーソル（ファイルの識別子と読み終えた位置のバイトオフセット）で取得する。
+ファイルが SCRAPE_LOG_MAX_BYTES を超えたら gzip で圧縮した
+`scraping_log.json.<日時>.gz` へ切り替え、古いものから SCRAPE_LOG_ARCHIVE_KEEP 件を超えた分を削除する。
+"""
+
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+
+SCRAPE_LOG_MAX_BYTES = int(os.getenv("SCRAPE_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+SCRAPE_LOG_ARCHIVE_KEEP = int(os.getenv("SCRAPE_LOG_ARCHIVE_KEEP", "10"))
+READ_BLOCK_SIZE = 64 * 1024
+
+# action のない従来のスクレイピングのログは "scrape" として扱う
+DEFAULT_ACTION = "scrape"
+
+_LOCK = threading.Lock()
+
+
+class CursorError(ValueError):
+    """カーソルが不正、またはローテーションで無効になった。"""
+
+    def __init__(self, message, rotated=False):
+        super().__init__(message)
+        self.rotated = rotated
+
+
+def append_entry(path, entry, max_bytes=SCRAPE_LOG_MAX_BYTES, keep=SCRAPE_LOG_ARCHIVE_KEEP):
+    line = json.dumps(entry, ensure_ascii=False) + "\n"
+    with _LOCK:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+            size = f.tell()
+        if max_bytes > 0 and size >= max_bytes:
+            try:
+                _rotate(path, keep)
+            except PermissionError as e:
+                # Windows で読み出し中などの場合は次回の追記時に切り替える
+                print(f"[警告] ログのローテーションに失敗しました: {e}")
+
+
+def _rotate(path, keep):
+    archive = f"{path}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+    os.replace(path, archive)
+    with open(archive, "rb") as src, gzip.open(f"{archive}.gz", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(archive)
+    for old in list_archives(path)[:-keep] if keep > 0 else []:
+        os.remove(old)
+
+
+def list_archives(path):
+    """圧縮済みのログを古い順に返す。"""
+    return sorted(glob.glob(f"{glob.escape(path)}.*.gz"))
+
+
+def _file_id(st):
+    # ローテーション後は別のファイルになるため、i-node（Windows はファイルID）で見分ける
+    return f"{st.st_ino:x}"
+
+
+def _parse_cursor(cursor, st):
+    file_id, sep, offset = str(cursor).partition(":")
+    if not sep or not offset.isdigit():
+        raise CursorError("cursor が不正です")
+    if file_id != _file_id(st):
+        raise CursorError("ログがローテーションされたため cursor は無効です", rotated=True)
+    return min(int(offset), st.st_size)
+
+
+def _iter_lines_reverse(f, end):
+    """end より前の行を末尾から順に (行頭のオフセット, 行のバイト列) で返す。"""
+    pos = end
+    tail = b""
+    while pos > 0:
+        size = min(READ_BLOCK_SIZE, pos)
+        pos -= size
+        f.seek(pos)
+        chunk = f.read(size) + tail
+        lines = chunk.split(b"\n")
+        # 先頭は前のブロックから続く行の可能性があるため次のブロックへ持ち越す
+        tail = lines.pop(0)
+        offset = pos + len(tail) + 1
+        starts = []
+        for line in lines:
+            starts.append(offset)
+            offset += len(line) + 1
+        for start, line in zip(reversed(starts), reversed(lines)):
+            yield start, line
+    if tail:
+        yield 0, tail
+
+
+def read_entries(path, limit=20, cursor=None, action=None, day_from=None, day_to=None):
+    """
+    新しい方から limit 件を古い順に並べて (entries, next_cursor) を返す。
+    cursor を渡すとその位置より前のログを返す。next_cursor はそれより古いログがなければ None。
+    action・day_from・day_to（YYYY-MM-DD、timestamp の日付で比較）で絞り込める。
+    """
+    if not os.path.exists(path):
+        if cursor:
+            raise CursorError("ログがローテーションされたため cursor は無効です", rotated=True)
+        return [], None
+
+    entries = []
+    next_cursor = None
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        end = _parse_cursor(cursor, st) if cursor else st.st_size
+        for start, line in _iter_lines_reverse(f, end):
+            if len(entries) >= limit:
+                next_cursor = f"{_file_id(st)}:{start + len(line) + 1}"
+                break
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(entry, dict):
+                continue
+            day = str(entry.get("timestamp", ""))[:10]
+            if day_from and day < day_from:
+                # ログは時刻順のため、これより前に条件に合うものはない
+                break
+            if day_to and day > day_to:
+                continue
+            if action and entry.get("action", DEFAULT_ACTION) != action:
+                continue
+            entries.append(entry)
+    entries.reverse()
+    return entries, next_cursor
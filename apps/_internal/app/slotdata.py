@@ -0,0 +1,118 @@
+"""
+台別データ（slotdata）のレコード組み立て。
+
+表から取り出したセル文字列は行ごとの dict にせず列ごとのリストへ溜めておき、
+店舗単位で数値化と確率計算をまとめて行う。
+変換規則は従来の1行ずつの処理と同じ（数値化できない値は 0、0除算は 0、
+確率は小数第1位に丸め）。
+"""
+
+import numpy as np
+import pandas as pd
+
+OUTPUT_COLUMNS = ["day", "dai_name", "dai_num", "game", "difference", "bb", "rb", "total", "big_per", "reg_per"]
+RAW_COLUMNS = ["day", "dai_name", "dai_num", "game", "difference", "bb", "rb"]
+MIN_CELLS = 6
+
+_INT_PATTERN = r"[+-]?\d+(?:_\d+)*"
+
+
+def new_raw_columns():
+    return {col: [] for col in RAW_COLUMNS}
+
+
+def append_rows(columns, rows, day):
+    """セル文字列の行を列ごとのリストへ追加し、追加した行数を返す。"""
+    count = 0
+    for cells in rows:
+        if len(cells) < MIN_CELLS:
+            continue
+        columns["dai_name"].append(cells[0])
+        columns["dai_num"].append(cells[1])
+        columns["game"].append(cells[2])
+        columns["difference"].append(cells[3])
+        columns["bb"].append(cells[4])
+        columns["rb"].append(cells[5])
+        count += 1
+    columns["day"].extend([day] * count)
+    return count
+
+
+def extend_raw_columns(columns, other):
+    for col in RAW_COLUMNS:
+        columns[col].extend(other[col])
+
+
+def raw_row_count(columns):
+    return len(columns["day"])
+
+
+def _int_or_zero(text):
+    try:
+        return int(text)
+    except ValueError:
+        return 0
+
+
+def _to_int(series, mask):
+    """mask が True の要素を整数化し、それ以外は 0 とする。"""
+    values = pd.to_numeric(series.where(mask), errors="coerce")
+    # 全角数字など to_numeric が扱えない値は int() に任せる
+    leftover = mask & values.isna()
+    if leftover.any():
+        values[leftover] = [_int_or_zero(v) for v in series[leftover]]
+    return values.fillna(0).astype("int64")
+
+
+def _parse_int(series):
+    """int() と同じく符号付き整数のみ受け付ける。失敗時は 0。"""
+    series = series.str.strip()
+    return _to_int(series, series.str.fullmatch(_INT_PATTERN).fillna(False))
+
+
+def _round1(values):
+    """Python の round(x, 1) と同じ結果を返す。"""
+    rounded = np.round(values, 1)
+    # np.round は x*10 の誤差で .x5 付近の丸め方向が round() と食い違うため、その要素だけ round() で計算する
+    scaled = values * 10
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        rounded[near_tie] = [round(v, 1) for v in values[near_tie].tolist()]
+    return rounded
+
+
+def _rate(game, denominator):
+    nonzero = denominator != 0
+    if not nonzero.any():
+        return np.zeros(len(game), dtype="int64")
+    rates = np.zeros(len(game), dtype="float64")
+    rates[nonzero] = _round1(game[nonzero] / denominator[nonzero])
+    return rates
+
+
+def build_frame(columns):
+    """列ごとのセル文字列から出力用 DataFrame を作る。"""
+    raw = pd.DataFrame({col: pd.Series(columns[col], dtype="object") for col in RAW_COLUMNS})
+
+    dai_num = raw["dai_num"].str.replace(",", "", regex=False)
+    game = _parse_int(raw["game"].str.replace(",", "", regex=False))
+    difference = _parse_int(raw["difference"].str.replace(",", "", regex=False).str.replace("+", "", regex=False))
+    bb = _parse_int(raw["bb"])
+    rb = _parse_int(raw["rb"])
+
+    game_values = game.to_numpy()
+    bb_values = bb.to_numpy()
+    rb_values = rb.to_numpy()
+
+    return pd.DataFrame({
+        "day": raw["day"],
+        "dai_name": raw["dai_name"],
+        "dai_num": _to_int(dai_num, dai_num.str.isdigit().fillna(False)),
+        "game": game,
+        "difference": difference,
+        "bb": bb,
+        "rb": rb,
+        "total": _rate(game_values, bb_values + rb_values),
+        "big_per": _rate(game_values, bb_values),
+        "reg_per": _rate(game_values, rb_values),
+    }, columns=OUTPUT_COLUMNS)
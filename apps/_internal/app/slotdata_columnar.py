@@ -0,0 +1,172 @@
+"""
+店舗ごとの slotdata を列指向形式（Parquet / Feather）でも書き出す。
+
+CSV と同じ内容を型付きで保存し、分析側で文字列からの再変換なしに読み込めるようにする。
+
+- parquet: `{店舗}-slotdata.parquet/month=YYYY-MM/part-0.parquet`（月単位のパーティション）
+- feather: `{店舗}-slotdata.feather`（1ファイル）
+
+型は day=date32、dai_name=辞書型（カテゴリ）、台番号・G数・差枚・BB・RB=int32、
+確率=float32。新しい行は該当する月（feather はファイル全体）にだけマージする。
+pyarrow が未インストールの場合は何もしない。
+"""
+
+import os
+import shutil
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from slotdata_writer import load_existing_output
+
+FORMATS = ("off", "parquet", "feather")
+INT_COLUMNS = ["dai_num", "game", "difference", "bb", "rb"]
+RATE_COLUMNS = ["total", "big_per", "reg_per"]
+
+if pa is not None:
+    SCHEMA = pa.schema(
+        [("day", pa.date32()), ("dai_name", pa.dictionary(pa.int32(), pa.string()))]
+        + [(col, pa.int32()) for col in INT_COLUMNS]
+        + [(col, pa.float32()) for col in RATE_COLUMNS]
+    )
+
+
+def is_available():
+    return pa is not None
+
+
+def columnar_path_for(output_path, fmt):
+    base = os.path.splitext(output_path)[0]
+    return f"{base}.{fmt}"
+
+
+def _to_table(frame):
+    df = pd.DataFrame({
+        "day": pd.to_datetime(frame["day"], errors="coerce"),
+        "dai_name": frame["dai_name"].astype("string").astype("category"),
+    })
+    for col in INT_COLUMNS:
+        df[col] = pd.to_numeric(frame[col], errors="coerce").fillna(0).astype("int32")
+    for col in RATE_COLUMNS:
+        df[col] = pd.to_numeric(frame[col], errors="coerce").fillna(0).astype("float32")
+    return pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False)
+
+
+def _merge(existing, new_table):
+    """既存テーブルから新しい日付の行を除いて新しい行を足し、日付順に並べる。"""
+    if existing is not None and existing.num_rows:
+        keep = pc.invert(pc.is_in(existing["day"], value_set=pc.unique(new_table["day"])))
+        merged = pa.concat_tables([existing.filter(keep).cast(SCHEMA), new_table])
+    else:
+        merged = new_table
+    # sort_indices は安定ソートのため、同じ日付内の行順は保たれる
+    return merged.take(pc.sort_indices(merged, sort_keys=[("day", "ascending")]))
+
+
+def _replace_file(path, write):
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _month_key(day_array):
+    return pc.strftime(day_array.cast(pa.timestamp("s")), format="%Y-%m")
+
+
+def _write_parquet(dataset_dir, table, full):
+    if full and os.path.isdir(dataset_dir):
+        shutil.rmtree(dataset_dir)
+    months = _month_key(table["day"])
+    for month in pc.unique(months).to_pylist():
+        if month is None:
+            continue
+        part_dir = os.path.join(dataset_dir, f"month={month}")
+        part_path = os.path.join(part_dir, "part-0.parquet")
+        os.makedirs(part_dir, exist_ok=True)
+        month_table = table.filter(pc.equal(months, month))
+        existing = pq.read_table(part_path, schema=SCHEMA) if os.path.exists(part_path) else None
+        merged = _merge(existing, month_table)
+        _replace_file(part_path, lambda p: pq.write_table(merged, p, compression="zstd"))
+
+
+def _write_feather(path, table, full):
+    existing = None
+    if not full and os.path.exists(path):
+        existing = feather.read_table(path, memory_map=True)
+    merged = _merge(existing, table)
+    _replace_file(path, lambda p: feather.write_feather(merged, p, compression="zstd"))
+
+
+def is_current(state, fmt):
+    """列指向ファイルが現在のCSVと同じ内容まで反映済みかどうか。"""
+    synced = state.get("columnar") or {}
+    output_state = state.get("output") or {}
+    return (
+        synced.get("format") == fmt
+        and synced.get("size") == output_state.get("size")
+        and synced.get("mtime_ns") == output_state.get("mtime_ns")
+    )
+
+
+def sync_store(output_path, fmt, state, frame=None):
+    """
+    CSV の内容を列指向ファイルへ反映する。
+    frame を渡した場合はその行だけをマージし、None の場合は CSV 全体から作り直す。
+    反映後、state に同期済みのCSVを記録する。
+    """
+    if fmt == "off" or pa is None:
+        return False
+
+    full = frame is None
+    if full:
+        frame, _, _ = load_existing_output(output_path)
+        if frame.empty:
+            return False
+    table = _to_table(frame)
+
+    path = columnar_path_for(output_path, fmt)
+    if fmt == "parquet":
+        _write_parquet(path, table, full)
+    else:
+        _write_feather(path, table, full)
+
+    output_state = state.get("output") or {}
+    state["columnar"] = {
+        "format": fmt,
+        "size": output_state.get("size"),
+        "mtime_ns": output_state.get("mtime_ns"),
+    }
+    return True
+
+
+def read_store(path, day_from=None, day_to=None, columns=None):
+    """
+    列指向ファイルを DataFrame で読み込む。
+    day_from / day_to（YYYY-MM-DD）は Parquet では読み込み前の絞り込みとして使われる。
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow がインストールされていません")
+
+    conditions = []
+    if day_from:
+        conditions.append(ds.field("day") >= pa.scalar(pd.Timestamp(day_from).date(), pa.date32()))
+    if day_to:
+        conditions.append(ds.field("day") <= pa.scalar(pd.Timestamp(day_to).date(), pa.date32()))
+    flt = None
+    for cond in conditions:
+        flt = cond if flt is None else (flt & cond)
+
+    if os.path.isdir(path):
+        dataset = ds.dataset(path, format="parquet", partitioning="hive")
+        columns = columns or SCHEMA.names
+    else:
+        dataset = ds.dataset(path, format="feather")
+    return dataset.to_table(columns=columns, filter=flt).to_pandas(date_as_object=False)
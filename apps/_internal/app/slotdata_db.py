@@ -0,0 +1,178 @@
+"""
+全店舗の slotdata をまとめた SQLite データベース。
+
+オフライン整形（offline-scraing.py）が店舗CSVと同じ内容を取り込み、
+Web UI（app.py）からは CSV を読まずに条件検索できるようにする。
+主キーは店舗CSVと同じく (store, day, dai_name, dai_num)（台番号を読めず 0 になった台も残す）、
+検索用に dai_name と day にインデックスを張る。
+主キーが (store, day, dai_num) だった以前の表は作り直し、各店舗は次回の整形時に CSV から取り込み直す。
+"""
+
+import os
+import sqlite3
+from pathlib import Path
+
+COLUMNS = ["store", "day", "dai_name", "dai_num", "game", "difference", "bb", "rb", "total", "big_per", "reg_per"]
+FRAME_COLUMNS = COLUMNS[1:]
+DEFAULT_QUERY_LIMIT = 500
+MAX_QUERY_LIMIT = 5000
+# 表の定義を変えた場合に上げる（PRAGMA user_version と整形状態の "database" に記録）
+SCHEMA_VERSION = 2
+
+_SCHEMA = [
+    """
+CREATE TABLE IF NOT EXISTS slotdata (
+    store TEXT NOT NULL,
+    day TEXT NOT NULL,
+    dai_name TEXT NOT NULL,
+    dai_num INTEGER NOT NULL,
+    game INTEGER NOT NULL,
+    difference INTEGER NOT NULL,
+    bb INTEGER NOT NULL,
+    rb INTEGER NOT NULL,
+    total REAL NOT NULL,
+    big_per REAL NOT NULL,
+    reg_per REAL NOT NULL,
+    PRIMARY KEY (store, day, dai_name, dai_num)
+) WITHOUT ROWID
+""",
+    "CREATE INDEX IF NOT EXISTS idx_slotdata_dai_name ON slotdata (dai_name)",
+    "CREATE INDEX IF NOT EXISTS idx_slotdata_day ON slotdata (day)",
+]
+
+_KEY_COLUMNS = ("store", "day", "dai_name", "dai_num")
+_UPSERT = f"""
+INSERT INTO slotdata ({", ".join(COLUMNS)})
+VALUES ({", ".join("?" for _ in COLUMNS)})
+ON CONFLICT ({", ".join(_KEY_COLUMNS)}) DO UPDATE SET
+    {", ".join(f"{col} = excluded.{col}" for col in COLUMNS if col not in _KEY_COLUMNS)}
+"""
+
+
+def connect(db_path):
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    # 並列整形時は複数プロセスが書き込むため、ロック待ちを長めに取る
+    conn = sqlite3.connect(db_path, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # 並列整形の各プロセスが同時に作り直さないよう、確認から作り直しまでを1つのトランザクションで行う
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS slotdata")
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        conn.close()
+        raise
+    return conn
+
+
+def is_current(state, db_path):
+    """DB がこの店舗の現在のCSVと同じ内容まで反映済みかどうか。"""
+    synced = state.get("database") or {}
+    output_state = state.get("output") or {}
+    return (
+        os.path.exists(db_path)
+        and synced.get("path") == os.path.abspath(db_path)
+        and synced.get("schema") == SCHEMA_VERSION
+        and synced.get("size") == output_state.get("size")
+        and synced.get("mtime_ns") == output_state.get("mtime_ns")
+    )
+
+
+def _frame_rows(store, frame):
+    values = frame[FRAME_COLUMNS].itertuples(index=False, name=None)
+    return [
+        (store, day, str(dai_name), int(dai_num), int(game), int(diff), int(bb), int(rb), float(total), float(big), float(reg))
+        for day, dai_name, dai_num, game, diff, bb, rb, total, big, reg in values
+    ]
+
+
+def sync_store(db_path, store, output_path, state, frame=None):
+    """
+    店舗の行を DB へ反映する。
+    frame を渡した場合はその日付の行を置き換え、None の場合は CSV 全体から店舗の行を作り直す。
+    """
+    full = frame is None
+    if full:
+        from slotdata_writer import load_existing_output
+
+        frame, _, _ = load_existing_output(output_path)
+        if frame.empty:
+            return False
+        frame = frame.dropna(subset=["day"]).assign(day=lambda df: df["day"].dt.strftime("%Y-%m-%d"))
+        frame = frame.fillna(0)
+
+    rows = _frame_rows(store, frame)
+    conn = connect(db_path)
+    try:
+        with conn:
+            if full:
+                conn.execute("DELETE FROM slotdata WHERE store = ?", (store,))
+            else:
+                # 取り直した日付は消えた台が残らないよう日付ごと置き換える
+                conn.executemany(
+                    "DELETE FROM slotdata WHERE store = ? AND day = ?",
+                    [(store, day) for day in sorted({row[1] for row in rows})],
+                )
+            conn.executemany(_UPSERT, rows)
+    finally:
+        conn.close()
+
+    output_state = state.get("output") or {}
+    state["database"] = {
+        "path": os.path.abspath(db_path),
+        "schema": SCHEMA_VERSION,
+        "size": output_state.get("size"),
+        "mtime_ns": output_state.get("mtime_ns"),
+    }
+    return True
+
+
+def query_rows(db_path, stores=None, dai_name=None, keyword=None, day_from=None, day_to=None,
+               min_difference=None, max_difference=None, limit=DEFAULT_QUERY_LIMIT, offset=0):
+    """条件に合う行を日付の新しい順に返す。戻り値は (行の dict のリスト, 該当件数)。"""
+    where = []
+    params = []
+    if stores:
+        where.append(f"store IN ({', '.join('?' for _ in stores)})")
+        params.extend(stores)
+    if dai_name:
+        where.append("dai_name = ?")
+        params.append(dai_name)
+    if keyword:
+        where.append("dai_name LIKE ? ESCAPE '\\'")
+        escaped = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        params.append(f"%{escaped}%")
+    if day_from:
+        where.append("day >= ?")
+        params.append(day_from)
+    if day_to:
+        where.append("day <= ?")
+        params.append(day_to)
+    if min_difference is not None:
+        where.append("difference >= ?")
+        params.append(min_difference)
+    if max_difference is not None:
+        where.append("difference <= ?")
+        params.append(max_difference)
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+    limit = max(1, min(int(limit), MAX_QUERY_LIMIT))
+    offset = max(0, int(offset))
+
+    conn = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True, timeout=10)
+    try:
+        conn.row_factory = sqlite3.Row
+        count = conn.execute(f"SELECT COUNT(*) FROM slotdata {where_sql}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM slotdata {where_sql} "
+            "ORDER BY day DESC, store, dai_num LIMIT ? OFFSET ?",
+            params + [limit, offset],
+        ).fetchall()
+    finally:
+        conn.close()
+    return [dict(row) for row in rows], count
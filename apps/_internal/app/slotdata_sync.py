@@ -0,0 +1,121 @@
+"""
+解析した日付の行を店舗CSV（と列指向ファイル・DB・取得状況の索引）へ反映する。
+
+オフライン整形（offline-scraing.py）と、スクレイパーのインライン整形
+（anasuro_selective.py の --inline-format）で共通に使う。
+両者は別プロセスで同時に動くことがあるため、店舗CSVと状態ファイルの読み込みから書き換えまでは
+状態ファイルの隣のロック用ファイル（<状態ファイル>.lock）で店舗ごとに排他する。
+"""
+
+import contextlib
+import os
+import re
+import threading
+
+import file_lock
+import html_archive
+import slotdata_columnar
+import slotdata_db
+import store_coverage
+from format_manifest import record_file
+from slotdata import append_rows, build_frame, new_raw_columns, raw_row_count
+from slotdata_writer import load_state, resolve_latest_day, save_state, state_path_for, write_store_frame
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+INTERNAL_ROOT = os.path.dirname(APP_DIR)
+PROJECT_ROOT = os.path.dirname(INTERNAL_ROOT)
+RUNTIME_DIR = os.path.join(INTERNAL_ROOT, "runtime")
+EXCEL_OUTPUT_DIR = os.getenv("EXCEL_OUTPUT_DIR", os.path.join(PROJECT_ROOT, "output"))
+FORMAT_STATE_DIR = os.getenv("FORMAT_STATE_DIR", os.path.join(RUNTIME_DIR, "format_state"))
+# CSV に加えて書き出す列指向形式（off / parquet / feather、要 pyarrow）
+OFFLINE_COLUMNAR_FORMAT = os.getenv("OFFLINE_COLUMNAR_FORMAT", "off")
+# 全店舗をまとめた SQLite DB への取り込み（app.py の検索APIが参照する）
+OFFLINE_DB_ENABLED = os.getenv("OFFLINE_DB_ENABLED", "0") == "1"
+SLOTDATA_DB_PATH = os.getenv("SLOTDATA_DB_PATH", os.path.join(EXCEL_OUTPUT_DIR, "slotdata.db"))
+# 店舗ごとの取得・整形状況の索引（store_coverage）。取り込んだ日付と行数を記録する
+STORE_COVERAGE_PATH = os.getenv("STORE_COVERAGE_PATH", os.path.join(RUNTIME_DIR, "coverage.db"))
+
+# 同じプロセス内（スクレイパーの並行実行）で同じ店舗CSVを同時に書き換えないようにする
+_OUTPUT_LOCKS = {}
+_OUTPUT_LOCKS_LOCK = threading.Lock()
+
+
+def output_path_for(store_name):
+    safe_store_name = re.sub(r'[\\/*?:"<>|]', "", store_name)
+    return os.path.join(EXCEL_OUTPUT_DIR, f"{safe_store_name}-slotdata.csv")
+
+
+@contextlib.contextmanager
+def store_lock(output_path):
+    """店舗CSVと状態ファイルの書き換えをスレッド・プロセスをまたいで排他し、状態ファイルのパスを返す。"""
+    with _OUTPUT_LOCKS_LOCK:
+        lock = _OUTPUT_LOCKS.setdefault(output_path, threading.Lock())
+    state_path = state_path_for(FORMAT_STATE_DIR, output_path)
+    with lock, file_lock.locked(f"{state_path}.lock"):
+        yield state_path
+
+
+def commit_store(store_name, output_path, columns, parsed_files, columnar_format, db_path):
+    """
+    ロックを取って状態ファイルを読み直し、解析結果を finish_store で反映して保存する。書き出した場合は True。
+    解析中にほかのプロセスが同じ店舗へ書き込んでいても、その結果を上書きしない。
+    """
+    with store_lock(output_path) as state_path:
+        state = load_state(state_path)
+        resolve_latest_day(output_path, state)
+        os.makedirs(EXCEL_OUTPUT_DIR, exist_ok=True)
+        written = finish_store(store_name, output_path, columns, parsed_files, state, columnar_format, db_path)
+        save_state(state_path, state)
+    return written
+
+
+def finish_store(store_name, output_path, columns, parsed_files, state, columnar_format, db_path):
+    """
+    解析結果を CSV（と列指向ファイル・DB）へ反映し、マニフェストを更新する。書き出した場合は True。
+    db_path が None の場合は DB へ取り込まない。
+    """
+    columnar_current = slotdata_columnar.is_current(state, columnar_format)
+    db_current = db_path is not None and slotdata_db.is_current(state, db_path)
+    frame = build_frame(columns) if raw_row_count(columns) else None
+    written = frame is not None and write_store_frame(output_path, frame, state)
+    # 列指向ファイル・DB が CSV に追いついていない場合は CSV 全体から作り直す
+    if columnar_format != "off" and (written or not columnar_current):
+        slotdata_columnar.sync_store(output_path, columnar_format, state, frame if columnar_current else None)
+    if db_path is not None and (written or not db_current):
+        slotdata_db.sync_store(db_path, store_name, output_path, state, frame if db_current else None)
+    for file, entry, row_count in parsed_files:
+        record_file(state, file, entry, row_count)
+    record_coverage(store_name, parsed_files, state)
+    return written
+
+
+def record_coverage(store_name, parsed_files, state):
+    """
+    取り込んだ日付と行数を索引へ記録する。
+    索引にまだ整形済みの日付がない店舗（索引を消した場合を含む）はマニフェストの全日付を記録する。
+    """
+    if store_coverage.has_formatted(STORE_COVERAGE_PATH, store_name):
+        files = [(file, row_count) for file, _, row_count in parsed_files]
+    else:
+        files = [(file, entry.get("rows")) for file, entry in state.get("files", {}).items()]
+    results = []
+    for file, row_count in files:
+        m = html_archive.DAY_PATTERN.search(file)
+        if m:
+            results.append((m.group(0), row_count))
+    if results:
+        store_coverage.record_formatted(STORE_COVERAGE_PATH, store_name, results)
+
+
+def write_days(store_name, days, columnar_format=OFFLINE_COLUMNAR_FORMAT, db_path=None):
+    """
+    日付ごとの行 [(日付, 行のセル文字列リストの list, マニフェストのエントリ), ...] を店舗CSVへ反映する。
+    エントリは保存したHTMLのサイズ・ハッシュで、後のオフライン整形はそのHTMLを取り込み済みとして読み飛ばす
+    （HTMLを保存していない場合は None）。書き出した場合は True。
+    """
+    columns = new_raw_columns()
+    parsed_files = []
+    for day, rows, entry in sorted(days, key=lambda d: d[0]):
+        row_count = append_rows(columns, rows, day)
+        parsed_files.append((f"{day}.html", entry or {}, row_count))
+    return commit_store(store_name, output_path_for(store_name), columns, parsed_files, columnar_format, db_path)
@@ -0,0 +1,173 @@
+"""
+店舗ごとの slotdata CSV への書き出し。
+
+店舗ごとの状態ファイル（最新日・CSVのサイズと更新時刻）を持ち、
+新しい日付の行だけを CSV 末尾へ追記する。次の場合のみ従来どおり
+既存CSVを読み込んでマージし、全体を書き直す。
+
+- 状態ファイルがない、または CSV が外部で変更されている
+- 追記する日付が最新日以前（取り直し・重複）。その日付の既存行は新しい行で置き換える
+- ヘッダが現行の列構成と異なる（`Total` -> `total` の移行を含む）
+"""
+
+import json
+import os
+
+import pandas as pd
+
+from slotdata import OUTPUT_COLUMNS
+
+KEY_COLUMNS = ["day", "dai_name", "dai_num"]
+RATE_COLUMNS = ["total", "big_per", "reg_per"]
+
+
+def state_path_for(state_dir, output_path):
+    name = os.path.splitext(os.path.basename(output_path))[0]
+    return os.path.join(state_dir, f"{name}.json")
+
+
+def load_state(state_path):
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except Exception:
+        return {}
+
+
+def save_state(state_path, state):
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, state_path)
+
+
+def load_existing_output(output_path):
+    """既存CSVを読み込み、(DataFrame, 取得済み日付集合, 最新日) を返す。"""
+    latest_day = None
+    existing_days = set()
+    if not os.path.exists(output_path):
+        return pd.DataFrame(), existing_days, latest_day
+
+    try:
+        existing_df = pd.read_csv(output_path)
+        if "Total" in existing_df.columns and "total" not in existing_df.columns:
+            existing_df = existing_df.rename(columns={"Total": "total"})
+        if "day" in existing_df.columns:
+            existing_df["day"] = pd.to_datetime(existing_df["day"], errors="coerce")
+            existing_days = set(existing_df["day"].dt.strftime("%Y-%m-%d").dropna())
+            latest_day = existing_df["day"].max()
+        else:
+            existing_df = pd.DataFrame()
+            latest_day = None
+            existing_days = set()
+    except Exception:
+        existing_df = pd.DataFrame()
+    return existing_df, existing_days, latest_day
+
+
+def _file_signature(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _output_state_is_current(output_path, output_state):
+    if not output_state or not os.path.exists(output_path):
+        return False
+    sig = _file_signature(output_path)
+    return sig["size"] == output_state.get("size") and sig["mtime_ns"] == output_state.get("mtime_ns")
+
+
+def _record_output(state, output_path, latest_day):
+    state["output"] = {"latest_day": latest_day, **_file_signature(output_path)}
+
+
+def _read_header(output_path):
+    with open(output_path, "r", encoding="utf-8-sig") as f:
+        return f.readline().rstrip("\r\n").split(",")
+
+
+def resolve_latest_day(output_path, state):
+    """
+    CSVに記録済みの最新日（YYYY-MM-DD）を返す。
+    状態ファイルが CSV と一致していればそれを使い、一致しない場合のみ CSV を読み直して状態を作り直す。
+    """
+    if not os.path.exists(output_path):
+        state.pop("output", None)
+        return None
+
+    output_state = state.get("output")
+    if _output_state_is_current(output_path, output_state):
+        return output_state.get("latest_day")
+
+    _, _, latest_day = load_existing_output(output_path)
+    latest_text = None if latest_day is None or pd.isna(latest_day) else latest_day.strftime("%Y-%m-%d")
+    _record_output(state, output_path, latest_text)
+    return latest_text
+
+
+def _rewrite(output_path, frame):
+    existing_df, _, _ = load_existing_output(output_path)
+    df_result = frame
+
+    if not existing_df.empty:
+        late = False
+        if "day" in existing_df.columns:
+            new_days = pd.to_datetime(frame["day"], errors="coerce")
+            late = bool(new_days.min() <= existing_df["day"].max())
+            existing_df = existing_df[~existing_df["day"].isin(new_days.unique())]
+        df_result = pd.concat([existing_df, df_result], ignore_index=True)
+        if "day" in df_result.columns:
+            df_result["day"] = pd.to_datetime(df_result["day"], errors="coerce")
+        df_result = df_result.drop_duplicates(subset=KEY_COLUMNS, keep="last").reset_index(drop=True)
+        if late:
+            # 取り直し・抜けの補完で入った日付の行を日付順の位置へ戻す
+            df_result = df_result.sort_values("day", kind="mergesort").reset_index(drop=True)
+    else:
+        if "day" in df_result.columns:
+            df_result["day"] = pd.to_datetime(df_result["day"], errors="coerce")
+
+    if "day" in df_result.columns:
+        df_result["day"] = df_result["day"].dt.strftime("%Y-%m-%d")
+
+    df_result.to_csv(output_path, index=False, encoding="utf-8-sig")
+    days = df_result["day"].dropna() if "day" in df_result.columns else pd.Series(dtype="object")
+    return days.max() if not days.empty else None
+
+
+def _append(output_path, frame):
+    frame = frame.drop_duplicates(subset=KEY_COLUMNS, keep="last").copy()
+    # 既存行と同じ表記（0.0 など）になるよう確率列は常に小数で書く
+    for col in RATE_COLUMNS:
+        frame[col] = frame[col].astype("float64")
+    # 先頭以外に BOM を書かないよう utf-8 で追記する
+    frame.to_csv(output_path, mode="a", header=False, index=False, encoding="utf-8")
+    return frame["day"].max()
+
+
+def write_store_frame(output_path, frame, state):
+    """
+    新規レコードを CSV へ反映し、状態を更新する。書き出した場合は True。
+    state は resolve_latest_day() を通したものを渡す。
+    """
+    if frame.empty:
+        return False
+
+    output_state = state.get("output") or {}
+    latest_day = output_state.get("latest_day")
+    can_append = (
+        latest_day is not None
+        and _output_state_is_current(output_path, output_state)
+        and _read_header(output_path) == OUTPUT_COLUMNS
+        and frame["day"].min() > latest_day
+    )
+
+    if can_append:
+        written_latest = _append(output_path, frame)
+        latest_day = max(latest_day, written_latest)
+    else:
+        latest_day = _rewrite(output_path, frame)
+
+    _record_output(state, output_path, latest_day)
+    return True
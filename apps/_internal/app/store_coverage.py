@@ -0,0 +1,211 @@
+"""
+店舗ごとの日付の取得・整形状況（カバレッジ）の索引（SQLite）。
+
+スクレイパー（anasuro_selective.py）が日付ごとの保存結果（失敗時は理由）を、
+オフライン整形（offline-scraing.py）が取り込んだ行数（表がない場合は理由）を記録する。
+スクレイパーの取得済み判定はこの索引を使い、店舗フォルダの一覧は初回（と再スキャン指定時）だけ読む。
+Web UI（app.py）は索引だけで未取得・未整形の日付を返す。
+"""
+
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS coverage (
+    store TEXT NOT NULL,
+    day TEXT NOT NULL,
+    scraped_at TEXT,
+    scrape_error TEXT,
+    formatted_at TEXT,
+    rows INTEGER,
+    format_error TEXT,
+    PRIMARY KEY (store, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage_stores (
+    store TEXT PRIMARY KEY,
+    scanned_at TEXT NOT NULL
+);
+"""
+
+NO_TABLE_ERROR = "表がない、または行がありません"
+
+
+def connect(db_path):
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    # スクレイパー・整形処理（並列時は複数プロセス）・Web UI から同時に使うため、ロック待ちを長めに取る
+    conn = sqlite3.connect(db_path, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def scraped_days(db_path, store):
+    """保存済みの日付の set を返す。店舗フォルダを一度も読み込んでいない店舗は None。"""
+    conn = connect(db_path)
+    try:
+        if conn.execute("SELECT 1 FROM coverage_stores WHERE store = ?", (store,)).fetchone() is None:
+            return None
+        rows = conn.execute(
+            "SELECT day FROM coverage WHERE store = ? AND scraped_at IS NOT NULL", (store,)
+        ).fetchall()
+    finally:
+        conn.close()
+    return {day for (day,) in rows}
+
+
+def reconcile_scraped(db_path, store, days):
+    """店舗フォルダにある日付（days）で保存済みの記録を置き換え、読み込み済みとして記録する。"""
+    now = datetime.now().isoformat()
+    conn = connect(db_path)
+    try:
+        with conn:
+            recorded = {
+                day for (day,) in conn.execute(
+                    "SELECT day FROM coverage WHERE store = ? AND scraped_at IS NOT NULL", (store,)
+                )
+            }
+            conn.executemany(
+                "UPDATE coverage SET scraped_at = NULL WHERE store = ? AND day = ?",
+                [(store, day) for day in recorded - set(days)],
+            )
+            conn.executemany(
+                """
+                INSERT INTO coverage (store, day, scraped_at) VALUES (?, ?, ?)
+                ON CONFLICT (store, day) DO UPDATE SET
+                    scraped_at = COALESCE(coverage.scraped_at, excluded.scraped_at),
+                    scrape_error = NULL
+                """,
+                [(store, day, now) for day in days],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO coverage_stores (store, scanned_at) VALUES (?, ?)", (store, now)
+            )
+    finally:
+        conn.close()
+
+
+def request_rescan(db_path, stores):
+    """次回のスクレイピングで店舗フォルダを読み直すようにする（手作業でファイルを消した場合など）。"""
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.executemany("DELETE FROM coverage_stores WHERE store = ?", [(s,) for s in stores])
+    finally:
+        conn.close()
+
+
+def record_scraped(db_path, store, day, error=None):
+    """日付の取得結果を記録する。error を渡した場合は失敗として理由だけを記録する。"""
+    now = datetime.now().isoformat()
+    conn = connect(db_path)
+    try:
+        with conn:
+            if error is None:
+                conn.execute(
+                    """
+                    INSERT INTO coverage (store, day, scraped_at) VALUES (?, ?, ?)
+                    ON CONFLICT (store, day) DO UPDATE SET scraped_at = excluded.scraped_at, scrape_error = NULL
+                    """,
+                    (store, day, now),
+                )
+            else:
+                conn.execute(
+                    """
+                    INSERT INTO coverage (store, day, scrape_error) VALUES (?, ?, ?)
+                    ON CONFLICT (store, day) DO UPDATE SET scrape_error = excluded.scrape_error
+                    """,
+                    (store, day, str(error)),
+                )
+    finally:
+        conn.close()
+
+
+def has_formatted(db_path, store):
+    conn = connect(db_path)
+    try:
+        return conn.execute(
+            "SELECT 1 FROM coverage WHERE store = ? AND formatted_at IS NOT NULL LIMIT 1", (store,)
+        ).fetchone() is not None
+    finally:
+        conn.close()
+
+
+def record_formatted(db_path, store, results):
+    """
+    整形結果 [(日付, 行数), ...] を記録する。行数が 0 の日付は表がなかったものとして理由を記録する。
+    行数が不明（None）の日付は取り込み済みとしてのみ記録する。
+    """
+    now = datetime.now().isoformat()
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.executemany(
+                """
+                INSERT INTO coverage (store, day, scraped_at, formatted_at, rows, format_error)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (store, day) DO UPDATE SET
+                    scraped_at = COALESCE(coverage.scraped_at, excluded.scraped_at),
+                    formatted_at = excluded.formatted_at,
+                    rows = excluded.rows,
+                    format_error = excluded.format_error
+                """,
+                [
+                    (store, day, now, now, rows, NO_TABLE_ERROR if rows == 0 else None)
+                    for day, rows in results
+                ],
+            )
+    finally:
+        conn.close()
+
+
+def _days_between(day_from, day_to):
+    current = date.fromisoformat(day_from)
+    end = date.fromisoformat(day_to)
+    while current <= end:
+        yield current.isoformat()
+        current += timedelta(days=1)
+
+
+def store_gaps(db_path, stores, day_from=None, day_to=None):
+    """
+    店舗ごとの day_from〜day_to の取得・整形状況と、抜けている日付を返す。
+    day_from の既定は店舗の最初の保存済みの日、day_to の既定は前日。
+    """
+    day_to = day_to or (date.today() - timedelta(days=1)).isoformat()
+    conn = connect(db_path)
+    try:
+        scanned = {store for (store,) in conn.execute("SELECT store FROM coverage_stores")}
+        result = []
+        for store in stores:
+            first_day = conn.execute(
+                "SELECT MIN(day) FROM coverage WHERE store = ? AND scraped_at IS NOT NULL", (store,)
+            ).fetchone()[0]
+            start = day_from or first_day
+            rows = conn.execute(
+                """
+                SELECT day, scraped_at, scrape_error, formatted_at, rows, format_error
+                FROM coverage WHERE store = ? AND day >= ? AND day <= ? ORDER BY day
+                """,
+                (store, start or "", day_to),
+            ).fetchall()
+            by_day = {row[0]: row for row in rows}
+            missing = []
+            for day in _days_between(start, day_to) if start else []:
+                row = by_day.get(day)
+                if row is None or not row[1]:
+                    missing.append({"day": day, "reason": row[2] if row else None})
+            result.append({
+                "store": store,
+                "first_day": first_day,
+                "scanned": store in scanned,
+                "scraped_days": sum(1 for row in rows if row[1]),
+                "formatted_days": sum(1 for row in rows if row[3]),
+                "rows": sum(row[4] or 0 for row in rows),
+                "missing": missing,
+                "unformatted": [row[0] for row in rows if row[1] and not row[3]],
+                "format_errors": [{"day": row[0], "reason": row[5]} for row in rows if row[5]],
+            })
+    finally:
+        conn.close()
+    return result
@@ -0,0 +1,177 @@
+"""
+店舗リスト（store_list.csv）の読み書き。
+
+StoreListRepository はファイルを1回だけ解析し、正規化した店舗（name / url / directory）を
+ファイルの更新時刻とサイズをキーにしてメモリに保持する。ファイルが外部で変更された場合のみ
+読み直すため、/api/stores や /api/scrape は毎回 CSV を解析しない。
+書き込みは一時ファイルへ書いてから置き換えるため、読み込み側が書きかけの CSV を読むことはない。
+"""
+
+import csv
+import io
+import os
+import threading
+import time
+
+STORE_COLUMNS = ["store_name", "store_url", "data_directory"]
+# utf-8-sig は BOM なしの UTF-8 も読める
+ENCODINGS = ("utf-8-sig", "cp932")
+
+
+def normalize_directory(value):
+    path_text = str(value or "").strip().strip('"')
+    if not path_text:
+        return ""
+
+    normalized = path_text.replace("/", "\\")
+    if os.name == "nt":
+        had_dot_prefix = normalized.startswith(".\\")
+        try:
+            normalized = os.path.normpath(normalized)
+        except Exception:
+            pass
+        if had_dot_prefix and not os.path.isabs(normalized) and normalized not in (".", ".\\"):
+            normalized = ".\\" + normalized.lstrip("\\")
+
+    if normalized == ".":
+        return ".\\"
+    return normalized
+
+
+def _read_rows(path):
+    """(列名の list, 行の dict の list) を返す。値はすべて文字列（空欄は空文字）。"""
+    with open(path, "rb") as f:
+        data = f.read()
+    for enc in ENCODINGS:
+        try:
+            text = data.decode(enc)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise RuntimeError("store_list.csv の読み込みに失敗しました（encoding不一致）")
+
+    reader = csv.DictReader(io.StringIO(text, newline=""), restval="")
+    fieldnames = list(reader.fieldnames or [])
+    rows = []
+    for row in reader:
+        # 列数が多い行の余りの値（キー None）は捨てる
+        row.pop(None, None)
+        if any(value.strip() for value in row.values()):
+            rows.append(row)
+    return fieldnames, rows
+
+
+def _to_store(index, row):
+    return {
+        "name": str(row.get("store_name") or row.get("name") or f"店舗{index}"),
+        "url": str(row.get("store_url") or row.get("url") or ""),
+        "directory": normalize_directory(row.get("data_directory") or row.get("directory") or ""),
+    }
+
+
+def write_rows(path, fieldnames, rows):
+    """一時ファイルへ書いてから置き換える。"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore", lineterminator=os.linesep)
+        writer.writeheader()
+        writer.writerows(rows)
+    for attempt in range(5):
+        try:
+            os.replace(tmp_path, path)
+            return
+        except PermissionError:
+            # Windows で他のプロセス（Excel など）が開いている間は置き換えられないため少し待つ
+            if attempt == 4:
+                raise
+            time.sleep(0.2)
+
+
+def write_stores(path, stores):
+    """正規化済みの店舗（name / url / directory）を store_list.csv と同じ列構成で書き出す。"""
+    write_rows(path, STORE_COLUMNS, [
+        {"store_name": s["name"], "store_url": s["url"], "data_directory": s["directory"]}
+        for s in stores
+    ])
+
+
+class StoreListRepository:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._key = None
+        self._fieldnames = []
+        self._rows = []
+        self._stores = []
+
+    def _file_key(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _refresh(self):
+        key = self._file_key()
+        if key is not None and key == self._key:
+            return
+        fieldnames, rows = _read_rows(self.path) if key is not None else ([], [])
+        self._set(key, fieldnames, rows)
+
+    def _set(self, key, fieldnames, rows):
+        self._key = key
+        self._fieldnames = fieldnames
+        self._rows = rows
+        self._stores = [_to_store(i, row) for i, row in enumerate(rows, start=1)]
+
+    def _write(self, fieldnames, rows):
+        write_rows(self.path, fieldnames, rows)
+        self._set(self._file_key(), fieldnames, rows)
+
+    def stores(self):
+        """正規化した店舗の list。各 dict はキャッシュと共有しているため変更しないこと。"""
+        with self.lock:
+            self._refresh()
+            return list(self._stores)
+
+    def save(self, stores):
+        """
+        ブラウザ編集結果で store_list.csv を置き換える。
+        stores: [{"name": "...", "url": "...", "directory": "..."}, ...]
+        """
+        rows = []
+        for i, s in enumerate(stores, start=1):
+            name = str((s.get("name") or "").strip())
+            rows.append({
+                "store_name": name or f"店舗{i}",
+                "store_url": str((s.get("url") or "").strip()),
+                "data_directory": normalize_directory(s.get("directory")),
+            })
+        with self.lock:
+            self._write(STORE_COLUMNS, rows)
+
+    def reorder(self, order):
+        """
+        data_directory の並び（order）に合わせて行を並べ替え、並べ替えた件数を返す。
+        order にない行は元の順で後ろに残し、CSV のその他の列はそのまま保持する。
+        """
+        with self.lock:
+            self._refresh()
+            fieldnames = self._fieldnames
+            col = "data_directory" if "data_directory" in fieldnames else ("directory" if "directory" in fieldnames else None)
+            if col is None:
+                raise KeyError("CSVに data_directory 列がありません")
+
+            dir_to_index = {normalize_directory(row[col]): idx for idx, row in enumerate(self._rows)}
+            ordered_indices = []
+            for d in order:
+                idx = dir_to_index.get(normalize_directory(d))
+                if idx is not None and idx not in ordered_indices:
+                    ordered_indices.append(idx)
+            ordered = set(ordered_indices)
+            remaining_indices = [idx for idx in range(len(self._rows)) if idx not in ordered]
+            rows = [self._rows[idx] for idx in ordered_indices + remaining_indices]
+            self._write(fieldnames, rows)
+            return len(ordered_indices)
@@ -0,0 +1,63 @@
+"""
+保存済みHTMLから all_data_table（台別データ表）の行を取り出す。
+
+既定は lxml のパーサを直接使う高速経路。比較・切り分け用に従来の
+BeautifulSoup 経路も残しており、どちらもセル文字列のリストを同じ形で返す。
+読み込み元はファイルパスのほか、圧縮アーカイブから展開したバイト列のファイルオブジェクトも渡せる。
+"""
+
+from lxml import etree
+
+TABLE_ID = "all_data_table"
+ENGINES = ("lxml", "bs4")
+DEFAULT_ENGINE = "lxml"
+
+_TABLE_XPATH = etree.XPath(f'//table[@id="{TABLE_ID}"]')
+
+
+def _cell_text(cell):
+    # BeautifulSoup の get_text(strip=True) と同じく、テキスト片ごとに strip して連結する
+    return "".join(text.strip() for text in cell.itertext())
+
+
+def _iter_rows_lxml(file_path):
+    parser = etree.HTMLParser(encoding="utf-8")
+    root = etree.parse(file_path, parser).getroot()
+    tables = _TABLE_XPATH(root) if root is not None else []
+    if not tables:
+        return None
+
+    def rows():
+        for i, tr in enumerate(tables[0].iter("tr")):
+            if i == 0:
+                continue
+            yield [_cell_text(td) for td in tr.iter("td")]
+
+    return rows()
+
+
+def _iter_rows_bs4(file_path):
+    from bs4 import BeautifulSoup
+
+    if isinstance(file_path, str):
+        with open(file_path, "r", encoding="utf-8") as f:
+            soup = BeautifulSoup(f, "lxml")
+    else:
+        soup = BeautifulSoup(file_path.read().decode("utf-8"), "lxml")
+
+    table = soup.find("table", {"id": TABLE_ID})
+    if not table:
+        return None
+    return ([col.get_text(strip=True) for col in row.find_all("td")] for row in table.find_all("tr")[1:])
+
+
+def iter_table_rows(file_path, engine=DEFAULT_ENGINE):
+    """
+    ヘッダ行を除いた各行のセル文字列リストを順に返すイテレータ。
+    表が存在しない場合は None を返す。
+    """
+    if engine == "lxml":
+        return _iter_rows_lxml(file_path)
+    if engine == "bs4":
+        return _iter_rows_bs4(file_path)
+    raise ValueError(f"未対応の抽出エンジンです: {engine}")
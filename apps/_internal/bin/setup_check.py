@@ -29,6 +29,7 @@ def check_packages():
         'undetected_chromedriver': 'undetected-chromedriver',
         'tqdm': 'tqdm',
         'lxml': 'lxml',
+        'requests': 'requests',
     }
     missing = []
     for import_name, package_name in required_packages.items():
@@ -0,0 +1,160 @@
+"""
+Web サーバー（app.py）の起動時間とメモリ使用量の計測。
+
+app.py を読み込むだけの子プロセスを繰り返し起動し、次の値を出力する。
+
+- import: app.py の読み込み時間（Flask などの依存モジュールを含む）
+- first /api/stores: 起動後最初の /api/stores（store_list.csv の解析を含む）
+- process: 子プロセスの起動から終了までの時間（Python 自体の起動を含む）
+- RSS: 読み込み後のメモリ使用量（psutil があれば現在値、なければ最大値）
+
+--baseline-rev を指定すると、その git リビジョンの _internal/app を一時フォルダへ取り出して
+同じ計測を行い、現在の作業ツリーと並べて表示する（例: --baseline-rev HEAD~1）。
+
+使い方（apps フォルダで実行）:
+    python _internal/devtools/bench/bench_app_startup.py --runs 10 --baseline-rev HEAD~1
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+APP_RELATIVE_DIR = Path("_internal") / "app"
+
+CHILD_SCRIPT = r"""
+import importlib.util
+import json
+import sys
+import time
+
+t0 = time.perf_counter()
+spec = importlib.util.spec_from_file_location("slot_app", sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+import_ms = (time.perf_counter() - t0) * 1000
+
+client = module.app.test_client()
+t1 = time.perf_counter()
+res = client.get("/api/stores")
+first_ms = (time.perf_counter() - t1) * 1000
+
+rss_mb = None
+try:
+    import psutil
+    rss_mb = psutil.Process().memory_info().rss / (1024 * 1024)
+except ImportError:
+    try:
+        import resource
+        # Linux は KB 単位、macOS はバイト単位
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    except ImportError:
+        pass
+
+print(json.dumps({
+    "import_ms": import_ms,
+    "first_ms": first_ms,
+    "rss_mb": rss_mb,
+    "stores": len(res.get_json() or []),
+    "pandas": "pandas" in sys.modules,
+}))
+"""
+
+
+def export_revision(rev, dest):
+    """git リビジョン rev の _internal/app を dest へ取り出す。"""
+    prefix = subprocess.run(
+        ["git", "rev-parse", "--show-prefix"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+    ).stdout.strip()
+    names = subprocess.run(
+        ["git", "ls-tree", "-r", "--name-only", "--full-name", rev, "--", APP_RELATIVE_DIR.as_posix()],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+    ).stdout.splitlines()
+    for name in names:
+        data = subprocess.run(
+            ["git", "show", f"{rev}:{name}"],
+            cwd=PROJECT_ROOT, capture_output=True, check=True,
+        ).stdout
+        target = dest / Path(name).relative_to(prefix)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+    if not names:
+        raise RuntimeError(f"{rev} に {APP_RELATIVE_DIR.as_posix()} がありません")
+    shutil.copy2(PROJECT_ROOT / "store_list.csv", dest / "store_list.csv")
+
+
+def measure(root, runs, work_dir):
+    """root 配下の app.py を runs 回起動し、計測値の list を返す。"""
+    env = dict(os.environ)
+    # 実行中のサーバーのジョブ履歴・ログに触れないよう一時フォルダを使う
+    env.update({
+        "JOB_STORE_PATH": str(work_dir / "jobs.db"),
+        "LOG_FILE": str(work_dir / "scraping_log.json"),
+        "COMPLETED_STORES_PATH": str(work_dir / "completed_stores.json"),
+        "JOB_STORE_LIST_DIR": str(work_dir / "job_store_lists"),
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    app_path = root / APP_RELATIVE_DIR / "app.py"
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", CHILD_SCRIPT, str(app_path)],
+            cwd=root, env=env, capture_output=True, text=True, encoding="utf-8",
+        )
+        process_ms = (time.perf_counter() - t0) * 1000
+        if result.returncode != 0:
+            raise RuntimeError(f"app.py の起動に失敗しました: {root}\n{result.stderr[-2000:]}")
+        sample = json.loads(result.stdout.strip().splitlines()[-1])
+        sample["process_ms"] = process_ms
+        samples.append(sample)
+    return samples
+
+
+def summarize(label, samples):
+    def med(key):
+        values = [s[key] for s in samples if s.get(key) is not None]
+        return statistics.median(values) if values else float("nan")
+
+    return (
+        f"{label:<12} import {med('import_ms'):8.1f} ms | first /api/stores {med('first_ms'):6.1f} ms | "
+        f"process {med('process_ms'):8.1f} ms | RSS {med('rss_mb'):6.1f} MB | "
+        f"pandas {'yes' if samples[0]['pandas'] else 'no'} | stores {samples[0]['stores']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="app.py の起動時間・メモリ使用量を計測")
+    parser.add_argument("--runs", type=int, default=5, help="計測回数（中央値を表示）")
+    parser.add_argument("--baseline-rev", type=str, help="比較する git リビジョン（例: HEAD~1）")
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="slot-bench-"))
+    try:
+        # 1回目はバイトコード生成・ディスクキャッシュの影響が大きいため捨てる
+        lines = []
+        if args.baseline_rev:
+            baseline_root = work_dir / "baseline"
+            export_revision(args.baseline_rev, baseline_root)
+            measure(baseline_root, 1, work_dir)
+            lines.append(summarize(args.baseline_rev, measure(baseline_root, args.runs, work_dir)))
+        measure(PROJECT_ROOT, 1, work_dir)
+        lines.append(summarize("current", measure(PROJECT_ROOT, args.runs, work_dir)))
+        print(f"[計測] app.py 起動（{args.runs} 回の中央値）")
+        for line in lines:
+            print(line)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
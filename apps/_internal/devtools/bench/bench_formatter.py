@@ -0,0 +1,406 @@
+"""
+オフライン整形（offline-scraing.py）の処理性能の計測。
+
+実際の保存HTMLと同じ構造の all_data_table を、店舗数 × 日数 × 台数を指定して一時フォルダへ生成し、
+次の値を JSON で出力する。
+
+- end_to_end: offline-scraing.py を子プロセスで実行した時間・rows/sec・最大メモリ使用量
+  - full: 出力なしの状態からの全件整形
+  - noop: 変更なしで再実行（マニフェストによる読み飛ばし）
+  - incremental: 各店舗に1日ずつ追加して再実行（CSV への追記）
+- stages: 同じデータを段階ごとに処理した時間（このプロセス内で計測）
+  - listing: 日付HTMLの一覧取得 / manifest: マニフェスト照合（ハッシュ計算を含む）
+  - parsing: 表の解析 / normalization: 数値化・確率計算（build_frame）
+  - csv_write: 店舗CSVの新規書き出し / csv_append: 1日分の追記 / csv_merge: 過去日の置き換え（全体の書き直し）
+
+メモリ使用量は psutil があれば子プロセス（並列時のワーカーを含む）の合計を定期的に測った最大値、
+なければ計測ごとに間に挟んだプロセスから resource で取れる子プロセス単体の最大値
+（Windows で psutil がない場合は null）。
+--output で JSON を保存し、--compare で以前の JSON と比べた増減を表示する。
+
+使い方（apps フォルダで実行）:
+    python _internal/devtools/bench/bench_formatter.py --stores 5 --days 60 --machines 300 --output bench.json
+    python _internal/devtools/bench/bench_formatter.py --compare bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+APP_DIR = PROJECT_ROOT / "_internal" / "app"
+FIXTURE_DIR = PROJECT_ROOT / "data" / "test1"
+OFFLINE_SCRIPT_PATH = APP_DIR / "offline-scraing.py"
+RSS_SAMPLE_SECONDS = 0.05
+# psutil がない場合に offline-scraing.py を子プロセスとして実行し、実行時間と子プロセスの最大 RSS を書き出す。
+# getrusage(RUSAGE_CHILDREN) はそれまでに終了した全子プロセスの最大値のため、計測ごとにプロセスを分ける
+RUSAGE_WRAPPER = """
+import resource, subprocess, sys, time
+t0 = time.perf_counter()
+code = subprocess.call(sys.argv[2:])
+seconds = time.perf_counter() - t0
+with open(sys.argv[1], "w") as f:
+    f.write(f"{seconds} {resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss}")
+sys.exit(code)
+"""
+
+TABLE_HEADER = """<table class="fixed_get_medals_table" id="all_data_table">
+<thead>
+<tr>
+<th class="fixed01">機種名</th>
+<th>台番号</th>
+<th>G数</th>
+<th>差枚</th>
+<th>BB</th>
+<th>RB</th>
+<th>合成確率</th>
+<th>BB確率</th>
+<th>RB確率</th>
+</tr>
+</thead>
+<tbody>
+"""
+TABLE_ROW = """<tr>
+<td class="fixed01" style="font-size:14px;line-height:150%;">{name}</td>
+<td class="table_cells">{num}</td>
+<td class="table_cells">{game:,}</td>
+<td class="table_cells">{difference}</td>
+<td class="table_cells">{bb}</td>
+<td class="table_cells">{rb}</td>
+<td class="table_cells">{total}</td>
+<td class="table_cells">{big}</td>
+<td class="table_cells">{reg}</td>
+</tr>
+"""
+TABLE_FOOTER = """</tbody>
+</table>"""
+# data/test1 がない場合の機種名
+FALLBACK_MACHINE_NAMES = ["マイジャグラーV", "アイムジャグラーEX", "ファンキージャグラー2", "ハッピージャグラーVIII"]
+# 同じ機種が続けて並ぶ台数（実際の店舗の島に近づける）
+MACHINES_PER_NAME = 8
+
+
+def machine_names():
+    """data/test1 の保存HTMLに出てくる機種名を出現順で返す。"""
+    sys.path.insert(0, str(APP_DIR))
+    from table_extractor import iter_table_rows
+
+    names = {}
+    for path in sorted(FIXTURE_DIR.glob("*.html")):
+        for cells in iter_table_rows(str(path)) or []:
+            if cells:
+                names.setdefault(cells[0], None)
+    return list(names) or FALLBACK_MACHINE_NAMES
+
+
+def _rate(game, count):
+    return f"1/{game / count:.1f}" if count else "1/0.0"
+
+
+def render_day(rng, names, machines):
+    rows = []
+    for i in range(machines):
+        game = rng.randint(0, 9000)
+        bb = int(game / rng.uniform(150, 450))
+        rb = int(game / rng.uniform(200, 700))
+        difference = rng.randint(-4000, 5000) if game else 0
+        rows.append(TABLE_ROW.format(
+            name=names[(i // MACHINES_PER_NAME) % len(names)],
+            num=i + 1,
+            game=game,
+            difference=f"{difference:+,}" if difference else "0",
+            bb=bb,
+            rb=rb,
+            total=_rate(game, bb + rb),
+            big=_rate(game, bb),
+            reg=_rate(game, rb),
+        ))
+    return TABLE_HEADER + "".join(rows) + TABLE_FOOTER
+
+
+def generate_stores(work_dir, stores, days, machines, start_day, seed):
+    """店舗フォルダと店舗リストを生成し、[(店舗名, フォルダ), ...] を返す。"""
+    rng = random.Random(seed)
+    names = machine_names()
+    store_dirs = []
+    for store_no in range(1, stores + 1):
+        store_dir = work_dir / "data" / f"store{store_no:03d}"
+        store_dir.mkdir(parents=True)
+        for offset in range(days):
+            day = (start_day + timedelta(days=offset)).isoformat()
+            (store_dir / f"{day}.html").write_text(render_day(rng, names, machines), encoding="utf-8")
+        store_dirs.append((f"ベンチ店舗{store_no:03d}", store_dir))
+
+    with open(work_dir / "store_list.csv", "w", encoding="utf-8-sig", newline="") as f:
+        f.write("store_name,store_url,data_directory\n")
+        for store_name, store_dir in store_dirs:
+            f.write(f"{store_name},https://example.invalid/{store_dir.name},{store_dir}\n")
+    return store_dirs
+
+
+def add_day(store_dirs, day, machines, seed):
+    rng = random.Random(seed)
+    names = machine_names()
+    for _, store_dir in store_dirs:
+        (store_dir / f"{day.isoformat()}.html").write_text(render_day(rng, names, machines), encoding="utf-8")
+
+
+def _tree_rss(proc):
+    try:
+        procs = [proc] + proc.children(recursive=True)
+    except psutil.Error:
+        return 0
+    total = 0
+    for p in procs:
+        try:
+            total += p.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+
+def run_with_peak_rss(cmd, env, log_path):
+    """cmd を実行し (秒, 最大メモリ使用量MB) を返す。"""
+    if psutil is None:
+        return _run_with_rusage(cmd, env, log_path)
+    with open(log_path, "ab") as log:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(cmd, env=env, cwd=PROJECT_ROOT, stdout=log, stderr=subprocess.STDOUT)
+        peak = 0
+        ps_proc = psutil.Process(proc.pid)
+        while proc.poll() is None:
+            peak = max(peak, _tree_rss(ps_proc))
+            time.sleep(RSS_SAMPLE_SECONDS)
+        proc.wait()
+        seconds = time.perf_counter() - t0
+    _check_returncode(proc.returncode, log_path)
+    return seconds, peak / (1024 * 1024)
+
+
+def _check_returncode(returncode, log_path):
+    if returncode != 0:
+        raise RuntimeError(f"offline-scraing.py が失敗しました（終了コード {returncode}）。ログ: {log_path}")
+
+
+def _run_with_rusage(cmd, env, log_path):
+    if os.name == "nt":
+        # Windows には resource がないため時間だけ計る
+        with open(log_path, "ab") as log:
+            t0 = time.perf_counter()
+            returncode = subprocess.call(cmd, env=env, cwd=PROJECT_ROOT, stdout=log, stderr=subprocess.STDOUT)
+            seconds = time.perf_counter() - t0
+        _check_returncode(returncode, log_path)
+        return seconds, None
+
+    rusage_path = Path(f"{log_path}.rusage")
+    with open(log_path, "ab") as log:
+        returncode = subprocess.call(
+            [sys.executable, "-c", RUSAGE_WRAPPER, str(rusage_path), *cmd],
+            env=env, cwd=PROJECT_ROOT, stdout=log, stderr=subprocess.STDOUT,
+        )
+    _check_returncode(returncode, log_path)
+    seconds, maxrss = rusage_path.read_text(encoding="utf-8").split()
+    # Linux は KB 単位、macOS はバイト単位
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return float(seconds), int(maxrss) / scale
+
+
+def offline_env(work_dir):
+    env = dict(os.environ)
+    env.update({
+        "OFFLINE_STORE_LIST_PATH": str(work_dir / "store_list.csv"),
+        "EXCEL_OUTPUT_DIR": str(work_dir / "output"),
+        "FORMAT_STATE_DIR": str(work_dir / "format_state"),
+        "COMPLETED_STORES_PATH": str(work_dir / "completed_stores.json"),
+        "STORE_COVERAGE_PATH": str(work_dir / "coverage.db"),
+        "SLOTDATA_DB_PATH": str(work_dir / "output" / "slotdata.db"),
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    return env
+
+
+def measure_end_to_end(work_dir, store_dirs, args, rows_per_day):
+    cmd = [sys.executable, str(OFFLINE_SCRIPT_PATH), "--workers", str(args.workers), "--parser", args.parser]
+    env = offline_env(work_dir)
+    log_path = work_dir / "offline.log"
+    results = {}
+
+    def record(label, seconds, rss_mb, rows):
+        results[label] = {
+            "seconds": round(seconds, 3),
+            "rows": rows,
+            "rows_per_sec": round(rows / seconds, 1) if rows and seconds > 0 else None,
+            "peak_rss_mb": round(rss_mb, 1) if rss_mb is not None else None,
+        }
+
+    total_rows = rows_per_day * args.days * len(store_dirs)
+    record("full", *run_with_peak_rss(cmd, env, log_path), total_rows)
+    record("noop", *run_with_peak_rss(cmd, env, log_path), 0)
+    add_day(store_dirs, args.start_day + timedelta(days=args.days), args.machines, args.seed + 1)
+    record("incremental", *run_with_peak_rss(cmd, env, log_path), rows_per_day * len(store_dirs))
+    return results
+
+
+def measure_stages(work_dir, store_dirs, parser):
+    """段階ごとの処理時間を返す。incremental で追加した日付も含めて処理する。"""
+    sys.path.insert(0, str(APP_DIR))
+    import format_manifest
+    import html_archive
+    from slotdata import append_rows, build_frame, new_raw_columns
+    from slotdata_writer import resolve_latest_day, write_store_frame
+    from table_extractor import iter_table_rows
+
+    stage_dir = work_dir / "stages"
+    stage_dir.mkdir()
+    timings = dict.fromkeys(
+        ["listing", "manifest", "parsing", "normalization", "csv_write", "csv_append", "csv_merge"], 0.0,
+    )
+    total_rows = 0
+
+    def timed(stage, fn, *fn_args):
+        t0 = time.perf_counter()
+        result = fn(*fn_args)
+        timings[stage] += time.perf_counter() - t0
+        return result
+
+    for store_no, (_, store_dir) in enumerate(store_dirs, start=1):
+        html_dir = str(store_dir)
+        day_files = timed("listing", html_archive.list_days, html_dir)
+        pending = timed("manifest", format_manifest.plan_files, html_dir, {})
+
+        def parse(files):
+            columns = new_raw_columns()
+            count = 0
+            for name, day, _ in files:
+                count += append_rows(columns, iter_table_rows(os.path.join(html_dir, name), engine=parser) or [], day)
+            return columns, count
+
+        # 最後の日付は追記、最初の日付は過去日の置き換えの計測に使う
+        columns, rows = timed("parsing", parse, pending[:-1])
+        last_columns, last_rows = timed("parsing", parse, pending[-1:])
+        total_rows += rows + last_rows
+        frame = timed("normalization", build_frame, columns)
+        last_frame = timed("normalization", build_frame, last_columns)
+        first_frame = frame[frame["day"] == frame["day"].min()]
+
+        output_path = str(stage_dir / f"store{store_no:03d}-slotdata.csv")
+        state = {}
+        resolve_latest_day(output_path, state)
+        timed("csv_write", write_store_frame, output_path, frame, state)
+        timed("csv_append", write_store_frame, output_path, last_frame, state)
+        timed("csv_merge", write_store_frame, output_path, first_frame, state)
+        assert len(day_files) == len(pending)
+
+    stages = {stage: {"seconds": round(seconds, 4)} for stage, seconds in timings.items()}
+    for stage in ("parsing", "normalization"):
+        seconds = timings[stage]
+        stages[stage]["rows_per_sec"] = round(total_rows / seconds, 1) if seconds > 0 else None
+    return stages
+
+
+def git_revision():
+    try:
+        rev = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--", "_internal/app"], cwd=PROJECT_ROOT, capture_output=True, text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{rev}-dirty" if dirty else rev
+
+
+def _metrics(report):
+    """比較用に (名前, 値) を返す。"""
+    for label, result in report.get("end_to_end", {}).items():
+        yield f"end_to_end.{label}.seconds", result.get("seconds")
+        yield f"end_to_end.{label}.peak_rss_mb", result.get("peak_rss_mb")
+    for stage, result in report.get("stages", {}).items():
+        yield f"stages.{stage}.seconds", result.get("seconds")
+
+
+def print_comparison(report, baseline):
+    if baseline.get("config") != report.get("config"):
+        print("[警告] 計測条件（config）が比較元と異なります", file=sys.stderr)
+    old = dict(_metrics(baseline))
+    print(f"[比較] {baseline.get('git_revision')} → {report.get('git_revision')}", file=sys.stderr)
+    for name, value in _metrics(report):
+        before = old.get(name)
+        if value is None or not before:
+            continue
+        print(f"{name:<36} {before:10.3f} → {value:10.3f} ({(value - before) / before * 100:+6.1f}%)", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="offline-scraing.py の処理性能を合成データで計測")
+    parser.add_argument("--stores", type=int, default=5, help="店舗数")
+    parser.add_argument("--days", type=int, default=60, help="店舗あたりの日数")
+    parser.add_argument("--machines", type=int, default=300, help="1日あたりの台数（表の行数）")
+    parser.add_argument("--workers", type=int, default=1, help="offline-scraing.py の --workers")
+    parser.add_argument("--parser", choices=("lxml", "bs4"), default="lxml", help="offline-scraing.py の --parser")
+    parser.add_argument("--start-day", type=date.fromisoformat, default=date(2025, 1, 1), help="最初の日付")
+    parser.add_argument("--seed", type=int, default=1, help="乱数の種（同じ値なら同じデータを生成）")
+    parser.add_argument("--skip-stages", action="store_true", help="段階ごとの計測を省略する")
+    parser.add_argument("--output", type=Path, help="結果の JSON を保存するファイル")
+    parser.add_argument("--compare", type=Path, help="比較する以前の結果の JSON")
+    parser.add_argument("--keep", action="store_true", help="生成したデータと出力を削除しない")
+    args = parser.parse_args()
+    if args.days < 2 or args.stores < 1 or args.machines < 1:
+        parser.error("--days は 2 以上、--stores と --machines は 1 以上を指定してください")
+
+    work_dir = Path(tempfile.mkdtemp(prefix="slot-bench-format-"))
+    try:
+        t0 = time.perf_counter()
+        store_dirs = generate_stores(work_dir, args.stores, args.days, args.machines, args.start_day, args.seed)
+        generate_seconds = time.perf_counter() - t0
+        print(f"[計測] {args.stores} 店舗 × {args.days} 日 × {args.machines} 台を生成（{generate_seconds:.1f}s）", file=sys.stderr)
+
+        report = {
+            "config": {
+                "stores": args.stores,
+                "days": args.days,
+                "machines": args.machines,
+                "workers": args.workers,
+                "parser": args.parser,
+                "seed": args.seed,
+            },
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "psutil": psutil is not None,
+            "generate_seconds": round(generate_seconds, 3),
+            "end_to_end": measure_end_to_end(work_dir, store_dirs, args, args.machines),
+        }
+        if not args.skip_stages:
+            report["stages"] = measure_stages(work_dir, store_dirs, args.parser)
+
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        print(text)
+        if args.output:
+            args.output.write_text(text + "\n", encoding="utf-8")
+        if args.compare:
+            print_comparison(report, json.loads(args.compare.read_text(encoding="utf-8")))
+        if args.keep:
+            print(f"[計測] 生成したデータ: {work_dir}", file=sys.stderr)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,580 @@
+"""
+スクレイパー（anasuro_selective.py）の取得性能の計測。
+
+実サイトの代わりにローカルのモックサイトを立て、run_scrape の実際の取得処理
+（一覧ページ → 日付ページ → 保存、HTTP エンジンのブラウザへの切り替え、watchdog）を動かす。
+モックサイトは次を再現する。
+
+- 一覧ページ（div.date-table .table-row の日付リンク）と、#all_data_table を含む日付ページ
+  （表は bench_formatter.py と同じ生成処理）
+- 応答の遅延（--latency-ms / --jitter-ms）
+- google_vignette（--vignette-rate の割合の日付ページで、初回表示時に URL が #google_vignette になる）
+- Cloudflare の確認画面（--cloudflare-stores 店舗。503 と確認画面の文言を返し、ブラウザでは
+  --challenge-seconds 秒後の再読み込みで cf_clearance が有効になる。HTTP 取得では通過できない）
+- 応答の停止（--watchdog。日付ページの応答を止め、watchdog の検知と中断までの時間を測る）
+
+ブラウザは既定では urllib で取得する代替（FakeBrowser。確認画面のスクリプトと再読み込み、
+vignette の URL を模擬する）を使い、--driver chrome で実際の Chrome（create_driver）を使う。
+クリックでの遷移（browser-click）は Chrome の場合のみ計測できる。
+
+モードごとに pages/min、ページ読み込み時間と待機（time.sleep）時間の合計、ブラウザの起動回数、
+モックサイトへのリクエスト数などを JSON で出力する。--compare で以前の結果と比べた増減を表示する。
+
+使い方（apps フォルダで実行）:
+    python _internal/devtools/bench/bench_scraper.py --stores 3 --days 20 --output bench_scraper.json
+    python _internal/devtools/bench/bench_scraper.py --modes http,http-inline --watchdog --compare bench_scraper.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from bench_formatter import git_revision, machine_names, render_day
+
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+APP_DIR = PROJECT_ROOT / "_internal" / "app"
+
+MODES = {
+    "browser": {"engine": "browser", "navigation": "direct", "inline_format": False},
+    "browser-click": {"engine": "browser", "navigation": "click", "inline_format": False},
+    "http": {"engine": "http", "navigation": "direct", "inline_format": False},
+    "http-inline": {"engine": "http", "navigation": "direct", "inline_format": True},
+}
+DEFAULT_MODES = "browser,http,http-inline"
+WEEKDAYS = "月火水木金土日"
+VIGNETTE_SCRIPT = '<script>location.hash = "google_vignette";</script>'
+FAKE_USER_AGENT = "FakeBrowser/1.0"
+_TOKEN_PATTERN = re.compile(r'cf_clearance=([0-9a-f]+)')
+_REFRESH_PATTERN = re.compile(r'http-equiv="refresh" content="(\d+)"')
+
+# モックサイトの遅延は計測対象の time.sleep（スクレイパー側の待機）に含めない
+_sleep = time.sleep
+
+
+class MockSite(ThreadingHTTPServer):
+    """モックサイトの設定と、店舗・種類ごとのリクエスト数。"""
+
+    daemon_threads = True
+
+    def __init__(self, args):
+        super().__init__(("127.0.0.1", 0), MockSiteHandler)
+        self.days = [(args.start_day + timedelta(days=i)) for i in range(args.days)]
+        self.machines = args.machines
+        self.names = machine_names()
+        self.latency = args.latency_ms / 1000
+        self.jitter = args.jitter_ms / 1000
+        self.vignette_rate = args.vignette_rate
+        self.challenge_seconds = args.challenge_seconds
+        self.protected = set()
+        self.tokens = {}
+        self.vignette_shown = set()
+        self.stats = Counter()
+        self.stall_after = None
+        self.stall_seconds = 0
+        self.stall_started = None
+        self.stall_release = threading.Event()
+        self._rng = random.Random(args.seed)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, store, kind):
+        with self._lock:
+            self.stats[(store, kind)] += 1
+            return sum(n for (_, k), n in self.stats.items() if k == "detail")
+
+    def delay(self):
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter, self.jitter) if self.jitter else 0
+        if self.latency + jitter > 0:
+            _sleep(self.latency + jitter)
+
+    def issue_token(self):
+        with self._lock:
+            token = f"{self._rng.getrandbits(64):016x}"
+            self.tokens[token] = time.monotonic()
+        return token
+
+    def cleared(self, cookie_header):
+        m = _TOKEN_PATTERN.search(cookie_header or "")
+        issued = self.tokens.get(m.group(1)) if m else None
+        return issued is not None and time.monotonic() - issued >= self.challenge_seconds
+
+    def arm_stall(self, after, seconds):
+        """after 件目の日付ページの応答を seconds 秒止める。"""
+        self.stall_after = after
+        self.stall_seconds = seconds
+        self.stall_started = None
+        self.stall_release.clear()
+
+    def disarm_stall(self):
+        self.stall_after = None
+        self.stall_release.set()
+
+    def handle_error(self, request, client_address):
+        # 中断したスクレイパーが切断した接続への応答失敗は計測の想定内
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def stats_for(self, stores):
+        totals = Counter()
+        for (store, kind), n in self.stats.items():
+            if store in stores:
+                totals[kind] += n
+        return dict(totals)
+
+
+class MockSiteHandler(BaseHTTPRequestHandler):
+    """
+    /store/<店舗> は日付一覧、/detail/<店舗>/<日付> は生成した表を埋め込んだ日付ページを返す。
+    保護対象の店舗は、有効な cf_clearance がない限り Cloudflare の確認画面（503）を返す。
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_html(self, status, body):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_challenge(self, store):
+        self.server.count(store, "challenge")
+        token = self.server.issue_token()
+        self.send_html(503, (
+            "<html><head><title>しばらくお待ちください...</title>"
+            f'<meta http-equiv="refresh" content="{self.server.challenge_seconds}"></head>'
+            "<body><div id=\"hcaptcha-box\"></div><p>人間であることを確認します。</p>"
+            f'<script>document.cookie = "cf_clearance={token}; path=/";</script></body></html>'
+        ))
+
+    def do_GET(self):
+        site = self.server
+        parts = self.path.strip("/").split("/")
+        if len(parts) < 2 or parts[0] not in ("store", "detail"):
+            self.send_html(404, "<html><body>not found</body></html>")
+            return
+        store = parts[1]
+        site.delay()
+        if store in site.protected and not site.cleared(self.headers.get("Cookie")):
+            self.send_challenge(store)
+            return
+
+        if len(parts) == 2 and parts[0] == "store":
+            site.count(store, "list")
+            rows = "".join(
+                f'<div class="table-row"><a href="/detail/{store}/{day.isoformat()}">'
+                f'{day.strftime("%Y/%m/%d")}({WEEKDAYS[day.weekday()]})</a></div>'
+                for day in reversed(site.days)
+            )
+            self.send_html(200, f'<html><body><div class="date-table">{rows}</div></body></html>')
+            return
+
+        if len(parts) == 3 and parts[2] in {day.isoformat() for day in site.days}:
+            detail_no = site.count(store, "detail")
+            if site.stall_after is not None and detail_no == site.stall_after:
+                site.stall_started = time.perf_counter()
+                site.count(store, "stalled")
+                site.stall_release.wait(site.stall_seconds)
+            vignette = ""
+            if self.path not in site.vignette_shown and random.Random(f"vignette{self.path}").random() < site.vignette_rate:
+                site.vignette_shown.add(self.path)
+                site.count(store, "vignette")
+                vignette = VIGNETTE_SCRIPT
+            table = render_day(random.Random(self.path), site.names, site.machines)
+            self.send_html(200, (
+                f'<html><body><div id="overlay_ads_area"></div><h1>{parts[2]}</h1>{vignette}{table}</body></html>'
+            ))
+            return
+        self.send_html(404, "<html><body>not found</body></html>")
+
+
+class FakeRow:
+    def __init__(self, date_text, href):
+        self.date_text = date_text
+        self.href = href
+
+    def find_element(self, *args):
+        return self
+
+    @property
+    def text(self):
+        return self.date_text.replace("-", "/") + "(月)"
+
+    def get_attribute(self, name):
+        return self.href
+
+
+class FakeBrowser:
+    """
+    urllib で取得するブラウザの代替。確認画面のスクリプト（cf_clearance の設定）と再読み込み、
+    vignette による URL の変化を模擬する。quit() されると読み込み中のページ遷移も失敗する。
+    """
+
+    def __init__(self):
+        self.current_url = ""
+        self.page = ""
+        self.cookies = {}
+        self.loaded_at = 0.0
+        self.closed = threading.Event()
+
+    def get(self, url):
+        from anasuro_selective import SCRAPE_PAGELOAD_TIMEOUT_SECONDS
+        from selenium.common.exceptions import TimeoutException, WebDriverException
+
+        if self.closed.is_set():
+            raise WebDriverException("ブラウザは終了しています")
+        url = url.split("#")[0]
+        result = {}
+        done = threading.Event()
+
+        def load():
+            headers = {"User-Agent": FAKE_USER_AGENT}
+            if self.cookies:
+                headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+            try:
+                with urllib.request.urlopen(
+                    urllib.request.Request(url, headers=headers), timeout=SCRAPE_PAGELOAD_TIMEOUT_SECONDS,
+                ) as res:
+                    result["page"] = res.read().decode("utf-8")
+            except urllib.error.HTTPError as e:
+                result["page"] = e.read().decode("utf-8")
+            except Exception as e:
+                result["error"] = e
+            finally:
+                done.set()
+
+        threading.Thread(target=load, daemon=True).start()
+        while not done.wait(0.05):
+            if self.closed.is_set():
+                raise WebDriverException("ブラウザが終了しました")
+        if "error" in result:
+            error = result["error"]
+            if isinstance(error, TimeoutError) or "timed out" in str(error):
+                raise TimeoutException(str(error))
+            raise WebDriverException(str(error))
+
+        self.page = result["page"]
+        self.loaded_at = time.monotonic()
+        m = _TOKEN_PATTERN.search(self.page)
+        if m:
+            self.cookies["cf_clearance"] = m.group(1)
+        self.current_url = url + ("#google_vignette" if VIGNETTE_SCRIPT in self.page else "")
+
+    def _refresh_if_due(self):
+        m = _REFRESH_PATTERN.search(self.page)
+        if m and time.monotonic() - self.loaded_at >= int(m.group(1)):
+            self.get(self.current_url)
+
+    def find_elements(self, by, selector):
+        from http_fetcher import parse_date_links
+
+        if "date-table" not in self.page:
+            return []
+        return [FakeRow(d, h) for d, h in reversed(parse_date_links(self.page, self.current_url))]
+
+    def execute_script(self, script, *args):
+        import anasuro_selective
+        from http_fetcher import extract_table_html, is_cloudflare_page
+
+        if script == anasuro_selective.PAGE_PROBE_SCRIPT:
+            self._refresh_if_due()
+            return {"table": extract_table_html(self.page), "cloudflare": is_cloudflare_page(self.page)}
+        if "navigator.userAgent" in script:
+            return FAKE_USER_AGENT
+        return None
+
+    def get_cookies(self):
+        return [{"name": k, "value": v, "domain": "127.0.0.1", "path": "/"} for k, v in self.cookies.items()]
+
+    def quit(self):
+        self.closed.set()
+
+
+class Meter:
+    """ページ読み込み（ScrapeSession.safe_get / http_get）と time.sleep の合計時間（スレッドの合計）。"""
+
+    def __init__(self):
+        self.totals = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, kind, seconds):
+        with self._lock:
+            self.totals[kind] += seconds
+
+    def timed(self, kind, fn):
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(kind, time.perf_counter() - t0)
+        return wrapper
+
+    @contextlib.contextmanager
+    def installed(self, anasuro_selective):
+        session_cls = anasuro_selective.ScrapeSession
+        originals = (session_cls.safe_get, session_cls.http_get, time.sleep)
+        session_cls.safe_get = self.timed("load", session_cls.safe_get)
+        session_cls.http_get = self.timed("load", session_cls.http_get)
+        time.sleep = self.timed("sleep", time.sleep)
+        try:
+            yield self
+        finally:
+            session_cls.safe_get, session_cls.http_get, time.sleep = originals
+
+
+class LineCapture(io.TextIOBase):
+    """スクレイパーの出力を行ごとに時刻付きで記録する。"""
+
+    def __init__(self):
+        self.lines = []
+        self._buffer = ""
+        self._lock = threading.Lock()
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        with self._lock:
+            self._buffer += text
+            while "\n" in self._buffer:
+                line, self._buffer = self._buffer.split("\n", 1)
+                self.lines.append((time.perf_counter(), line))
+        return len(text)
+
+    def first(self, prefix):
+        return next((t for t, line in self.lines if line.startswith(prefix)), None)
+
+    def count(self, prefix):
+        return sum(1 for _, line in self.lines if line.startswith(prefix))
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(line + "\n" for _, line in self.lines)
+
+
+def run_scrape_captured(anasuro_selective, site, stores, mode, args, work_dir, label, meter, driver_factory):
+    """店舗 stores を取得し (経過秒, 出力, エラー) を返す。"""
+    import pandas as pd
+
+    df = pd.DataFrame([
+        {"store_name": store, "store_url": f"{site.base_url}/store/{store}", "data_directory": str(work_dir / store)}
+        for store in stores
+    ])
+    capture = LineCapture()
+    error = None
+    t0 = time.perf_counter()
+    # 確認画面で入力待ちにならないよう、標準入力は端末でないものに差し替える
+    with meter.installed(anasuro_selective), contextlib.redirect_stdout(capture), \
+            contextlib.redirect_stderr(capture):
+        stdin, sys.stdin = sys.stdin, io.StringIO()
+        try:
+            anasuro_selective.run_scrape(
+                df,
+                workers=args.workers,
+                per_domain_limit=args.per_domain_limit,
+                navigation=MODES[mode]["navigation"],
+                engine=MODES[mode]["engine"],
+                driver_factory=driver_factory,
+                inline_format=MODES[mode]["inline_format"],
+            )
+        except RuntimeError as e:
+            error = str(e)
+        finally:
+            sys.stdin = stdin
+    seconds = time.perf_counter() - t0
+    capture.save(work_dir / f"{label}.log")
+    return seconds, capture, error
+
+
+def counting_factory(factory):
+    def create():
+        create.count += 1
+        return factory()
+    create.count = 0
+    return create
+
+
+def measure_mode(anasuro_selective, site, mode, args, work_dir, driver_factory):
+    stores = [f"{mode}-{n:03d}" for n in range(1, args.stores + 1)]
+    site.protected.update(stores[:args.cloudflare_stores])
+    meter = Meter()
+    factory = counting_factory(driver_factory)
+    seconds, capture, error = run_scrape_captured(
+        anasuro_selective, site, stores, mode, args, work_dir, mode, meter, factory,
+    )
+    pages = capture.count("__CHECKPOINT__ day")
+    thread_seconds = seconds * max(1, min(args.workers, len(stores)))
+    return {
+        "seconds": round(seconds, 3),
+        "pages": pages,
+        "expected_pages": args.stores * args.days,
+        "pages_per_min": round(pages / seconds * 60, 1) if seconds > 0 else None,
+        "load_seconds": round(meter.totals["load"], 3),
+        "sleep_seconds": round(meter.totals["sleep"], 3),
+        "other_seconds": round(max(0.0, thread_seconds - meter.totals["load"] - meter.totals["sleep"]), 3),
+        "browser_starts": factory.count,
+        "switches": capture.count("[切替]"),
+        "errors": capture.count("[エラー]"),
+        "watchdog_timeouts": capture.count("__WATCHDOG_TIMEOUT__"),
+        "error": error,
+        "requests": site.stats_for(stores),
+    }
+
+
+def measure_watchdog(anasuro_selective, site, mode, args, work_dir, driver_factory):
+    """日付ページの応答を止め、watchdog が検知して処理を中断するまでの時間を返す。"""
+    store = f"watchdog-{mode}"
+    detail_before = sum(n for (_, k), n in site.stats.items() if k == "detail")
+    site.arm_stall(detail_before + args.stall_after, args.stall_seconds)
+    idle_timeout = anasuro_selective.SCRAPE_IDLE_TIMEOUT_SECONDS
+    anasuro_selective.SCRAPE_IDLE_TIMEOUT_SECONDS = args.idle_timeout
+    try:
+        _, capture, error = run_scrape_captured(
+            anasuro_selective, site, [store], mode, args, work_dir, f"watchdog-{mode}", Meter(), driver_factory,
+        )
+        finished = time.perf_counter()
+    finally:
+        anasuro_selective.SCRAPE_IDLE_TIMEOUT_SECONDS = idle_timeout
+        site.disarm_stall()
+    stalled = site.stall_started
+    detected = capture.first("__WATCHDOG_TIMEOUT__")
+    return {
+        "idle_timeout_seconds": args.idle_timeout,
+        "stall_seconds": args.stall_seconds,
+        "stalled": stalled is not None,
+        "triggered": detected is not None,
+        "detected_after_stall_seconds": round(detected - stalled, 3) if stalled and detected else None,
+        "finished_after_stall_seconds": round(finished - stalled, 3) if stalled else None,
+        "pages_before_stall": capture.count("__CHECKPOINT__ day"),
+        "error": error,
+    }
+
+
+def _metrics(report):
+    """比較用に (名前, 値) を返す。"""
+    for mode, result in report.get("modes", {}).items():
+        for key in ("pages_per_min", "load_seconds", "sleep_seconds", "other_seconds"):
+            yield f"modes.{mode}.{key}", result.get(key)
+    for mode, result in report.get("watchdog", {}).items():
+        for key in ("detected_after_stall_seconds", "finished_after_stall_seconds"):
+            yield f"watchdog.{mode}.{key}", result.get(key)
+
+
+def print_comparison(report, baseline):
+    if baseline.get("config") != report.get("config"):
+        print("[警告] 計測条件（config）が比較元と異なります", file=sys.stderr)
+    old = dict(_metrics(baseline))
+    print(f"[比較] {baseline.get('git_revision')} → {report.get('git_revision')}", file=sys.stderr)
+    for name, value in _metrics(report):
+        before = old.get(name)
+        if value is None or not before:
+            continue
+        print(f"{name:<44} {before:10.3f} → {value:10.3f} ({(value - before) / before * 100:+6.1f}%)", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="anasuro_selective.py の取得性能をモックサイトで計測")
+    parser.add_argument("--stores", type=int, default=3, help="モードごとの店舗数")
+    parser.add_argument("--days", type=int, default=20, help="店舗あたりの日数")
+    parser.add_argument("--machines", type=int, default=200, help="1日あたりの台数（表の行数）")
+    parser.add_argument("--start-day", type=date.fromisoformat, default=date(2025, 1, 1), help="最初の日付")
+    parser.add_argument("--latency-ms", type=float, default=150, help="モックサイトの応答の遅延")
+    parser.add_argument("--jitter-ms", type=float, default=50, help="遅延のばらつき（±）")
+    parser.add_argument("--vignette-rate", type=float, default=0.1, help="初回表示で vignette になる日付ページの割合")
+    parser.add_argument("--cloudflare-stores", type=int, default=1, help="モードごとの確認画面ありの店舗数")
+    parser.add_argument("--challenge-seconds", type=int, default=3, help="確認画面の通過までの秒数")
+    parser.add_argument("--modes", default=DEFAULT_MODES, help=f"計測するモード（カンマ区切り: {', '.join(MODES)}）")
+    parser.add_argument("--driver", choices=("fake", "chrome"), default="fake", help="ブラウザ（fake: 代替 / chrome: 実際の Chrome）")
+    parser.add_argument("--workers", type=int, default=1, help="run_scrape の workers")
+    parser.add_argument("--per-domain-limit", type=int, default=2, help="run_scrape の per_domain_limit")
+    parser.add_argument("--watchdog", action="store_true", help="応答停止時の watchdog の動作も計測する")
+    parser.add_argument("--idle-timeout", type=int, default=10, help="watchdog 計測時の SCRAPE_IDLE_TIMEOUT_SECONDS")
+    parser.add_argument("--stall-after", type=int, default=3, help="watchdog 計測で応答を止める日付ページ（何件目）")
+    parser.add_argument("--stall-seconds", type=float, default=60, help="watchdog 計測で応答を止める秒数")
+    parser.add_argument("--seed", type=int, default=1, help="乱数の種")
+    parser.add_argument("--output", type=Path, help="結果の JSON を保存するファイル")
+    parser.add_argument("--compare", type=Path, help="比較する以前の結果の JSON")
+    parser.add_argument("--keep", action="store_true", help="保存したHTML・出力・ログを削除しない")
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        parser.error(f"不明なモード: {', '.join(unknown)}")
+    if args.driver == "fake" and "browser-click" in modes:
+        parser.error("browser-click は --driver chrome の場合のみ計測できます")
+
+    work_dir = Path(tempfile.mkdtemp(prefix="slot-bench-scrape-"))
+    # 取得状況の索引・インライン整形の出力は作業フォルダへ（anasuro_selective の読み込み前に設定する）
+    os.environ["STORE_COVERAGE_PATH"] = str(work_dir / "coverage.db")
+    os.environ["EXCEL_OUTPUT_DIR"] = str(work_dir / "output")
+    os.environ["FORMAT_STATE_DIR"] = str(work_dir / "format_state")
+    sys.path.insert(0, str(APP_DIR))
+    import anasuro_selective
+
+    driver_factory = anasuro_selective.create_driver if args.driver == "chrome" else FakeBrowser
+    site = MockSite(args)
+    threading.Thread(target=site.serve_forever, daemon=True).start()
+    try:
+        report = {
+            "config": {
+                key: getattr(args, key) for key in (
+                    "stores", "days", "machines", "latency_ms", "jitter_ms", "vignette_rate",
+                    "cloudflare_stores", "challenge_seconds", "driver", "workers", "per_domain_limit", "seed",
+                )
+            },
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "modes": {},
+        }
+        for mode in modes:
+            print(f"[計測] {mode}: {args.stores} 店舗 × {args.days} 日", file=sys.stderr)
+            report["modes"][mode] = measure_mode(anasuro_selective, site, mode, args, work_dir, driver_factory)
+        if args.watchdog:
+            report["watchdog"] = {}
+            for mode in modes:
+                print(f"[計測] {mode}: watchdog（{args.stall_after} 件目で {args.stall_seconds:.0f} 秒停止）", file=sys.stderr)
+                report["watchdog"][mode] = measure_watchdog(anasuro_selective, site, mode, args, work_dir, driver_factory)
+
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        print(text)
+        if args.output:
+            args.output.write_text(text + "\n", encoding="utf-8")
+        if args.compare:
+            print_comparison(report, json.loads(args.compare.read_text(encoding="utf-8")))
+        if args.keep:
+            print(f"[計測] 保存したデータ・ログ: {work_dir}", file=sys.stderr)
+    finally:
+        site.disarm_stall()
+        site.shutdown()
+        site.server_close()
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
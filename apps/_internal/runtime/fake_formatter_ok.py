@@ -0,0 +1,10 @@
+import time
+
+file_no = 0
+for store_no, (store, files) in enumerate([("店舗A", 1), ("店舗B", 2)], start=1):
+    print(f"__PROGRESS__ store_start {store_no}/2 {store}", flush=True)
+    for _ in range(files):
+        file_no += 1
+        print(f"__PROGRESS__ file {file_no}/3 {store}", flush=True)
+        time.sleep(0.05)
+    print(f"__PROGRESS__ store {store_no}/2 {store}", flush=True)
@@ -0,0 +1,12 @@
+import os
+import sys
+import time
+
+cancel_file = sys.argv[sys.argv.index("--cancel-file") + 1] if "--cancel-file" in sys.argv else None
+deadline = time.time() + 10
+while time.time() < deadline:
+    if cancel_file and os.path.exists(cancel_file):
+        print("[中断] 取り消し要求により停止します", flush=True)
+        sys.exit(0)
+    time.sleep(0.05)
+print("ok", flush=True)
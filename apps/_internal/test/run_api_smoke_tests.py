@@ -20,30 +20,69 @@ def load_app_module():
     return module
 
 
-def wait_for_job(client, job_id, timeout_sec=10):
+def wait_for_job(client, job_id, timeout_sec=10, statuses=("completed", "failed", "cancelled")):
     start = time.time()
     while time.time() - start < timeout_sec:
         res = client.get(f"/api/jobs/{job_id}")
         if res.status_code != 200:
             return None
         payload = res.get_json()
-        if payload.get("status") in ("completed", "failed"):
+        if payload.get("status") in statuses:
             return payload
         time.sleep(0.1)
     return None
 
 
-def write_min_store_csv(path):
+def write_min_store_csv(path, extra_rows=()):
     rows = [
         ["store_name", "store_url", "data_directory"],
         ["店舗A", "https://example.com/a", ".\\data\\test"],
         ["店舗B", "https://example.com/b", ".\\data\\test2"],
+        *extra_rows,
     ]
     with open(path, "w", encoding="utf-8-sig", newline="") as f:
         writer = csv.writer(f)
         writer.writerows(rows)
 
 
+def check_slotdata_db_key(slotdata_db, tmp):
+    """主キーが (store, day, dai_num) だった DB を作り直し、台番号が 0 の台を機種ごとに残すことを確認する。"""
+    import sqlite3
+
+    import pandas as pd
+
+    db_path = tmp / "slotdata_old.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE slotdata (store TEXT, day TEXT, dai_name TEXT, dai_num INTEGER, PRIMARY KEY (store, day, dai_num))")
+    conn.execute("INSERT INTO slotdata VALUES ('店舗A', '2026-02-08', 'マイジャグラーV', 1)")
+    conn.commit()
+    conn.close()
+
+    state = {"database": {"path": os.path.abspath(db_path)}, "output": {}}
+    current_before = slotdata_db.is_current(state, str(db_path))
+    frame = pd.DataFrame(
+        [
+            ("2026-02-08", "マイジャグラーV", 0, 1000, 100, 3, 1, 250.0, 333.3, 1000.0),
+            ("2026-02-08", "スマスロ北斗の拳", 0, 2000, -500, 1, 0, 2000.0, 2000.0, 0.0),
+        ],
+        columns=slotdata_db.FRAME_COLUMNS,
+    )
+    slotdata_db.sync_store(str(db_path), "店舗A", None, state, frame)
+    conn = slotdata_db.connect(str(db_path))
+    try:
+        rows = conn.execute("SELECT dai_name, dai_num FROM slotdata ORDER BY dai_name").fetchall()
+        key = [row[1] for row in conn.execute("PRAGMA table_info(slotdata)") if row[5]]
+    finally:
+        conn.close()
+    ok = (
+        len(rows) == 2
+        and key == ["store", "day", "dai_name", "dai_num"]
+        and not current_before
+        and state["database"].get("schema") == slotdata_db.SCHEMA_VERSION
+    )
+    return ok, f"rows={rows}, key={key}, current_before={current_before}"
+
+
 def main():
     original_store_list = STORE_LIST_PATH.read_bytes()
     results = []
@@ -57,6 +96,10 @@ def main():
         os.environ["COMPLETED_STORES_PATH"] = str(tmp / "completed_stores.json")
         os.environ["TEMP_STORE_LIST_PATH"] = str(tmp / "temp_store_list.csv")
         os.environ["OFFLINE_SCRIPT_PATH"] = str(ROOT / "_internal" / "runtime" / "fake_scraper_ok.py")
+        os.environ["SLOTDATA_DB_PATH"] = str(tmp / "slotdata.db")
+        os.environ["JOB_STORE_PATH"] = str(tmp / "jobs.db")
+        os.environ["JOB_STORE_LIST_DIR"] = str(tmp / "job_store_lists")
+        os.environ["STORE_COVERAGE_PATH"] = str(tmp / "coverage.db")
 
         app_mod = load_app_module()
         client = app_mod.app.test_client()
@@ -65,6 +108,11 @@ def main():
         stores = r.get_json() if r.status_code == 200 else []
         results.append(("GET /api/stores", r.status_code == 200 and len(stores) >= 2, f"status={r.status_code}, stores={len(stores)}"))
 
+        write_min_store_csv(STORE_LIST_PATH, extra_rows=[["店舗C", "https://example.com/c", ".\\data\\test3"]])
+        r = client.get("/api/stores")
+        names = [s.get("name") for s in (r.get_json() if r.status_code == 200 else [])]
+        results.append(("GET /api/stores reloads changed file", names == ["店舗A", "店舗B", "店舗C"], f"names={names}"))
+
         r = client.post("/api/stores/save", json={"stores": "bad"})
         results.append(("POST /api/stores/save invalid", r.status_code == 400, f"status={r.status_code}"))
 
@@ -96,6 +144,21 @@ def main():
             )
         )
 
+        r = client.post("/api/scrape", json={"stores": ["店舗1"]})
+        sse_job = r.get_json().get("job_id") if r.status_code == 202 else None
+        r = client.get(f"/api/jobs/{sse_job}/events")
+        stream = r.get_data(as_text=True)
+        results.append(
+            (
+                "GET /api/jobs/<id>/events stream",
+                r.status_code == 200 and "event: end" in stream and '"status": "completed"' in stream,
+                f"status={r.status_code}, events={stream.count('event: ')}",
+            )
+        )
+
+        r = client.get("/api/jobs/unknown/events")
+        results.append(("GET /api/jobs/<id>/events unknown", r.status_code == 404, f"status={r.status_code}"))
+
         app_mod.SCRAPING_SCRIPT_PATH = str(ROOT / "_internal" / "runtime" / "fake_scraper_fail.py")
         r = client.post("/api/scrape", json={"stores": ["店舗1"]})
         fail_job = r.get_json().get("job_id") if r.status_code == 202 else None
@@ -109,6 +172,100 @@ def main():
             )
         )
 
+        app_mod.SCRAPING_SCRIPT_PATH = str(ROOT / "_internal" / "runtime" / "fake_scraper_ok.py")
+        r = client.post(f"/api/jobs/{fail_job}/resume")
+        resumed = wait_for_job(client, fail_job) if r.status_code == 202 else None
+        results.append(
+            (
+                "POST /api/jobs/<id>/resume",
+                r.status_code == 202 and resumed and resumed.get("status") == "completed" and resumed.get("resume_count") == 1,
+                f"status={r.status_code}, end={resumed.get('status') if resumed else 'none'}",
+            )
+        )
+
+        r = client.post(f"/api/jobs/{ok_job}/resume")
+        results.append(("POST /api/jobs/<id>/resume completed job", r.status_code == 409, f"status={r.status_code}"))
+
+        # 常駐プロセスは anasuro_selective.py しか実行できないため、スクレイパーを差し替えた場合は子プロセスで実行する
+        app_mod.SCRAPE_DAEMON_ENABLED = True
+        try:
+            r = client.post("/api/scrape", json={"stores": ["店舗1"]})
+            daemon_job = r.get_json().get("job_id") if r.status_code == 202 else None
+            daemon_result = wait_for_job(client, daemon_job) if daemon_job else None
+        finally:
+            app_mod.SCRAPE_DAEMON_ENABLED = False
+        results.append(
+            (
+                "POST /api/scrape daemon skipped for custom script",
+                daemon_result and daemon_result.get("status") == "completed" and "scrape_daemon" not in sys.modules,
+                f"start={r.status_code}, end={daemon_result.get('status') if daemon_result else 'none'}",
+            )
+        )
+
+        app_mod.JOBS.pop(ok_job, None)
+        r = client.get(f"/api/jobs/{ok_job}")
+        payload = r.get_json() if r.status_code == 200 else {}
+        results.append(("GET /api/jobs/<id> persisted", r.status_code == 200 and payload.get("status") == "completed", f"status={r.status_code}"))
+
+        interrupted = {"job_id": "interrupted", "status": "running", "created_at": "2026-01-01T00:00:00"}
+        app_mod.job_store.save_job(app_mod.JOB_STORE_PATH, interrupted, {"stores": ["店舗1"], "options": {}})
+        app_mod._restore_jobs()
+        r = client.get("/api/jobs/interrupted")
+        payload = r.get_json() if r.status_code == 200 else {}
+        results.append(("restore interrupted job", payload.get("status") == "failed" and payload.get("resumable") is True, f"status={payload.get('status')}"))
+
+        interrupted_format = {"job_id": "interrupted-format", "kind": "format", "status": "running", "created_at": "2026-01-01T00:00:00"}
+        app_mod.job_store.save_job(app_mod.JOB_STORE_PATH, interrupted_format)
+        app_mod._restore_jobs()
+        r = client.get("/api/jobs/interrupted-format")
+        payload = r.get_json() if r.status_code == 200 else {}
+        results.append((
+            "restore interrupted format job",
+            payload.get("status") == "failed" and payload.get("resumable") is False,
+            f"status={payload.get('status')}, resumable={payload.get('resumable')}",
+        ))
+        r = client.post("/api/jobs/interrupted-format/resume")
+        results.append(("POST /api/jobs/<id>/resume format job", r.status_code == 409, f"status={r.status_code}"))
+
+        r = client.get("/api/jobs")
+        listed = r.get_json() if r.status_code == 200 else []
+        results.append(("GET /api/jobs", r.status_code == 200 and len(listed) >= 3, f"status={r.status_code}, jobs={len(listed)}"))
+
+        app_mod.SCRAPING_SCRIPT_PATH = str(ROOT / "_internal" / "runtime" / "fake_scraper_slow.py")
+        r = client.post("/api/scrape", json={"stores": ["店舗1"]})
+        slow_job = r.get_json().get("job_id") if r.status_code == 202 else None
+        wait_for_job(client, slow_job, statuses=("running",))
+        r = client.post("/api/scrape", json={"stores": ["店舗1"]})
+        payload = r.get_json() if r.status_code == 202 else {}
+        results.append((
+            "POST /api/scrape coalesces duplicate",
+            payload.get("job_id") == slow_job and payload.get("coalesced") is True,
+            f"status={r.status_code}, coalesced={payload.get('coalesced')}",
+        ))
+
+        r = client.post("/api/scrape", json={"stores": ["並び替え対象"], "options": {"workers": 2}})
+        queued_job = r.get_json().get("job_id") if r.status_code == 202 else None
+        queued = client.get(f"/api/jobs/{queued_job}").get_json() or {}
+        r = client.post(f"/api/jobs/{queued_job}/cancel")
+        cancelled = client.get(f"/api/jobs/{queued_job}").get_json() or {}
+        results.append((
+            "POST /api/jobs/<id>/cancel queued",
+            queued.get("queue_position") == 1 and r.status_code == 200 and cancelled.get("status") == "cancelled",
+            f"position={queued.get('queue_position')}, status={r.status_code}, end={cancelled.get('status')}",
+        ))
+
+        r = client.post(f"/api/jobs/{slow_job}/cancel")
+        cancelled = wait_for_job(client, slow_job) if r.status_code == 202 else None
+        results.append((
+            "POST /api/jobs/<id>/cancel running",
+            r.status_code == 202 and cancelled and cancelled.get("status") == "cancelled",
+            f"status={r.status_code}, end={cancelled.get('status') if cancelled else 'none'}",
+        ))
+        app_mod.SCRAPING_SCRIPT_PATH = str(ROOT / "_internal" / "runtime" / "fake_scraper_ok.py")
+
+        r = client.post(f"/api/jobs/{ok_job}/priority", json={"priority": 5})
+        results.append(("POST /api/jobs/<id>/priority finished job", r.status_code == 409, f"status={r.status_code}"))
+
         r = client.post("/api/scrape", json={"stores": []})
         results.append(("POST /api/scrape no stores", r.status_code == 400, f"status={r.status_code}"))
 
@@ -119,15 +276,121 @@ def main():
         logs = r.get_json() if r.status_code == 200 else []
         results.append(("GET /api/logs", r.status_code == 200 and isinstance(logs, list) and len(logs) >= 1, f"status={r.status_code}, logs={len(logs)}"))
 
-        app_mod.OFFLINE_SCRIPT_PATH = str(ROOT / "_internal" / "runtime" / "fake_scraper_ok.py")
+        r = client.get("/api/logs?limit=2&action=scrape")
+        first_page = r.get_json() if r.status_code == 200 else []
+        cursor = r.headers.get("X-Next-Cursor")
+        r = client.get(f"/api/logs?limit=2&action=scrape&cursor={cursor}")
+        second_page = r.get_json() if r.status_code == 200 else []
+        ok = (
+            len(first_page) == 2
+            and cursor
+            and len(second_page) >= 1
+            and second_page[-1]["timestamp"] < first_page[0]["timestamp"]
+            and all(e.get("action") == "scrape" for e in first_page + second_page)
+        )
+        results.append(("GET /api/logs cursor paging", ok, f"pages={len(first_page)}+{len(second_page)}, cursor={cursor}"))
+
+        r = client.get("/api/logs?day_from=2000-01-01&day_to=2000-12-31")
+        results.append(("GET /api/logs date filter", r.status_code == 200 and r.get_json() == [], f"status={r.status_code}"))
+
+        rotate_log = tmp / "rotate_log.json"
+        for i in range(5):
+            app_mod.scrape_log.append_entry(str(rotate_log), {"timestamp": f"2026-01-0{i + 1}T00:00:00", "i": i}, max_bytes=120, keep=1)
+        archives = app_mod.scrape_log.list_archives(str(rotate_log))
+        tail, _ = app_mod.scrape_log.read_entries(str(rotate_log), limit=5)
+        results.append((
+            "scrape_log rotation",
+            len(archives) == 1 and archives[0].endswith(".gz") and tail and tail[-1]["i"] == 4,
+            f"archives={len(archives)}, tail={[e['i'] for e in tail]}",
+        ))
+
+        coverage = app_mod.store_coverage
+        coverage_db = app_mod.STORE_COVERAGE_PATH
+        coverage.reconcile_scraped(coverage_db, "店舗1", ["2026-01-01", "2026-01-02", "2026-01-04"])
+        coverage.record_scraped(coverage_db, "店舗1", "2026-01-03", error="表を取得できませんでした")
+        coverage.record_formatted(coverage_db, "店舗1", [("2026-01-01", 30), ("2026-01-02", 0)])
+        r = client.get("/api/coverage/gaps?store=店舗1&day_to=2026-01-05")
+        gap = (r.get_json() or {}).get("stores", [{}])[0] if r.status_code == 200 else {}
+        ok = (
+            gap.get("missing") == [
+                {"day": "2026-01-03", "reason": "表を取得できませんでした"},
+                {"day": "2026-01-05", "reason": None},
+            ]
+            and gap.get("unformatted") == ["2026-01-04"]
+            and [e["day"] for e in gap.get("format_errors", [])] == ["2026-01-02"]
+            and gap.get("rows") == 30
+            and gap.get("scanned")
+        )
+        results.append(("GET /api/coverage/gaps", ok, f"status={r.status_code}, gap={gap}"))
+
+        r = client.post("/api/coverage/rescan", json={"stores": ["店舗1"]})
+        ok = r.status_code == 200 and coverage.scraped_days(coverage_db, "店舗1") is None
+        r_bad = client.get("/api/coverage/gaps?day_to=2026-02-30")
+        results.append(("POST /api/coverage/rescan", ok and r_bad.status_code == 400, f"status={r.status_code}, bad_date={r_bad.status_code}"))
+
+        app_mod.OFFLINE_SCRIPT_PATH = str(ROOT / "_internal" / "runtime" / "fake_formatter_ok.py")
         r = client.post("/api/format-offline")
-        payload = r.get_json() if r.status_code == 200 else {}
-        results.append(("POST /api/format-offline basic", r.status_code == 200 and "message" in payload, f"status={r.status_code}"))
+        format_job = r.get_json().get("job_id") if r.status_code == 202 else None
+        format_result = wait_for_job(client, format_job) if format_job else None
+        results.append((
+            "POST /api/format-offline basic",
+            r.status_code == 202
+            and format_result
+            and format_result.get("status") == "completed"
+            and format_result.get("store_done") == 2
+            and format_result.get("file_total") == 3,
+            f"status={r.status_code}, end={format_result.get('status') if format_result else 'none'}",
+        ))
+
+        r = client.get(f"/api/jobs/{format_job}/events")
+        stream = r.get_data(as_text=True)
+        results.append((
+            "GET /api/jobs/<id>/events format output",
+            "event: output" in stream and "__PROGRESS__ store 2/2" in stream and "event: end" in stream,
+            f"status={r.status_code}, events={stream.count('event: ')}",
+        ))
+
+        app_mod.OFFLINE_SCRIPT_PATH = str(ROOT / "_internal" / "runtime" / "fake_scraper_fail.py")
+        r = client.post("/api/format-offline")
+        format_job = r.get_json().get("job_id") if r.status_code == 202 else None
+        format_result = wait_for_job(client, format_job) if format_job else None
+        results.append((
+            "POST /api/format-offline failure flow",
+            r.status_code == 202 and format_result and format_result.get("status") == "failed",
+            f"status={r.status_code}, end={format_result.get('status') if format_result else 'none'}",
+        ))
+
+        r = client.post("/api/format-offline", json={"workers": "many"})
+        results.append(("POST /api/format-offline invalid workers", r.status_code == 400, f"status={r.status_code}"))
 
         app_mod.OFFLINE_SCRIPT_PATH = str(tmp / "does_not_exist.py")
         r = client.post("/api/format-offline")
         results.append(("POST /api/format-offline error", r.status_code == 500, f"status={r.status_code}"))
 
+        r = client.get("/api/slotdata/query")
+        results.append(("GET /api/slotdata/query no db", r.status_code == 404, f"status={r.status_code}"))
+
+        conn = app_mod.slotdata_db.connect(app_mod.SLOTDATA_DB_PATH)
+        with conn:
+            conn.executemany(
+                "INSERT INTO slotdata VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    ("店舗A", "2026-02-08", "マイジャグラーV", 244, 7239, 2030, 38, 13, 141.9, 190.5, 556.8),
+                    ("店舗A", "2026-02-08", "スマスロ北斗の拳", 301, 5000, -1500, 10, 0, 500.0, 500.0, 0),
+                    ("店舗B", "2026-02-01", "マイジャグラーV", 10, 8000, 2500, 40, 20, 133.3, 200.0, 400.0),
+                ],
+            )
+        conn.close()
+        r = client.get("/api/slotdata/query?keyword=ジャグラー&min_difference=2000&day_from=2026-02-05")
+        payload = r.get_json() if r.status_code == 200 else {}
+        results.append(("GET /api/slotdata/query filter", r.status_code == 200 and payload.get("count") == 1, f"status={r.status_code}, count={payload.get('count')}"))
+
+        r = client.get("/api/slotdata/query?day_from=2026/02/01")
+        results.append(("GET /api/slotdata/query invalid date", r.status_code == 400, f"status={r.status_code}"))
+
+        ok, detail = check_slotdata_db_key(app_mod.slotdata_db, tmp)
+        results.append(("slotdata db keeps rows with unknown dai_num", ok, detail))
+
         old_app_dir = app_mod.APP_DIR
         app_mod.APP_DIR = str(tmp)
         r = client.get("/")
@@ -0,0 +1,529 @@
+"""
+スクレイパーの HTTP 取得エンジンのテスト。
+
+data/test1 の日付HTMLを返すローカルHTTPサーバーを立て、実サイトやブラウザなしで
+一覧取得・日付ページ取得・Cloudflare 検知時のブラウザへの切り替えと、
+常駐プロセス（scrape_daemon.py）でのジョブ実行を確認する。
+"""
+
+import contextlib
+import csv
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[2]
+APP_DIR = ROOT / "_internal" / "app"
+FIXTURE_DIR = ROOT / "data" / "test1"
+CLEARANCE_COOKIE = "cf_clearance=ok"
+
+sys.path.insert(0, str(APP_DIR))
+
+
+def fixture_days():
+    return sorted(p.stem for p in FIXTURE_DIR.glob("*.html"))
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    /store/<店舗> は日付一覧、/detail/<店舗>/<日付> は data/test1 の表を埋め込んだ詳細ページを返す。
+    店舗名が cf で始まる場合は、Cookie cf_clearance がない限り Cloudflare の確認画面（503）を返す。
+    店舗名が err で始まる場合は、2番目の日付の詳細ページだけ 500 を返す。
+    店舗名が listerr で始まる場合は、Cookie cf_clearance がない限り日付一覧に 500 を返す。
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_html(self, status, body):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        self.server.requests.append(self.path)
+        if len(parts) >= 2 and parts[1].startswith("cf") and CLEARANCE_COOKIE not in (self.headers.get("Cookie") or ""):
+            self.send_html(503, "<html><body><div id='hcaptcha-box'></div>人間であることを確認します</body></html>")
+            return
+
+        if len(parts) == 2 and parts[0] == "store":
+            if parts[1].startswith("listerr") and CLEARANCE_COOKIE not in (self.headers.get("Cookie") or ""):
+                self.send_html(500, "<html><body>internal server error</body></html>")
+                return
+            rows = "".join(
+                f'<div class="table-row"><a href="/detail/{parts[1]}/{day}">{day.replace("-", "/")}(月)</a></div>'
+                for day in reversed(fixture_days())
+            )
+            self.send_html(200, f'<html><body><div class="date-table">{rows}</div></body></html>')
+            return
+
+        if len(parts) == 3 and parts[0] == "detail":
+            if parts[1].startswith("err") and parts[2] == fixture_days()[1]:
+                self.send_html(500, "<html><body>internal server error</body></html>")
+                return
+            path = FIXTURE_DIR / f"{parts[2]}.html"
+            if path.exists():
+                table = path.read_text(encoding="utf-8")
+                self.send_html(200, f"<html><body><h1>{parts[2]}</h1>{table}</body></html>")
+                return
+        self.send_html(404, "<html><body>not found</body></html>")
+
+
+class FakeRow:
+    def __init__(self, date_text, href):
+        self.date_text = date_text
+        self.href = href
+
+    def find_element(self, *args):
+        return self
+
+    @property
+    def text(self):
+        return self.date_text.replace("-", "/") + "(月)"
+
+    def get_attribute(self, name):
+        return self.href
+
+
+class FakeDriver:
+    """ブラウザの代わりに urllib で取得し、確認画面を通過した扱いで Cookie を付ける。"""
+
+    created = 0
+
+    def __init__(self):
+        FakeDriver.created += 1
+        self.current_url = ""
+        self.page = ""
+
+    def get(self, url):
+        req = urllib.request.Request(url, headers={"Cookie": CLEARANCE_COOKIE})
+        with urllib.request.urlopen(req) as res:
+            self.page = res.read().decode("utf-8")
+        self.current_url = url
+
+    def find_elements(self, by, selector):
+        import http_fetcher
+
+        if "date-table" not in self.page:
+            return []
+        return [FakeRow(d, h) for d, h in reversed(http_fetcher.parse_date_links(self.page, self.current_url))]
+
+    def execute_script(self, script, *args):
+        import anasuro_selective
+        import http_fetcher
+
+        if script == anasuro_selective.PAGE_PROBE_SCRIPT:
+            return {"table": http_fetcher.extract_table_html(self.page), "cloudflare": False}
+        if "navigator.userAgent" in script:
+            return "FakeBrowser/1.0"
+        return None
+
+    def get_cookies(self):
+        return [{"name": "cf_clearance", "value": "ok", "domain": "127.0.0.1", "path": "/"}]
+
+    def quit(self):
+        pass
+
+
+def run_store(anasuro_selective, base_url, store, save_dir, inline_format=False):
+    import pandas as pd
+
+    df = pd.DataFrame([{"store_name": store, "store_url": f"{base_url}/store/{store}", "data_directory": str(save_dir)}])
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        anasuro_selective.run_scrape(df, engine="http", driver_factory=FakeDriver, inline_format=inline_format)
+
+
+def same_rows(saved_dir):
+    import html_archive
+    from table_extractor import iter_table_rows
+
+    for day in fixture_days():
+        saved = html_archive.open_day(str(saved_dir), f"{day}.html")
+        if saved is None:
+            return False
+        if list(iter_table_rows(saved)) != list(iter_table_rows(str(FIXTURE_DIR / f"{day}.html"))):
+            return False
+    return True
+
+
+def check_archive_storage(anasuro_selective, base_url, server, tmp):
+    """保存形式 archive で取得し、(結果, 詳細) を返す。2回目は取得済みの日付を取り直さないこと。"""
+    import format_manifest
+    import html_archive
+
+    save_dir = tmp / "archived"
+    anasuro_selective.SCRAPE_HTML_STORAGE = "archive"
+    try:
+        run_store(anasuro_selective, base_url, "archived", save_dir)
+        server.requests.clear()
+        run_store(anasuro_selective, base_url, "archived", save_dir)
+    finally:
+        anasuro_selective.SCRAPE_HTML_STORAGE = "files"
+    refetched = [p for p in server.requests if p.startswith("/detail/")]
+    loose = sorted(p.name for p in save_dir.glob("*.html"))
+    planned = [day for _, day, _ in format_manifest.plan_files(str(save_dir), {})]
+    months = sorted(p.name for p in (save_dir / html_archive.ARCHIVE_DIR_NAME).glob("*.zip"))
+    ok = same_rows(save_dir) and not loose and not refetched and planned == fixture_days()
+    return ok, f"months={months}, loose={loose}, refetched={len(refetched)}, planned={len(planned)}"
+
+
+def check_archive_concurrent_writers(tmp):
+    """2つのプロセスが同じ月のアーカイブへ同時に書き込んでも、どちらの日付も残ることを確認する。"""
+    import zipfile
+
+    import html_archive
+
+    save_dir = tmp / "archive_writers"
+    script = (
+        "import sys; sys.path.insert(0, sys.argv[1]); import html_archive\n"
+        "for d in range(int(sys.argv[3]), 29, 2):\n"
+        "    html_archive.write_day(sys.argv[2], f'2026-02-{d:02d}', f'<table id=all_data_table>{d}</table>')\n"
+    )
+    procs = [
+        subprocess.Popen([sys.executable, "-c", script, str(APP_DIR), str(save_dir), str(start)])
+        for start in (1, 2)
+    ]
+    codes = [p.wait() for p in procs]
+    index = html_archive.load_index(str(save_dir))
+    with zipfile.ZipFile(save_dir / html_archive.ARCHIVE_DIR_NAME / "2026-02.zip") as zf:
+        members = zf.namelist()
+    ok = codes == [0, 0] and len(index) == 28 and len(members) == 28
+    return ok, f"codes={codes}, index={len(index)}, members={len(members)}"
+
+
+def check_archive_append_and_listing(tmp):
+    """
+    新しい日付は月の zip へ追記し（書き直すのは月の作成と取り直しのみ）、
+    ばらのファイルがない店舗はフォルダを読まずに索引から一覧を返すことを確認する。
+    """
+    import zipfile
+
+    import html_archive
+
+    save_dir = tmp / "archive_append"
+    rewrite_month = html_archive._rewrite_month
+    rewrites = []
+    html_archive._rewrite_month = lambda *args: (rewrites.append(args[1]), rewrite_month(*args))
+    try:
+        for d in (1, 2, 3):
+            html_archive.write_day(str(save_dir), f"2026-03-{d:02d}", f"<table id=all_data_table>{d}</table>")
+        html_archive.write_day(str(save_dir), "2026-03-02", "<table id=all_data_table>2b</table>")
+    finally:
+        html_archive._rewrite_month = rewrite_month
+    with zipfile.ZipFile(save_dir / html_archive.ARCHIVE_DIR_NAME / "2026-03.zip") as zf:
+        members = sorted(zf.namelist())
+    replaced = html_archive.read_day(str(save_dir), "2026-03-02")
+
+    # 更新直後のフォルダは記録されないため、更新時刻を戻してから一覧を取る
+    old = time.time_ns() - 10 * 10**9
+    os.utime(save_dir, ns=(old, old))
+    html_archive.list_days(str(save_dir))
+    listdir = os.listdir
+    listed = []
+    os.listdir = lambda path: (listed.append(path), listdir(path))[1]
+    try:
+        from_index = [day for _, day, _ in html_archive.list_days(str(save_dir))]
+        (save_dir / "2026-03-04.html").write_text("<table id=all_data_table>4</table>", encoding="utf-8")
+        with_loose = [(day, entry is None) for _, day, entry in html_archive.list_days(str(save_dir))]
+    finally:
+        os.listdir = listdir
+    ok = (
+        rewrites == ["2026-03-01.html", "2026-03-02.html"]
+        and members == ["2026-03-01.html", "2026-03-02.html", "2026-03-03.html"]
+        and replaced == b"<table id=all_data_table>2b</table>"
+        and from_index == ["2026-03-01", "2026-03-02", "2026-03-03"]
+        and len(listed) == 1
+        and with_loose[-1] == ("2026-03-04", True)
+    )
+    return ok, f"rewrites={rewrites}, members={len(members)}, listdir_calls={len(listed)}, days={len(with_loose)}"
+
+
+def run_daemon_jobs(base_url, tmp):
+    """常駐プロセスを起動して2回ジョブを流し、(結果, 詳細) を返す。"""
+    os.environ["SCRAPE_DAEMON_PORT"] = str(50800 + os.getpid() % 1000)
+    os.environ["SCRAPE_DAEMON_KEY_PATH"] = str(tmp / "scrape_daemon.key")
+    os.environ["SCRAPE_DAEMON_LOG_PATH"] = str(tmp / "scrape_daemon.log")
+    os.environ["SCRAPE_FETCH_ENGINE"] = "http"
+    import scrape_daemon
+
+    store_list = tmp / "daemon_store_list.csv"
+    pids = []
+    try:
+        if not scrape_daemon.ensure_running():
+            return False, "daemon did not start"
+        for i in range(2):
+            save_dir = tmp / f"daemon{i}"
+            with open(store_list, "w", encoding="utf-8-sig", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["store_name", "store_url", "data_directory"])
+                writer.writerow([f"daemon{i}", f"{base_url}/store/daemon{i}", str(save_dir)])
+            lines = []
+            code = scrape_daemon.run_job(["--file", str(store_list)], lines.append)
+            conn = scrape_daemon._connect()
+            conn.send({"type": "ping"})
+            pids.append(conn.recv().get("pid"))
+            conn.close()
+            if code != 0 or not same_rows(save_dir) or "__PROGRESS__ store 1/1" not in lines:
+                return False, f"job{i}: code={code}, lines={lines[-3:]}"
+        # 取り消しに応じないジョブ用の強制終了で、常駐プロセスが止まること
+        terminated = scrape_daemon.terminate()
+        deadline = time.time() + 10
+        while scrape_daemon.ping() and time.time() < deadline:
+            time.sleep(0.2)
+        stopped = terminated and not scrape_daemon.ping()
+        return pids[0] == pids[1] and stopped, f"pids={pids}, terminated={stopped}"
+    finally:
+        with contextlib.suppress(Exception):
+            scrape_daemon.shutdown()
+
+
+def check_inline_format(anasuro_selective, base_url, tmp):
+    """インライン整形で店舗CSVへ書き出し、(結果, 詳細) を返す。HTMLを保存した日付は整形処理で読み飛ばすこと。"""
+    import pandas as pd
+    import format_manifest
+    import slotdata_sync
+    from slotdata import append_rows, new_raw_columns
+    from slotdata_writer import load_state, state_path_for
+    from table_extractor import iter_table_rows
+
+    expected_rows = sum(
+        append_rows(new_raw_columns(), iter_table_rows(str(FIXTURE_DIR / f"{day}.html")), day) for day in fixture_days()
+    )
+    run_store(anasuro_selective, base_url, "inline", tmp / "inline", inline_format=True)
+    anasuro_selective.SCRAPE_INLINE_KEEP_HTML = False
+    try:
+        run_store(anasuro_selective, base_url, "inline_nohtml", tmp / "inline_nohtml", inline_format=True)
+    finally:
+        anasuro_selective.SCRAPE_INLINE_KEEP_HTML = True
+
+    output = Path(slotdata_sync.output_path_for("inline"))
+    nohtml_output = Path(slotdata_sync.output_path_for("inline_nohtml"))
+    if not output.exists() or not nohtml_output.exists():
+        return False, "store csv not written"
+    df = pd.read_csv(output)
+    state = load_state(state_path_for(slotdata_sync.FORMAT_STATE_DIR, str(output)))
+    pending = format_manifest.plan_files(str(tmp / "inline"), state)
+    ok = (
+        sorted(df["day"].unique()) == fixture_days()
+        and len(df) == expected_rows
+        and not pending
+        and output.read_bytes() == nohtml_output.read_bytes()
+        and not list((tmp / "inline_nohtml").glob("*.html"))
+    )
+    return ok, f"rows={len(df)}/{expected_rows}, pending={len(pending)}"
+
+
+def check_day_error(anasuro_selective, base_url, server, tmp):
+    """日付ページが 500 の日は失敗として記録し、店舗の以降の日付は取得を続けることを確認する。"""
+    import store_coverage
+
+    days = fixture_days()
+    save_dir = tmp / "err"
+    server.requests.clear()
+    run_store(anasuro_selective, base_url, "err", save_dir)
+    requested = {p.rsplit("/", 1)[-1] for p in server.requests if p.startswith("/detail/")}
+    saved = sorted(p.stem for p in save_dir.glob("*.html"))
+    gap = store_coverage.store_gaps(anasuro_selective.STORE_COVERAGE_PATH, ["err"], day_from=days[0], day_to=days[-1])[0]
+    missing = [m["day"] for m in gap["missing"]]
+    failed_reason = next((m["reason"] for m in gap["missing"] if m["day"] == days[1]), None)
+    ok = (
+        requested == set(days)
+        and saved == [days[0], days[2]]
+        and missing == [days[1]]
+        and failed_reason is not None
+    )
+    return ok, f"requested={sorted(requested)}, saved={saved}, missing={missing}, reason={failed_reason}"
+
+
+def check_list_error(anasuro_selective, base_url, server, tmp):
+    """日付一覧が HTTP で 500 の店舗は、ブラウザで一覧を開いて全日付を取得することを確認する。"""
+    FakeDriver.created = 0
+    server.requests.clear()
+    save_dir = tmp / "listerr"
+    run_store(anasuro_selective, base_url, "listerr", save_dir)
+    list_requests = [p for p in server.requests if p.startswith("/store/")]
+    ok = FakeDriver.created == 1 and len(list_requests) == 2 and same_rows(save_dir)
+    return ok, f"drivers={FakeDriver.created}, list_requests={len(list_requests)}, files={sorted(os.listdir(save_dir))}"
+
+
+def check_concurrent_store_writers(tmp):
+    """
+    オフライン整形とインライン整形（別プロセス）が同じ店舗CSVへ同時に書き込んでも、
+    行が欠けたり重複したりせず、状態ファイルが両方の結果を記録していることを確認する。
+    """
+    import pandas as pd
+    import format_manifest
+    import slotdata_sync
+    from slotdata import append_rows, new_raw_columns
+    from slotdata_writer import load_state, state_path_for
+    from table_extractor import iter_table_rows
+
+    fixtures = [FIXTURE_DIR / f"{day}.html" for day in fixture_days()]
+    html_dir = tmp / "shared"
+    html_dir.mkdir()
+    offline_days = [f"2026-03-{d:02d}" for d in range(1, 21)]
+    inline_days = [f"2026-04-{d:02d}" for d in range(1, 21)]
+    for i, day in enumerate(offline_days):
+        shutil.copy(fixtures[i % len(fixtures)], html_dir / f"{day}.html")
+    store_list = tmp / "shared_store_list.csv"
+    with open(store_list, "w", encoding="utf-8-sig", newline="") as f:
+        csv.writer(f).writerows([["store_name", "store_url", "data_directory"], ["shared", "", str(html_dir)]])
+
+    env = dict(os.environ, OFFLINE_STORE_LIST_PATH=str(store_list), COMPLETED_STORES_PATH=str(tmp / "shared.json"))
+    inline_script = (
+        "import sys; sys.path.insert(0, sys.argv[1]); import slotdata_sync\n"
+        "from table_extractor import iter_table_rows\n"
+        "fixtures = sys.argv[2].split('|')\n"
+        "for i, day in enumerate(sys.argv[3].split('|')):\n"
+        "    rows = list(iter_table_rows(fixtures[i % len(fixtures)]))\n"
+        "    slotdata_sync.write_days('shared', [(day, rows, None)])\n"
+    )
+    procs = [
+        subprocess.Popen(
+            [sys.executable, str(APP_DIR / "offline-scraing.py")], env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ),
+        subprocess.Popen(
+            [sys.executable, "-c", inline_script, str(APP_DIR), "|".join(map(str, fixtures)), "|".join(inline_days)],
+            env=env,
+        ),
+    ]
+    codes = [p.wait() for p in procs]
+
+    per_fixture = [append_rows(new_raw_columns(), iter_table_rows(str(path)), "x") for path in fixtures]
+    expected_rows = sum(per_fixture[i % len(fixtures)] for i in range(len(offline_days))) * 2
+    output = slotdata_sync.output_path_for("shared")
+    df = pd.read_csv(output)
+    state = load_state(state_path_for(slotdata_sync.FORMAT_STATE_DIR, output))
+    recorded = sorted(state.get("files", {}))
+    pending = format_manifest.plan_files(str(html_dir), state)
+    ok = (
+        codes == [0, 0]
+        and sorted(df["day"].unique()) == offline_days + inline_days
+        and len(df) == expected_rows
+        and not df.duplicated(subset=["day", "dai_name", "dai_num"]).any()
+        and recorded == sorted(f"{day}.html" for day in offline_days + inline_days)
+        and not pending
+    )
+    return ok, f"codes={codes}, rows={len(df)}/{expected_rows}, recorded={len(recorded)}, pending={len(pending)}"
+
+
+def check_coverage_rescan(anasuro_selective, base_url, server, save_dir):
+    """索引の記録と、ファイルを消して再スキャンを指定した場合にその日付だけ取り直すことを確認する。"""
+    import store_coverage
+
+    db_path = anasuro_selective.STORE_COVERAGE_PATH
+    days = fixture_days()
+    gap = store_coverage.store_gaps(db_path, ["plain"], day_from=days[0], day_to=days[-1])[0]
+    (save_dir / f"{days[0]}.html").unlink()
+    server.requests.clear()
+    run_store(anasuro_selective, base_url, "plain", save_dir)
+    before_rescan = [p for p in server.requests if p.startswith("/detail/")]
+    store_coverage.request_rescan(db_path, ["plain"])
+    server.requests.clear()
+    run_store(anasuro_selective, base_url, "plain", save_dir)
+    refetched = [p for p in server.requests if p.startswith("/detail/")]
+    ok = gap["scraped_days"] == len(days) and not gap["missing"] and not before_rescan and len(refetched) == 1
+    return ok, f"scraped={gap['scraped_days']}, before_rescan={len(before_rescan)}, refetched={refetched}"
+
+
+def main():
+    results = []
+    tmp = Path(tempfile.mkdtemp(prefix="slot-http-"))
+    os.environ["STORE_COVERAGE_PATH"] = str(tmp / "coverage.db")
+    os.environ["EXCEL_OUTPUT_DIR"] = str(tmp / "output")
+    os.environ["FORMAT_STATE_DIR"] = str(tmp / "format_state")
+    import anasuro_selective
+    import http_fetcher
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    try:
+        days = fixture_days()
+        fetcher = http_fetcher.HttpFetcher()
+        page, blocked = fetcher.fetch(f"{base_url}/store/plain")
+        links = http_fetcher.parse_date_links(page, f"{base_url}/store/plain")
+        ok = not blocked and [d for d, _ in links] == days and all(h.startswith(base_url) for _, h in links)
+        results.append(("parse_date_links", ok, f"days={[d for d, _ in links]}"))
+
+        page, blocked = fetcher.fetch(f"{base_url}/store/cfx")
+        results.append(("fetch cloudflare blocked", blocked, f"blocked={blocked}"))
+        fetcher.close()
+
+        FakeDriver.created = 0
+        save_dir = tmp / "plain"
+        run_store(anasuro_selective, base_url, "plain", save_dir)
+        ok = FakeDriver.created == 0 and same_rows(save_dir)
+        results.append(("http engine without browser", ok, f"drivers={FakeDriver.created}, files={sorted(os.listdir(save_dir))}"))
+
+        FakeDriver.created = 0
+        server.requests.clear()
+        save_dir = tmp / "cf"
+        run_store(anasuro_selective, base_url, "cf", save_dir)
+        detail_requests = [p for p in server.requests if p.startswith("/detail/")]
+        ok = FakeDriver.created == 1 and same_rows(save_dir) and len(detail_requests) == len(days)
+        results.append((
+            "http engine escalates to browser on cloudflare",
+            ok,
+            f"drivers={FakeDriver.created}, detail_requests={len(detail_requests)}",
+        ))
+
+        ok, detail = check_inline_format(anasuro_selective, base_url, tmp)
+        results.append(("inline format writes store csv during scrape", ok, detail))
+
+        ok, detail = check_day_error(anasuro_selective, base_url, server, tmp)
+        results.append(("error on one day page does not stop later days", ok, detail))
+
+        ok, detail = check_list_error(anasuro_selective, base_url, server, tmp)
+        results.append(("error on list page falls back to browser", ok, detail))
+
+        ok, detail = check_concurrent_store_writers(tmp)
+        results.append(("offline and inline formatting in separate processes share a store csv", ok, detail))
+
+        ok, detail = check_coverage_rescan(anasuro_selective, base_url, server, tmp / "plain")
+        results.append(("coverage index skips saved days until rescan", ok, detail))
+
+        ok, detail = check_archive_storage(anasuro_selective, base_url, server, tmp)
+        results.append(("archive storage is read back by scraper and formatter", ok, detail))
+
+        ok, detail = check_archive_concurrent_writers(tmp)
+        results.append(("archive writers in separate processes keep every day", ok, detail))
+
+        ok, detail = check_archive_append_and_listing(tmp)
+        results.append(("archive appends new days and lists days from the index", ok, detail))
+
+        ok, detail = run_daemon_jobs(base_url, tmp)
+        results.append(("scrape daemon runs jobs in one process and can be terminated", ok, detail))
+
+        passed = sum(1 for _, ok, _ in results if ok)
+        total = len(results)
+        print(f"RESULT {passed}/{total}")
+        for name, ok, detail in results:
+            mark = "PASS" if ok else "FAIL"
+            print(f"{mark}\t{name}\t{detail}")
+
+        return 0 if passed == total else 1
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())